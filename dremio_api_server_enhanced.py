@@ -2,18 +2,51 @@
 import os
 import psutil
 import requests
-import pandas as pd
 import logging
 from datetime import datetime, timedelta
 from flask import Flask, request, jsonify, Response, send_file, make_response
 from flask_cors import CORS
 from functools import wraps
+from contextlib import contextmanager
 import time
 import threading
 from typing import Dict, Any, Optional, List
+import io
 import json
+import gzip
+import bisect
+import re
 import uuid
-from io import StringIO, BytesIO
+import itertools
+import tempfile
+import shutil
+import sqlite3
+import queue
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed, TimeoutError as FutureTimeoutError
+
+# 可选依赖：orjson用于更快的JSON序列化，brotli用于br响应压缩，未安装时分别回退到json与gzip；
+# minio用于将查询结果直接导出到MinIO，未安装时该功能不可用
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    from minio import Minio
+except ImportError:
+    Minio = None
+
+# fcntl用于在多个worker进程间选出唯一刷新Schema缓存的进程，Windows上不可用时每个进程各自刷新
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
 
 # 配置日志
 logging.basicConfig(
@@ -26,6 +59,139 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Dremio REST结果分页配置（/api/v3/job/{id}/results 单页最多500行）
+DREMIO_RESULTS_MAX_PAGE_SIZE = 500
+DREMIO_RESULTS_PAGE_SIZE = int(os.environ.get('DREMIO_RESULTS_PAGE_SIZE', DREMIO_RESULTS_MAX_PAGE_SIZE))
+
+# Dremio作业状态轮询配置（秒）：从初始间隔开始按倍数退避，直到上限
+DREMIO_POLL_INITIAL_INTERVAL = float(os.environ.get('DREMIO_POLL_INITIAL_INTERVAL', 0.05))
+DREMIO_POLL_MAX_INTERVAL = float(os.environ.get('DREMIO_POLL_MAX_INTERVAL', 2))
+DREMIO_POLL_BACKOFF = float(os.environ.get('DREMIO_POLL_BACKOFF', 2))
+
+# 查询准入控制配置：总并发上限、各优先级类别的并发上限与排队上限、排队超时（秒）
+ADMISSION_MAX_CONCURRENT = int(os.environ.get('ADMISSION_MAX_CONCURRENT', 8))
+ADMISSION_CLASS_CONCURRENCY = {
+    'interactive': int(os.environ.get('ADMISSION_INTERACTIVE_CONCURRENCY', 8)),
+    'export': int(os.environ.get('ADMISSION_EXPORT_CONCURRENCY', 4)),
+    'maintenance': int(os.environ.get('ADMISSION_MAINTENANCE_CONCURRENCY', 2))
+}
+ADMISSION_QUEUE_LIMITS = {
+    'interactive': int(os.environ.get('ADMISSION_INTERACTIVE_QUEUE', 32)),
+    'export': int(os.environ.get('ADMISSION_EXPORT_QUEUE', 16)),
+    'maintenance': int(os.environ.get('ADMISSION_MAINTENANCE_QUEUE', 8))
+}
+ADMISSION_QUEUE_TIMEOUT = float(os.environ.get('ADMISSION_QUEUE_TIMEOUT', 60))
+
+# 批量查询配置：单次请求的SQL语句数上限与并发执行数（同时受interactive准入名额限制）
+QUERY_BATCH_MAX_STATEMENTS = int(os.environ.get('QUERY_BATCH_MAX_STATEMENTS', 20))
+QUERY_BATCH_CONCURRENCY = int(os.environ.get('QUERY_BATCH_CONCURRENCY', 8))
+
+# 反射批量刷新配置：单次请求的数据集数量上限与并发执行的DROP/CREATE语句数
+REFLECTION_BATCH_MAX_DATASETS = int(os.environ.get('REFLECTION_BATCH_MAX_DATASETS', 200))
+REFLECTION_BATCH_CONCURRENCY = int(os.environ.get('REFLECTION_BATCH_CONCURRENCY', 4))
+
+# 数据集刷新队列配置：同一数据集的请求合并窗口（秒）与已完成ticket的保留时间（秒）
+DATASET_REFRESH_DEBOUNCE_SECONDS = float(os.environ.get('DATASET_REFRESH_DEBOUNCE_SECONDS', 30))
+DATASET_REFRESH_TICKET_TTL = int(os.environ.get('DATASET_REFRESH_TICKET_TTL', 3600))
+
+# 反射就绪等待配置：默认最长等待时间与状态轮询间隔（秒），以及视为就绪/失败的反射状态
+REFLECTION_WAIT_TIMEOUT = float(os.environ.get('REFLECTION_WAIT_TIMEOUT', 600))
+REFLECTION_POLL_INITIAL_INTERVAL = float(os.environ.get('REFLECTION_POLL_INITIAL_INTERVAL', 1))
+REFLECTION_POLL_MAX_INTERVAL = float(os.environ.get('REFLECTION_POLL_MAX_INTERVAL', 15))
+REFLECTION_READY_STATUSES = {'CAN_ACCELERATE', 'CAN_ACCELERATE_WITH_FAILURES'}
+REFLECTION_FAILED_STATUSES = {'FAILED', 'INVALID', 'DISABLED', 'CANNOT_ACCELERATE_MANUAL'}
+
+# Schema并发抓取配置：工作线程数与单个catalog请求超时（秒）
+SCHEMA_CRAWL_WORKERS = int(os.environ.get('SCHEMA_CRAWL_WORKERS', 8))
+SCHEMA_CRAWL_TIMEOUT = float(os.environ.get('SCHEMA_CRAWL_TIMEOUT', 30))
+# 增量刷新时schema容器tag未变化则复用上次的表列表；Dremio在源中新增表时不一定更新容器tag，
+# 超过该时间（秒）的容器仍会重新列出，设为0则每次都重新列出
+SCHEMA_CONTAINER_REUSE_MAX_AGE = float(os.environ.get('SCHEMA_CONTAINER_REUSE_MAX_AGE', 6 * 3600))
+
+# Schema缓存快照文件（gzip压缩JSON），启动时加载以避免冷缓存
+SCHEMA_CACHE_SNAPSHOT = os.environ.get('SCHEMA_CACHE_SNAPSHOT', './cache/schema_cache.json.gz')
+# 单个schema或表详情写入缓存后延迟保存快照的秒数，期间的多次写入合并为一次保存
+SCHEMA_SNAPSHOT_SAVE_DELAY = float(os.environ.get('SCHEMA_SNAPSHOT_SAVE_DELAY', 30))
+# 多worker部署时只有一个进程从Dremio刷新并保存快照，其余进程每隔该秒数检查快照文件，更新后重新加载
+SCHEMA_SNAPSHOT_RELOAD_INTERVAL = float(os.environ.get('SCHEMA_SNAPSHOT_RELOAD_INTERVAL', 60))
+
+# 表详细信息缓存配置：条目上限、内存上限与TTL（秒）
+TABLE_DETAILS_CACHE_MAX_ENTRIES = int(os.environ.get('TABLE_DETAILS_CACHE_MAX_ENTRIES', 2000))
+TABLE_DETAILS_CACHE_MAX_MB = int(os.environ.get('TABLE_DETAILS_CACHE_MAX_MB', 64))
+TABLE_DETAILS_CACHE_TTL = int(os.environ.get('TABLE_DETAILS_CACHE_TTL', 1800))
+
+# SQL查询结果缓存配置
+QUERY_CACHE_ENABLED = os.environ.get('QUERY_CACHE_ENABLED', 'true').lower() == 'true'
+QUERY_CACHE_MAX_MB = int(os.environ.get('QUERY_CACHE_MAX_MB', 256))
+QUERY_CACHE_MAX_ENTRY_MB = int(os.environ.get('QUERY_CACHE_MAX_ENTRY_MB', 32))
+QUERY_CACHE_TTL = int(os.environ.get('QUERY_CACHE_TTL', 300))  # 秒
+
+# 查询结果响应配置：可选数据格式（objects为逐行字典，columnar为按列数组，rows为不带列名的行数组）、
+# 启用压缩的最小响应大小（字节）及gzip/brotli压缩级别
+QUERY_RESPONSE_FORMATS = ['objects', 'columnar', 'rows']
+RESPONSE_COMPRESSION_MIN_BYTES = int(os.environ.get('RESPONSE_COMPRESSION_MIN_BYTES', 1024))
+RESPONSE_GZIP_LEVEL = int(os.environ.get('RESPONSE_GZIP_LEVEL', 6))
+RESPONSE_BROTLI_QUALITY = int(os.environ.get('RESPONSE_BROTLI_QUALITY', 5))
+
+# 导出查询合并配置：相同SQL的并发导出共用一个批次流，已读取量不超过该值（MB）时新请求仍可加入并从头读取
+EXPORT_SHARED_REPLAY_MB = int(os.environ.get('EXPORT_SHARED_REPLAY_MB', 64))
+# 共享批次流缓冲区上限（MB）：最慢的订阅者落后超过该值时，读得最快的订阅者暂停拉取；
+# 暂停超过EXPORT_SHARED_LAG_TIMEOUT秒仍未追上时，落后的订阅者被移出并收到错误
+EXPORT_SHARED_MAX_LAG_MB = int(os.environ.get('EXPORT_SHARED_MAX_LAG_MB', 128))
+EXPORT_SHARED_LAG_TIMEOUT = float(os.environ.get('EXPORT_SHARED_LAG_TIMEOUT', 60))
+
+# XLSX导出配置：Excel单个工作表最多1048576行，扣除表头后超出部分写入新的工作表
+XLSX_MAX_ROWS_PER_SHEET = int(os.environ.get('XLSX_MAX_ROWS_PER_SHEET', 1048575))
+
+# 列式导出配置：Parquet可选压缩算法及每个行组的行数
+PARQUET_COMPRESSION_CODECS = ['snappy', 'zstd', 'gzip', 'brotli', 'lz4', 'none']
+PARQUET_DEFAULT_COMPRESSION = os.environ.get('PARQUET_DEFAULT_COMPRESSION', 'snappy')
+PARQUET_ROW_GROUP_SIZE = int(os.environ.get('PARQUET_ROW_GROUP_SIZE', 128 * 1024))
+
+# Arrow Flight连接池配置：端口、连接数上限、Bearer Token有效期（秒）与连接失败后的重试间隔（秒）
+FLIGHT_PORT = int(os.environ.get('DREMIO_FLIGHT_PORT', 32010))
+FLIGHT_POOL_SIZE = int(os.environ.get('FLIGHT_POOL_SIZE', 4))
+FLIGHT_TOKEN_TTL = int(os.environ.get('FLIGHT_TOKEN_TTL', 3600))
+FLIGHT_RETRY_INTERVAL = float(os.environ.get('FLIGHT_RETRY_INTERVAL', 30))
+# 空闲超过该时间（秒）的连接在取出时关闭并重新建立，避免使用已被服务端或网络设备断开的连接
+FLIGHT_IDLE_TIMEOUT = float(os.environ.get('FLIGHT_IDLE_TIMEOUT', 300))
+
+# Arrow Flight多endpoint读取配置：默认是否并行读取、最大并行数与合并队列长度（批次数）
+FLIGHT_PARALLEL_ENDPOINTS = os.environ.get('FLIGHT_PARALLEL_ENDPOINTS', 'false').lower() == 'true'
+FLIGHT_MAX_PARALLEL_ENDPOINTS = int(os.environ.get('FLIGHT_MAX_PARALLEL_ENDPOINTS', 8))
+FLIGHT_MERGE_QUEUE_SIZE = int(os.environ.get('FLIGHT_MERGE_QUEUE_SIZE', 16))
+
+# MinIO导出配置：连接信息与minio_api_server.py使用相同的环境变量；分片上传的分片大小（MB，不小于5）与分区导出的分区数上限
+MINIO_ENDPOINT = os.environ.get('MINIO_ENDPOINT', '100.120.50.34:9002')
+MINIO_ACCESS_KEY = os.environ.get('MINIO_ACCESS_KEY', 'admin')
+MINIO_SECRET_KEY = os.environ.get('MINIO_SECRET_KEY', 'admin123')
+MINIO_SECURE = os.environ.get('MINIO_SECURE', 'false').lower() == 'true'
+MINIO_BUCKET = os.environ.get('MINIO_BUCKET', 'warehouse')
+MINIO_EXPORT_PART_SIZE_MB = max(5, int(os.environ.get('MINIO_EXPORT_PART_SIZE_MB', 16)))
+MINIO_EXPORT_MAX_PARTITIONS = int(os.environ.get('MINIO_EXPORT_MAX_PARTITIONS', 1024))
+
+# 下载链接结果落盘配置：预生成文件的目录、总容量上限（MB）与后台生成线程数
+DOWNLOAD_SPOOL_DIR = os.environ.get('DOWNLOAD_SPOOL_DIR', './cache/downloads')
+DOWNLOAD_SPOOL_MAX_MB = int(os.environ.get('DOWNLOAD_SPOOL_MAX_MB', 2048))
+DOWNLOAD_SPOOL_WORKERS = int(os.environ.get('DOWNLOAD_SPOOL_WORKERS', 2))
+# 下载时落盘文件仍在生成的最长等待秒数，超过后返回202并在Retry-After秒后重试
+DOWNLOAD_SPOOL_WAIT_SECONDS = float(os.environ.get('DOWNLOAD_SPOOL_WAIT_SECONDS', 10))
+DOWNLOAD_SPOOL_RETRY_AFTER = int(os.environ.get('DOWNLOAD_SPOOL_RETRY_AFTER', 5))
+DOWNLOAD_MATERIALIZE_DEFAULT = os.environ.get('DOWNLOAD_MATERIALIZE_DEFAULT', 'false').lower() == 'true'
+
+# 下载链接存储配置：sqlite（可在多个worker进程间共享）或 memory（仅单进程）
+DOWNLOAD_LINK_STORE = os.environ.get('DOWNLOAD_LINK_STORE', 'sqlite').lower()
+DOWNLOAD_LINK_DB = os.environ.get('DOWNLOAD_LINK_DB', './cache/download_links.db')
+DOWNLOAD_LINK_CLEANUP_INTERVAL = int(os.environ.get('DOWNLOAD_LINK_CLEANUP_INTERVAL', 60))  # 秒
+
+# 下载链接支持的文件格式及对应的MIME类型
+DOWNLOAD_FORMAT_MIMETYPES = {
+    'csv': 'text/csv',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    'parquet': 'application/vnd.apache.parquet',
+    'arrow': 'application/vnd.apache.arrow.stream'
+}
+
 # Flask应用初始化
 app = Flask(__name__)
 CORS(app, resources={
@@ -36,15 +202,188 @@ CORS(app, resources={
     }
 })
 
+class SchemaSearchIndex:
+    """Schema搜索索引 - 对catalog/schema/表/列名建立倒排索引，支持中文、前缀和n-gram匹配"""
+    
+    TOKEN_SPLIT_PATTERN = re.compile(r'[^0-9a-z\u4e00-\u9fff]+')
+    CJK_PATTERN = re.compile(r'[\u4e00-\u9fff]')
+    KIND_WEIGHTS = {'table': 1.2, 'column': 1.0, 'schema': 0.9, 'catalog': 0.8}
+    
+    def __init__(self):
+        self.docs = []
+        self.exact_index = {}
+        self.token_index = {}
+        self.context_index = {}  # 列所属表名的词 -> 列条目，用于 "表名 列名" 组合查询
+        self.sorted_tokens = []
+        self.ngram_index = {}
+        self.built_at = None
+        self.lock = threading.Lock()
+    
+    @classmethod
+    def tokenize(cls, text):
+        """拆分名称：按非字母数字切分，中文连续片段作为一个词"""
+        tokens = []
+        for part in cls.TOKEN_SPLIT_PATTERN.split(text.lower()):
+            if not part:
+                continue
+            # 中英文混排时拆开，如 订单id -> 订单, id
+            tokens.extend(re.findall(r'[\u4e00-\u9fff]+|[0-9a-z]+', part))
+        return tokens
+    
+    @classmethod
+    def ngrams(cls, token):
+        """中文按单字和二元组，英文按三元组生成n-gram"""
+        if cls.CJK_PATTERN.search(token):
+            grams = set(token)
+            grams.update(token[i:i + 2] for i in range(len(token) - 1))
+            return grams
+        if len(token) <= 3:
+            return {token}
+        return {token[i:i + 3] for i in range(len(token) - 2)}
+    
+    def build(self, cache_data):
+        """根据SchemaCache的缓存内容重建索引"""
+        docs = []
+        seen = set()
+        
+        def add_doc(kind, name, path, **extra):
+            key = (kind, tuple(path))
+            if key in seen or not name:
+                return
+            seen.add(key)
+            docs.append({'kind': kind, 'name': name, 'path': '.'.join(path), **extra})
+        
+        for entry in cache_data.values():
+            for catalog_name, catalog_data in entry.items():
+                add_doc('catalog', catalog_name, [catalog_name])
+                for schema_name, schema_data in catalog_data.get('schemas', {}).items():
+                    add_doc('schema', schema_name, [catalog_name, schema_name])
+                    for table_name, table_data in schema_data.get('tables', {}).items():
+                        table_path = [catalog_name, schema_name, table_name]
+                        add_doc('table', table_name, table_path, table_type=table_data.get('type'))
+                        for column in table_data.get('columns', []):
+                            add_doc('column', column.get('name'), table_path + [column.get('name') or ''],
+                                    table_path='.'.join(table_path), column_type=column.get('type'))
+        
+        exact_index = {}
+        token_index = {}
+        context_index = {}
+        ngram_index = {}
+        for doc_id, doc in enumerate(docs):
+            exact_index.setdefault(doc['name'].lower(), set()).add(doc_id)
+            for token in self.tokenize(doc['name']):
+                token_index.setdefault(token, set()).add(doc_id)
+                for gram in self.ngrams(token):
+                    ngram_index.setdefault(gram, set()).add(doc_id)
+            if doc['kind'] == 'column':
+                for token in self.tokenize(doc['table_path'].rsplit('.', 1)[-1]):
+                    context_index.setdefault(token, set()).add(doc_id)
+        
+        with self.lock:
+            self.docs = docs
+            self.exact_index = exact_index
+            self.token_index = token_index
+            self.context_index = context_index
+            self.sorted_tokens = sorted(token_index)
+            self.ngram_index = ngram_index
+            self.built_at = datetime.now()
+        
+        logger.info(f"Schema搜索索引已重建: {len(docs)} 个条目, {len(token_index)} 个词")
+    
+    def search(self, query, limit=20, kind=None):
+        """搜索并按相关度排序：完整匹配 > 词匹配 > 前缀匹配 > n-gram匹配"""
+        query = (query or '').strip().lower()
+        if not query:
+            return []
+        
+        with self.lock:
+            docs = self.docs
+            scores = {}
+            
+            def add_score(doc_ids, score):
+                for doc_id in doc_ids:
+                    scores[doc_id] = scores.get(doc_id, 0) + score
+            
+            add_score(self.exact_index.get(query, ()), 100)
+            
+            tokens = self.tokenize(query)
+            for token in tokens:
+                add_score(self.token_index.get(token, ()), 40)
+                if len(tokens) > 1:
+                    add_score(self.context_index.get(token, ()), 25)
+                
+                # 前缀匹配（有序词表二分查找）
+                start = bisect.bisect_left(self.sorted_tokens, token)
+                for i in range(start, len(self.sorted_tokens)):
+                    candidate = self.sorted_tokens[i]
+                    if not candidate.startswith(token):
+                        break
+                    if candidate != token:
+                        add_score(self.token_index[candidate], 20 * len(token) / len(candidate))
+                
+                # n-gram匹配：用于中文片段和子串
+                grams = self.ngrams(token)
+                gram_hits = {}
+                for gram in grams:
+                    for doc_id in self.ngram_index.get(gram, ()):
+                        gram_hits[doc_id] = gram_hits.get(doc_id, 0) + 1
+                for doc_id, hits in gram_hits.items():
+                    add_score((doc_id,), 10 * hits / len(grams))
+        
+        results = []
+        for doc_id, score in scores.items():
+            doc = docs[doc_id]
+            if kind and doc['kind'] != kind:
+                continue
+            # 同等得分时名称越短越相关
+            score = score * self.KIND_WEIGHTS.get(doc['kind'], 1.0) / (1 + len(doc['name']) / 100)
+            results.append({**doc, 'score': round(score, 3)})
+        
+        results.sort(key=lambda item: (-item['score'], item['path']))
+        return results[:limit]
+    
+    def stats(self):
+        with self.lock:
+            return {
+                'documents': len(self.docs),
+                'tokens': len(self.token_index),
+                'ngrams': len(self.ngram_index),
+                'built_at': self.built_at.isoformat() if self.built_at else None
+            }
+
 class SchemaCache:
     """Schema缓存 - 负责定时刷新"""
     
-    def __init__(self, refresh_interval_minutes=30):
+    def __init__(self, refresh_interval_minutes=30, snapshot_path=None, snapshot_save_delay=30):
         self.cache = {}
-        self.table_details_cache = {}
+        self.table_details_cache = TTLCache(
+            max_entries=TABLE_DETAILS_CACHE_MAX_ENTRIES,
+            max_bytes=TABLE_DETAILS_CACHE_MAX_MB * 1024 * 1024,
+            default_ttl=TABLE_DETAILS_CACHE_TTL
+        )
         self.last_refresh = None
+        self.last_refresh_stats = None
+        self.last_refresh_errors = []
+        self.entity_index = {}  # {dataset_id: {tag, type, columns, path}}，用于增量刷新
+        self.container_index = {}  # {container_id: {tag, path, listed_at}}，用于增量刷新时跳过未变化的schema
         self.refresh_interval = timedelta(minutes=refresh_interval_minutes)
         self.lock = threading.Lock()
+        
+        # 快照持久化
+        self.snapshot_path = snapshot_path
+        self.snapshot_saved_at = None
+        self.snapshot_save_delay = snapshot_save_delay
+        self.snapshot_timer = None
+        self.snapshot_mtime = None  # 最近一次加载或保存的快照文件修改时间
+        self.source = None  # 'snapshot' 或 'dremio'
+        
+        # 多进程刷新选主：持有快照锁文件的进程负责刷新与保存快照，未持有锁的进程只加载快照
+        self.leader_lock_file = None
+        self.leader_pid = None
+        self.follower = False
+    
+        # 表/列名搜索索引，随缓存刷新重建
+        self.search_index = SchemaSearchIndex()
     
     def get(self, catalog, schema):
         """获取缓存的schema信息"""
@@ -58,16 +397,27 @@ class SchemaCache:
             key = f"{catalog}.{schema}"
             self.cache[key] = data
             self.last_refresh = datetime.now()
+        self.rebuild_search_index()
+        self.schedule_snapshot()
     
     def get_table_details(self, table_path):
         """获取表详细信息缓存"""
-        with self.lock:
-            return self.table_details_cache.get(table_path)
+        return self.table_details_cache.get(table_path)
     
     def set_table_details(self, table_path, data):
         """设置表详细信息缓存"""
-        with self.lock:
-            self.table_details_cache[table_path] = data
+        self.table_details_cache.set(table_path, data)
+        self.schedule_snapshot()
+    
+    def invalidate_table_details(self, dataset_path):
+        """使指定数据集的表详细信息缓存失效（路径格式不同也能匹配）"""
+        target = QueryResultCache.normalize_dataset_path(dataset_path)
+        
+        def matches(key, meta):
+            normalized = QueryResultCache.normalize_dataset_path(key)
+            return normalized == target or target.endswith('.' + normalized) or normalized.endswith('.' + target)
+        
+        return self.table_details_cache.invalidate(matches)
     
     def clear(self):
         """清空schema缓存"""
@@ -77,8 +427,7 @@ class SchemaCache:
     
     def clear_table_details(self):
         """清空表详细信息缓存"""
-        with self.lock:
-            self.table_details_cache.clear()
+        self.table_details_cache.clear()
     
     def is_expired(self):
         """检查缓存是否过期"""
@@ -86,16 +435,28 @@ class SchemaCache:
             return True
         return datetime.now() - self.last_refresh > self.refresh_interval
     
-    def refresh_all(self, dremio_client):
-        """刷新所有缓存"""
+    def refresh_all(self, dremio_client, incremental=True):
+        """刷新所有缓存
+        
+        incremental为True时，根据上次记录的数据集tag只重新获取发生变化的表
+        """
         try:
-            logger.info("开始刷新Schema缓存...")
-            result = dremio_client.get_complete_schema_with_columns()
+            with self.lock:
+                previous_entities = dict(self.entity_index) if incremental and self.cache else None
+                previous_containers = dict(self.container_index) if previous_entities is not None else None
+            
+            logger.info(f"开始{'增量' if previous_entities else '全量'}刷新Schema缓存...")
+            result = dremio_client.get_complete_schema_with_columns(
+                previous_entities=previous_entities,
+                previous_containers=previous_containers
+            )
             
             if result.get('success'):
                 with self.lock:
                     # 清空旧缓存
                     self.cache.clear()
+                    self.entity_index = result.get('entities', {})
+                    self.container_index = result.get('containers', {})
                     
                     # 设置新缓存
                     for catalog_name, catalog_data in result['data'].items():
@@ -108,242 +469,1293 @@ class SchemaCache:
                             }
                     
                     self.last_refresh = datetime.now()
+                    self.last_refresh_stats = result.get('stats')
+                    self.last_refresh_errors = result.get('errors', [])
+                    self.source = 'dremio'
                     logger.info(f"Schema缓存刷新完成，共缓存 {len(self.cache)} 个schema")
+                
+                self.rebuild_search_index()
+                self.save_snapshot()
+                
+                if result.get('errors'):
+                    logger.warning(f"Schema刷新部分失败: {len(result['errors'])} 个catalog实体获取失败")
             else:
                 logger.error(f"刷新Schema缓存失败: {result.get('error')}")
                 
+            return result
+        
         except Exception as e:
             logger.error(f"刷新Schema缓存异常: {e}")
+            return {'success': False, 'error': str(e)}
     
-    def stats(self):
-        """获取统计信息"""
+    def rebuild_search_index(self):
+        """根据当前缓存重建搜索索引"""
         with self.lock:
-            return {
-                'schema_count': len(self.cache),
-                'table_details_count': len(self.table_details_cache),
-                'last_refresh': self.last_refresh.isoformat() if self.last_refresh else None,
-                'is_expired': self.is_expired()
-            }
-
-class DremioClient:
-    """Dremio客户端 - 负责获取数据集反射"""
+            cache_data = dict(self.cache)
+        self.search_index.build(cache_data)
     
-    def __init__(self, host='localhost', port=9047, username='admin', password='admin123'):
-        self.host = host
-        self.port = port
-        self.username = username
-        self.password = password
-        self.base_url = f"http://{host}:{port}"
-        self.token = None
-        self.session = requests.Session()
+    def is_ready(self):
+        """缓存中已有schema数据（来自快照或Dremio）即视为就绪"""
+        return bool(self.cache)
+    
+    def acquire_refresh_leadership(self):
+        """尝试成为负责刷新Schema缓存并保存快照的进程，返回当前进程是否为刷新进程
         
-        # 初始化表字段缓存
-        self.table_columns_cache = {}
+        对快照文件旁的.lock文件加非阻塞排他锁（fcntl.flock），锁随进程退出自动释放，其他进程下次尝试时接替。
+        未配置快照或系统不支持fcntl时，每个进程都自行刷新。
+        """
+        if self.leader_pid == os.getpid():
+            return True
+        if not self.snapshot_path or fcntl is None:
+            self.leader_pid = os.getpid()
+            return True
         
-        # 移除超时限制，允许长时间查询
-        # self.session.timeout = None  # 不设置超时限制
+        lock_file = None
+        try:
+            directory = os.path.dirname(self.snapshot_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            lock_file = open(f"{self.snapshot_path}.lock", 'a')
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            if lock_file is not None:
+                lock_file.close()
+            if not self.follower:
+                logger.info(f"其他进程正在负责刷新Schema缓存，当前进程 (pid={os.getpid()}) 只加载快照")
+            self.follower = True
+            return False
         
-        # 登录获取token
-        self._authenticate()
+        self.leader_lock_file = lock_file
+        self.leader_pid = os.getpid()
+        self.follower = False
+        logger.info(f"当前进程 (pid={self.leader_pid}) 负责刷新Schema缓存并保存快照")
+        return True
     
-    def _authenticate(self):
-        """认证并获取token"""
+    def reload_snapshot_if_changed(self):
+        """快照文件被刷新进程更新后重新加载，返回是否已加载"""
         try:
-            auth_url = f"{self.base_url}/apiv2/login"
-            auth_data = {
-                "userName": self.username,
-                "password": self.password
-            }
-            
-            logger.info(f"正在连接Dremio: {self.base_url}")
-            response = self.session.post(auth_url, json=auth_data, timeout=None)
-            
-            if response.status_code == 200:
-                self.token = response.json().get('token')
-                self.session.headers.update({
-                    'Authorization': f'_dremio{self.token}',
-                    'Content-Type': 'application/json'
-                })
-                logger.info("Dremio认证成功")
-                return True
-            else:
-                logger.error(f"Dremio认证失败: {response.status_code} - {response.text}")
-                return False
-                
-        except Exception as e:
-            logger.error(f"Dremio认证异常: {e}")
+            mtime = os.path.getmtime(self.snapshot_path)
+        except (OSError, TypeError):
             return False
+        if mtime == self.snapshot_mtime:
+            return False
+        return self.load_snapshot(keep_last_refresh=True)
     
-    def test_connection(self):
-        """测试连接"""
+    def schedule_snapshot(self):
+        """延迟snapshot_save_delay秒保存快照，已有待执行的保存时不重复安排"""
+        if not self.snapshot_path or self.follower:
+            return
+        with self.lock:
+            if self.snapshot_timer is not None:
+                return
+            self.snapshot_timer = threading.Timer(self.snapshot_save_delay, self.save_snapshot)
+            self.snapshot_timer.daemon = True
+            self.snapshot_timer.start()
+    
+    def save_snapshot(self):
+        """将schema缓存和表详细信息缓存写入本地快照文件；未取得刷新锁的进程不写入"""
+        if not self.snapshot_path or self.follower:
+            return False
         try:
-            if not self.token:
-                if not self._authenticate():
-                    return {'success': False, 'error': '认证失败'}
+            with self.lock:
+                # 本次保存已包含之前安排的延迟保存所涉及的写入
+                if self.snapshot_timer is not None:
+                    self.snapshot_timer.cancel()
+                    self.snapshot_timer = None
+                snapshot = {
+                    'version': 2,
+                    'saved_at': datetime.now().isoformat(),
+                    'last_refresh': self.last_refresh.isoformat() if self.last_refresh else None,
+                    'cache': self.cache,
+                    'entity_index': self.entity_index,
+                    'container_index': self.container_index,
+                    # 表详情连同过期时间一起保存，加载时只保留剩余有效期
+                    'table_details': {
+                        table_path: {'data': details, 'expires_at': expires_at}
+                        for table_path, details, expires_at in self.table_details_cache.items_with_expiry()
+                    }
+                }
+                payload = json.dumps(snapshot, ensure_ascii=False, default=str).encode('utf-8')
             
-            # 测试API调用
-            response = self.session.get(f"{self.base_url}/api/v3/catalog", timeout=10)
+            directory = os.path.dirname(self.snapshot_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
             
-            # 处理401错误 - token过期，重新认证后重试
-            if response.status_code == 401:
-                logger.warning("测试连接收到401错误，token可能已过期，尝试重新认证...")
-                if self._authenticate():
-                    logger.info("重新认证成功，重试测试连接...")
-                    response = self.session.get(f"{self.base_url}/api/v3/catalog", timeout=10)
-                else:
-                    return {'success': False, 'error': '认证失败'}
+            # 先写临时文件再替换，避免进程中断留下损坏的快照
+            tmp_path = f"{self.snapshot_path}.tmp"
+            with gzip.open(tmp_path, 'wb', compresslevel=6) as f:
+                f.write(payload)
+            os.replace(tmp_path, self.snapshot_path)
             
-            if response.status_code == 200:
-                return {
-                    'success': True,
-                    'message': 'Dremio连接正常',
-                    'server_info': {
-                        'host': self.host,
-                        'port': self.port,
-                        'version': response.headers.get('Server', 'Unknown')
-                    }
-                }
-            else:
-                return {
-                    'success': False,
-                    'error': f'API调用失败: {response.status_code}'
-                }
-                
+            self.snapshot_mtime = os.path.getmtime(self.snapshot_path)
+            self.snapshot_saved_at = datetime.now()
+            logger.info(f"Schema缓存快照已保存: {self.snapshot_path} ({os.path.getsize(self.snapshot_path)} 字节)")
+            return True
+        
         except Exception as e:
-            return {
-                'success': False,
-                'error': f'连接测试失败: {str(e)}'
-            }
+            logger.error(f"保存Schema缓存快照失败: {e}")
+            return False
     
-    def get_complete_schema_with_columns(self):
-        """获取完整的schema和列信息"""
+    def load_snapshot(self, keep_last_refresh=False):
+        """加载本地快照
+        
+        启动时加载后仍视为过期，由后台刷新与Dremio对账；keep_last_refresh为True时（非刷新进程加载
+        刷新进程保存的快照）沿用快照中的刷新时间。
+        """
+        if not self.snapshot_path or not os.path.exists(self.snapshot_path):
+            return False
         try:
-            if not self.token:
-                if not self._authenticate():
-                    return {'success': False, 'error': '认证失败'}
-            
-            # 获取catalog列表
-            catalog_response = self.session.get(f"{self.base_url}/api/v3/catalog", timeout=None)
-            
-            if catalog_response.status_code != 200:
-                return {
-                    'success': False,
-                    'error': f'获取catalog失败: {catalog_response.status_code}'
-                }
-            
-            catalogs = catalog_response.json().get('data', [])
-            result = {}
-            
-            for catalog in catalogs:
-                catalog_id = catalog.get('id')
-                catalog_name = catalog.get('path', [])[-1] if catalog.get('path') else 'Unknown'
-                
-                logger.info(f"处理catalog: {catalog_name}")
-                
-                # 获取该catalog下的所有内容
-                catalog_detail_response = self.session.get(
-                    f"{self.base_url}/api/v3/catalog/{catalog_id}",
-                    timeout=None
-                )
-                
-                if catalog_detail_response.status_code == 200:
-                    catalog_detail = catalog_detail_response.json()
-                    
-                    # 处理schemas和tables
-                    schemas = {}
-                    children = catalog_detail.get('children', [])
-                    
-                    for child in children:
-                        if child.get('type') == 'CONTAINER':  # Schema
-                            schema_name = child.get('path', [])[-1]
-                            schema_id = child.get('id')
-                            
-                            # 获取schema下的表
-                            tables = self._get_tables_in_schema(schema_id)
-                            schemas[schema_name] = {
-                                'tables': tables
-                            }
-                    
-                    result[catalog_name] = {
-                        'schemas': schemas
-                    }
-            
-            return {
-                'success': True,
-                'data': result
-            }
-            
+            mtime = os.path.getmtime(self.snapshot_path)
+            with gzip.open(self.snapshot_path, 'rb') as f:
+                snapshot = json.loads(f.read().decode('utf-8'))
+            
+            now = time.time()
+            # 旧版快照未保存表详情的过期时间，无法判断剩余有效期，不再加载其表详情
+            table_details = snapshot.get('table_details', {}) if snapshot.get('version', 1) >= 2 else {}
+            restored_details = 0
+            with self.lock:
+                self.cache = snapshot.get('cache', {})
+                self.entity_index = snapshot.get('entity_index', {})
+                self.container_index = snapshot.get('container_index', {})
+                self.table_details_cache.clear()
+                for table_path, item in table_details.items():
+                    expires_at = item['expires_at']
+                    if expires_at is None:
+                        self.table_details_cache.set(table_path, item['data'], ttl=TTLCache.NO_EXPIRY)
+                    elif expires_at > now:
+                        self.table_details_cache.set(table_path, item['data'], ttl=expires_at - now)
+                    else:
+                        continue
+                    restored_details += 1
+                last_refresh = snapshot.get('last_refresh') if keep_last_refresh else None
+                self.last_refresh = datetime.fromisoformat(last_refresh) if last_refresh else None
+                self.snapshot_mtime = mtime
+                self.snapshot_saved_at = datetime.fromisoformat(snapshot['saved_at']) if snapshot.get('saved_at') else None
+                self.source = 'snapshot'
+            
+            logger.info(f"已加载Schema缓存快照: {len(self.cache)} 个schema, {len(self.entity_index)} 张表, "
+                        f"{restored_details} 条未过期的表详情, 保存于 {snapshot.get('saved_at')}")
+            self.rebuild_search_index()
+            return True
+        
         except Exception as e:
-            logger.error(f"获取schema信息异常: {e}")
+            logger.error(f"加载Schema缓存快照失败: {e}")
+            return False
+    
+    def stats(self):
+        """获取统计信息"""
+        with self.lock:
             return {
-                'success': False,
-                'error': f'获取schema信息失败: {str(e)}'
+                'schema_count': len(self.cache),
+                'table_details_count': len(self.table_details_cache),
+                'table_details_cache': self.table_details_cache.stats(),
+                'last_refresh': self.last_refresh.isoformat() if self.last_refresh else None,
+                'last_refresh_stats': self.last_refresh_stats,
+                'last_refresh_errors': self.last_refresh_errors[:20],
+                'is_expired': self.is_expired(),
+                'source': self.source,
+                'snapshot_path': self.snapshot_path,
+                'snapshot_saved_at': self.snapshot_saved_at.isoformat() if self.snapshot_saved_at else None,
+                'refresh_role': 'follower' if self.follower else ('leader' if self.leader_pid == os.getpid() else None),
+                'search_index': self.search_index.stats()
             }
+
+class TTLCache:
+    """LRU缓存 - 支持条目TTL、条目数上限和内存字节预算"""
     
-    def _get_tables_in_schema(self, schema_id):
-        """获取schema下的所有表"""
-        try:
-            response = self.session.get(f"{self.base_url}/api/v3/catalog/{schema_id}", timeout=None)
-            
-            if response.status_code != 200:
-                return {}
-            
-            schema_detail = response.json()
-            tables = {}
-            
-            for child in schema_detail.get('children', []):
-                if child.get('type') in ['PHYSICAL_DATASET', 'VIRTUAL_DATASET']:  # 表或视图
-                    table_name = child.get('path', [])[-1]
-                    table_id = child.get('id')
-                    
-                    # 获取表的列信息
-                    columns = self._get_table_columns(table_id)
-                    
-                    tables[table_name] = {
-                        'type': child.get('type'),
-                        'columns': columns
-                    }
-            
-            return tables
-            
-        except Exception as e:
-            logger.error(f"获取schema表信息异常: {e}")
-            return {}
+    # set的ttl传入该值时条目不过期（不使用default_ttl）
+    NO_EXPIRY = object()
     
-    def _get_table_columns(self, table_id):
-        """获取表的列信息"""
-        try:
-            response = self.session.get(f"{self.base_url}/api/v3/catalog/{table_id}", timeout=None)
-            
-            if response.status_code != 200:
-                return []
-            
-            table_detail = response.json()
-            fields = table_detail.get('fields', [])
-            
-            columns = []
-            for field in fields:
-                columns.append({
-                    'name': field.get('name'),
-                    'type': field.get('type', {}).get('name', 'Unknown')
-                })
-            
-            return columns
-            
-        except Exception as e:
-            logger.error(f"获取表列信息异常: {e}")
-            return []
+    def __init__(self, max_entries=None, max_bytes=None, default_ttl=None):
+        self.entries = OrderedDict()  # {key: {value, size, expires_at, meta}}
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+        self.total_bytes = 0
+        self.lock = threading.Lock()
+        
+        # 统计计数
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
     
-    def execute_sql_query(self, sql, timeout=None):
-        """执行SQL查询"""
+    @staticmethod
+    def estimate_size(value):
+        """估算缓存值的字节数（按JSON序列化长度计算）"""
         try:
-            # 添加详细的SQL打印日志
-            logger.info(f"=== SQL查询开始 ===")
-            logger.info(f"原始SQL: {sql}")
-            logger.info(f"SQL长度: {len(sql)}")
-            logger.info(f"SQL类型: {type(sql)}")
-            logger.info(f"超时设置: {'无限制' if timeout is None else f'{timeout}秒'}")
+            return len(json.dumps(value, ensure_ascii=False, default=str).encode('utf-8'))
+        except Exception:
+            return 0
+    
+    def _remove(self, key):
+        entry = self.entries.pop(key)
+        self.total_bytes -= entry['size']
+        return entry
+    
+    def get(self, key):
+        """获取缓存值，过期或不存在时返回None"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            
+            if entry['expires_at'] is not None and time.time() > entry['expires_at']:
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry['value']
+    
+    def set(self, key, value, ttl=None, size=None, meta=None):
+        """写入缓存，超出预算时按LRU淘汰；单条超过总预算时不缓存
+        
+        ttl为None时使用default_ttl（default_ttl也为None时不过期），为NO_EXPIRY时不过期，
+        不大于0时条目立即过期，不写入缓存。
+        """
+        size = size if size is not None else self.estimate_size(value)
+        ttl = ttl if ttl is not None else self.default_ttl
+        if ttl is self.NO_EXPIRY:
+            ttl = None
+        elif ttl is not None and ttl <= 0:
+            return False
+        
+        if self.max_bytes is not None and size > self.max_bytes:
+            return False
+        
+        with self.lock:
+            if key in self.entries:
+                self._remove(key)
+            
+            self.entries[key] = {
+                'value': value,
+                'size': size,
+                'expires_at': time.time() + ttl if ttl is not None else None,
+                'meta': meta
+            }
+            self.total_bytes += size
+            
+            while self.entries and (
+                (self.max_bytes is not None and self.total_bytes > self.max_bytes) or
+                (self.max_entries is not None and len(self.entries) > self.max_entries)
+            ):
+                oldest_key = next(iter(self.entries))
+                self._remove(oldest_key)
+                self.evictions += 1
+        
+        return True
+    
+    def delete(self, key):
+        """删除指定缓存条目"""
+        with self.lock:
+            if key in self.entries:
+                self._remove(key)
+                self.invalidations += 1
+                return True
+            return False
+    
+    def invalidate(self, predicate):
+        """删除所有满足 predicate(key, meta) 的条目，返回删除数量"""
+        with self.lock:
+            keys = [key for key, entry in self.entries.items() if predicate(key, entry['meta'])]
+            for key in keys:
+                self._remove(key)
+            self.invalidations += len(keys)
+            return len(keys)
+    
+    def clear(self):
+        """清空缓存"""
+        with self.lock:
+            self.entries.clear()
+            self.total_bytes = 0
+    
+    def keys(self):
+        with self.lock:
+            return list(self.entries.keys())
+    
+    def items(self):
+        """返回未过期的 (key, value) 列表"""
+        now = time.time()
+        with self.lock:
+            return [
+                (key, entry['value']) for key, entry in self.entries.items()
+                if entry['expires_at'] is None or entry['expires_at'] > now
+            ]
+    
+    def items_with_expiry(self):
+        """返回未过期的 (key, value, expires_at) 列表，expires_at为None表示不过期"""
+        now = time.time()
+        with self.lock:
+            return [
+                (key, entry['value'], entry['expires_at']) for key, entry in self.entries.items()
+                if entry['expires_at'] is None or entry['expires_at'] > now
+            ]
+    
+    def __len__(self):
+        return len(self.entries)
+    
+    def stats(self):
+        """获取统计信息"""
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self.entries),
+                'bytes': self.total_bytes,
+                'max_bytes': self.max_bytes,
+                'max_entries': self.max_entries,
+                'default_ttl': self.default_ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'invalidations': self.invalidations
+            }
+
+class QueryResultCache:
+    """SQL查询结果缓存 - 按规范化SQL缓存，数据集刷新时自动失效"""
+    
+    # FROM/JOIN 后面的表引用，支持 "minio".warehouse."ods" 这类带引号的路径
+    TABLE_REF_PATTERN = re.compile(
+        r'\b(?:FROM|JOIN)\s+((?:"[^"]+"|[\w@$\-]+)(?:\s*\.\s*(?:"[^"]+"|[\w@$\-]+))*)',
+        re.IGNORECASE
+    )
+    
+    def __init__(self, max_bytes, max_entry_bytes, default_ttl):
+        self.cache = TTLCache(max_bytes=max_bytes, default_ttl=default_ttl)
+        self.max_entry_bytes = max_entry_bytes
+        self.skipped_too_large = 0
+    
+    @staticmethod
+    def normalize_sql(sql):
+        """规范化SQL：合并引号外的连续空白并去掉末尾分号"""
+        parts = []
+        quote = None
+        pending_space = False
+        for char in sql.strip():
+            if quote:
+                parts.append(char)
+                if char == quote:
+                    quote = None
+                continue
+            if char.isspace():
+                pending_space = True
+                continue
+            if pending_space and parts:
+                parts.append(' ')
+            pending_space = False
+            parts.append(char)
+            if char in ('"', "'"):
+                quote = char
+        return ''.join(parts).rstrip(';').rstrip()
+    
+    @staticmethod
+    def normalize_dataset_path(path):
+        """规范化数据集路径：去掉引号与空白并转小写，用于匹配"""
+        return '.'.join(part.strip() for part in path.replace('"', '').lower().split('.') if part.strip())
+    
+    @classmethod
+    def extract_datasets(cls, sql):
+        """提取SQL中引用的数据集路径"""
+        return {cls.normalize_dataset_path(match) for match in cls.TABLE_REF_PATTERN.findall(sql)}
+    
+    @staticmethod
+    def is_cacheable(sql):
+        """只缓存只读查询"""
+        head = sql.lstrip('( \n\t').split(None, 1)
+        return bool(head) and head[0].upper() in ('SELECT', 'WITH')
+    
+    def _estimate_result_size(self, result):
+        """按前100行抽样估算结果的字节数，避免对大结果整体序列化"""
+        rows = result.get('data', [])
+        sample = rows[:100]
+        if not sample:
+            return TTLCache.estimate_size(result)
+        sample_size = TTLCache.estimate_size(sample)
+        return int(sample_size / len(sample) * len(rows)) + TTLCache.estimate_size(result.get('columns', []))
+    
+    def get(self, sql):
+        return self.cache.get(self.normalize_sql(sql))
+    
+    def set(self, sql, result, ttl=None):
+        """缓存查询结果，返回是否写入成功"""
+        if not self.is_cacheable(sql):
+            return False
+        
+        size = self._estimate_result_size(result)
+        if size > self.max_entry_bytes:
+            self.skipped_too_large += 1
+            logger.info(f"查询结果过大({size}字节)，跳过缓存")
+            return False
+        
+        normalized = self.normalize_sql(sql)
+        return self.cache.set(normalized, result, ttl=ttl, size=size, meta={'datasets': self.extract_datasets(normalized)})
+    
+    def invalidate_dataset(self, dataset_path):
+        """使引用了指定数据集的缓存失效，返回失效条目数"""
+        target = self.normalize_dataset_path(dataset_path)
+        
+        def references_dataset(key, meta):
+            for ref in (meta or {}).get('datasets', ()):
+                # 查询中可能只写了部分路径（如 ods.table），两个方向都按后缀匹配
+                if ref == target or target.endswith('.' + ref) or ref.endswith('.' + target):
+                    return True
+            return False
+        
+        count = self.cache.invalidate(references_dataset)
+        if count:
+            logger.info(f"数据集 {dataset_path} 已刷新，失效 {count} 条查询结果缓存")
+        return count
+    
+    def clear(self):
+        self.cache.clear()
+    
+    def stats(self):
+        stats = self.cache.stats()
+        stats['enabled'] = QUERY_CACHE_ENABLED
+        stats['max_entry_bytes'] = self.max_entry_bytes
+        stats['skipped_too_large'] = self.skipped_too_large
+        return stats
+
+class SingleFlight:
+    """合并相同的并发调用 - 第一个调用者执行，其余相同key的调用者等待并共享结果"""
+    
+    def __init__(self):
+        self.calls = {}  # {key: Future}
+        self.lock = threading.Lock()
+        self.executed = 0
+        self.coalesced = 0
+    
+    def do(self, key, func, *args, **kwargs):
+        """执行func，返回 (result, shared)；shared为True表示复用了其他调用者的结果"""
+        with self.lock:
+            future = self.calls.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self.calls[key] = future
+                self.executed += 1
+            else:
+                self.coalesced += 1
+        
+        if not leader:
+            return future.result(), True
+        
+        try:
+            result = func(*args, **kwargs)
+            future.set_result(result)
+            return result, False
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self.lock:
+                self.calls.pop(key, None)
+    
+    def stats(self):
+        """获取统计信息"""
+        with self.lock:
+            return {
+                'in_flight': len(self.calls),
+                'executed': self.executed,
+                'coalesced': self.coalesced
+            }
+
+class SharedBatchStream:
+    """一次导出查询的批次流，由相同SQL的并发导出共同读取
+    
+    读得最快的订阅者从源头拉取批次，其余订阅者从缓冲区读取，所有订阅者都读过的批次即释放。
+    已读取的批次总量不超过replay_bytes时，新到的相同导出仍可加入并从第一个批次开始读取；
+    超过后不再接受加入，缓冲区只保留尚有订阅者未读的批次。
+    
+    缓冲区达到max_lag_bytes时不再从源头拉取（同时停止接受加入），等待最慢的订阅者追上；
+    等待超过lag_timeout秒后，落后最多的订阅者被移出，其后续读取抛出SharedStreamDetached。
+    """
+    
+    def __init__(self, replay_bytes, max_lag_bytes, lag_timeout, on_closed=None):
+        self.replay_bytes = replay_bytes
+        self.max_lag_bytes = max_lag_bytes
+        self.lag_timeout = lag_timeout
+        self.on_closed = on_closed
+        self.condition = threading.Condition()
+        self.source = None
+        self.started = False
+        self.error = None
+        self.done = False
+        self.reading = False
+        self.joinable = True
+        self.buffer = []  # 缓冲区中的批次，buffer[0]的序号为offset
+        self.offset = 0
+        self.read_bytes = 0
+        self.buffered_bytes = 0
+        self.positions = {}  # {订阅者编号: 下一个要读取的批次序号}，不引用订阅者本身以便未关闭的订阅者可被回收
+        self.detached = set()  # 因落后过多被移出的订阅者编号
+        self.next_token = itertools.count()
+    
+    def subscribe(self):
+        """加入读取，返回订阅者；已不接受加入时返回None"""
+        with self.condition:
+            if not self.joinable:
+                return None
+            token = next(self.next_token)
+            self.positions[token] = 0
+            return SharedBatchSubscriber(self, token)
+    
+    def start(self, factory):
+        """由第一个订阅者调用：打开源头批次流，失败时所有等待中的订阅者收到同一个异常"""
+        try:
+            source = factory()
+        except BaseException as e:
+            with self.condition:
+                self.error = e
+                self.started = True
+                self.joinable = False
+                self.condition.notify_all()
+            self._closed()
+            raise
+        with self.condition:
+            self.source = source
+            self.started = True
+            self.condition.notify_all()
+    
+    def wait_started(self):
+        """等待源头批次流打开，打开失败时抛出相同的异常"""
+        with self.condition:
+            while not self.started:
+                self.condition.wait()
+            if self.source is None:
+                raise self.error
+    
+    def next_batch(self, token):
+        lag_deadline = None
+        while True:
+            stop_joining = False
+            with self.condition:
+                while True:
+                    if token in self.detached:
+                        raise SharedStreamDetached(
+                            f'导出读取落后超过{self.max_lag_bytes // (1024 * 1024)}MB且{self.lag_timeout:g}秒内未追上，已被移出共享批次流'
+                        )
+                    position = self.positions[token]
+                    if position < self.offset + len(self.buffer):
+                        batch = self.buffer[position - self.offset]
+                        self.positions[token] = position + 1
+                        self._trim()
+                        return batch
+                    if self.error is not None:
+                        raise self.error
+                    if self.done:
+                        raise StopIteration
+                    if self.reading:
+                        self.condition.wait()
+                        continue
+                    if self.buffered_bytes < self.max_lag_bytes:
+                        self.reading = True
+                        break
+                    if self.joinable:
+                        # 缓冲区达到上限，不再为新订阅者保留已读批次
+                        self.joinable = False
+                        self._trim()
+                        stop_joining = True
+                        break
+                    # 仍有订阅者落后超过上限：暂停拉取等待其追上，超时后将其移出
+                    if lag_deadline is None:
+                        lag_deadline = time.time() + self.lag_timeout
+                    remaining = lag_deadline - time.time()
+                    if remaining <= 0:
+                        self._detach_laggards()
+                        lag_deadline = None
+                        continue
+                    self.condition.wait(remaining)
+            if stop_joining:
+                self._closed()
+                continue
+            break
+        
+        # 由当前订阅者从源头读取下一个批次，读取期间不持有锁
+        try:
+            batch = next(self.source)
+        except StopIteration:
+            with self.condition:
+                self.done = True
+                self.reading = False
+                self.joinable = False
+                self.condition.notify_all()
+            self._closed()
+            raise
+        except BaseException as e:
+            with self.condition:
+                self.error = e
+                self.reading = False
+                self.joinable = False
+                self.condition.notify_all()
+            self._closed()
+            raise
+        
+        closed = False
+        with self.condition:
+            self.reading = False
+            self.buffer.append(batch)
+            self.positions[token] = self.offset + len(self.buffer)
+            self.read_bytes += batch.nbytes
+            self.buffered_bytes += batch.nbytes
+            if self.joinable and self.read_bytes > self.replay_bytes:
+                self.joinable = False
+                closed = True
+            self._trim()
+            self.condition.notify_all()
+        if closed:
+            self._closed()
+        return batch
+    
+    def _trim(self):
+        """不再接受加入时，释放所有订阅者都已读过的批次"""
+        if self.joinable or not self.positions:
+            return
+        consumed = min(self.positions.values()) - self.offset
+        if consumed > 0:
+            self.buffered_bytes -= sum(batch.nbytes for batch in self.buffer[:consumed])
+            del self.buffer[:consumed]
+            self.offset += consumed
+            self.condition.notify_all()
+    
+    def _detach_laggards(self):
+        """移出落后最多的订阅者，直到缓冲区回到上限以内"""
+        while self.positions and self.buffered_bytes >= self.max_lag_bytes:
+            slowest = min(self.positions.values())
+            for token in [token for token, position in self.positions.items() if position == slowest]:
+                del self.positions[token]
+                self.detached.add(token)
+                logger.warning(f"共享导出订阅者落后超过{self.max_lag_bytes}字节，已移出共享批次流")
+            self._trim()
+    
+    def unsubscribe(self, token):
+        """订阅者退出；最后一个订阅者退出时关闭源头批次流（取消Dremio上的数据流并归还准入名额）"""
+        with self.condition:
+            self.positions.pop(token, None)
+            self.detached.discard(token)
+            if self.positions or not self.started:
+                self._trim()
+                return
+            self.joinable = False
+            self.buffer = []
+            self.buffered_bytes = 0
+            source, self.source = self.source, None
+        if source is not None:
+            source.close()
+        self._closed()
+    
+    def _closed(self):
+        if self.on_closed:
+            self.on_closed(self)
+
+class SharedStreamDetached(Exception):
+    """订阅者读取过慢，已被移出共享批次流"""
+
+class SharedBatchSubscriber:
+    """共享批次流的一个读取方，接口与QueryBatchStream一致（可迭代、可关闭）"""
+    
+    def __init__(self, stream, token):
+        self.stream = stream
+        self.token = token
+        self.closed = False
+    
+    def __iter__(self):
+        return self
+    
+    def __next__(self):
+        if self.closed:
+            raise StopIteration
+        try:
+            return self.stream.next_batch(self.token)
+        except BaseException:
+            self.close()
+            raise
+    
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        self.stream.unsubscribe(self.token)
+    
+    def __del__(self):
+        self.close()
+
+class SharedBatchStreams:
+    """按key合并相同的并发导出查询 - 第一个请求打开批次流，其余请求加入同一批次流读取"""
+    
+    def __init__(self, replay_bytes, max_lag_bytes=None, lag_timeout=60):
+        self.replay_bytes = replay_bytes
+        self.max_lag_bytes = max_lag_bytes if max_lag_bytes is not None else replay_bytes
+        self.lag_timeout = lag_timeout
+        self.streams = {}  # {key: SharedBatchStream}
+        self.lock = threading.Lock()
+        self.executed = 0
+        self.coalesced = 0
+    
+    def open(self, key, factory):
+        """返回key对应批次流的订阅者；没有可加入的批次流时调用factory()打开新的源头"""
+        with self.lock:
+            stream = self.streams.get(key)
+            subscriber = stream.subscribe() if stream else None
+            leader = subscriber is None
+            if leader:
+                stream = SharedBatchStream(
+                    self.replay_bytes, self.max_lag_bytes, self.lag_timeout,
+                    on_closed=lambda s: self._discard(key, s)
+                )
+                subscriber = stream.subscribe()
+                self.streams[key] = stream
+                self.executed += 1
+            else:
+                self.coalesced += 1
+        
+        try:
+            if leader:
+                stream.start(factory)
+            else:
+                stream.wait_started()
+        except BaseException:
+            subscriber.closed = True
+            with stream.condition:
+                stream.positions.pop(subscriber.token, None)
+            raise
+        return subscriber
+    
+    def _discard(self, key, stream):
+        with self.lock:
+            if self.streams.get(key) is stream:
+                del self.streams[key]
+    
+    def stats(self):
+        """获取统计信息"""
+        with self.lock:
+            return {
+                'in_flight': len(self.streams),
+                'executed': self.executed,
+                'coalesced': self.coalesced
+            }
+
+class AdmissionRejected(Exception):
+    """查询未获准执行（队列已满或排队超时）"""
+    
+    def __init__(self, priority, reason, message, retry_after=1):
+        super().__init__(message)
+        self.priority = priority
+        self.reason = reason  # queue_full / timeout
+        self.retry_after = retry_after
+
+class AdmissionController:
+    """Dremio查询准入控制 - 限制并发查询数，按优先级类别排队，队列已满时立即拒绝
+    
+    优先级从高到低为 interactive（交互查询）、export（数据导出）、maintenance（元数据/反射刷新）。
+    有空闲名额时优先放行高优先级队列的队首；某一类别达到自身并发上限时不阻塞其他类别。
+    """
+    
+    PRIORITIES = ('interactive', 'export', 'maintenance')
+    
+    def __init__(self, max_concurrent, class_concurrency, queue_limits, queue_timeout=60):
+        self.max_concurrent = max_concurrent
+        self.class_concurrency = class_concurrency
+        self.queue_limits = queue_limits
+        self.queue_timeout = queue_timeout
+        self.condition = threading.Condition()
+        self.running_total = 0
+        self.running = {priority: 0 for priority in self.PRIORITIES}
+        self.queues = {priority: deque() for priority in self.PRIORITIES}
+        self.metrics = {
+            priority: {
+                'admitted': 0,
+                'rejected': 0,
+                'timeouts': 0,
+                'wait_total': 0.0,
+                'wait_max': 0.0,
+                'recent_waits': deque(maxlen=1000)
+            }
+            for priority in self.PRIORITIES
+        }
+    
+    def _has_capacity(self, priority):
+        return self.running_total < self.max_concurrent and self.running[priority] < self.class_concurrency[priority]
+    
+    def _next_eligible(self):
+        """返回下一个可以放行的排队请求"""
+        for priority in self.PRIORITIES:
+            if self.queues[priority] and self._has_capacity(priority):
+                return self.queues[priority][0]
+        return None
+    
+    def acquire(self, priority, timeout=None):
+        """申请一个执行名额，获准前阻塞；队列已满或等待超时时抛出AdmissionRejected"""
+        if priority not in self.PRIORITIES:
+            raise ValueError(f"未知的查询优先级: {priority}")
+        
+        timeout = self.queue_timeout if timeout is None else timeout
+        start_time = time.time()
+        metrics = self.metrics[priority]
+        
+        with self.condition:
+            queue_ = self.queues[priority]
+            if len(queue_) >= self.queue_limits[priority]:
+                metrics['rejected'] += 1
+                raise AdmissionRejected(priority, 'queue_full', f"{priority} 查询排队已满（{len(queue_)}），请稍后重试")
+            
+            ticket = object()
+            queue_.append(ticket)
+            while self._next_eligible() is not ticket:
+                remaining = start_time + timeout - time.time()
+                if remaining <= 0:
+                    queue_.remove(ticket)
+                    metrics['timeouts'] += 1
+                    self.condition.notify_all()
+                    raise AdmissionRejected(priority, 'timeout', f"{priority} 查询排队超时（{timeout}秒）", retry_after=5)
+                self.condition.wait(remaining)
+            
+            queue_.popleft()
+            self.running[priority] += 1
+            self.running_total += 1
+            
+            wait_time = time.time() - start_time
+            metrics['admitted'] += 1
+            metrics['wait_total'] += wait_time
+            metrics['wait_max'] = max(metrics['wait_max'], wait_time)
+            metrics['recent_waits'].append(wait_time)
+            # 仍有空余名额时唤醒其他类别的排队请求
+            self.condition.notify_all()
+        
+        if wait_time > 0.1:
+            logger.info(f"{priority} 查询排队 {wait_time:.2f}秒后获准执行")
+    
+    def release(self, priority):
+        """归还执行名额"""
+        with self.condition:
+            self.running[priority] -= 1
+            self.running_total -= 1
+            self.condition.notify_all()
+    
+    @contextmanager
+    def admit(self, priority, timeout=None):
+        """在获准的执行名额内运行代码块"""
+        self.acquire(priority, timeout)
+        try:
+            yield
+        finally:
+            self.release(priority)
+    
+    def stats(self):
+        """获取各优先级类别的运行、排队与等待时间统计"""
+        with self.condition:
+            classes = {}
+            for priority in self.PRIORITIES:
+                metrics = self.metrics[priority]
+                waits = sorted(metrics['recent_waits'])
+                classes[priority] = {
+                    'running': self.running[priority],
+                    'queued': len(self.queues[priority]),
+                    'concurrency_limit': self.class_concurrency[priority],
+                    'queue_limit': self.queue_limits[priority],
+                    'admitted': metrics['admitted'],
+                    'rejected': metrics['rejected'],
+                    'timeouts': metrics['timeouts'],
+                    'avg_wait_ms': round(metrics['wait_total'] / metrics['admitted'] * 1000, 2) if metrics['admitted'] else 0,
+                    'p95_wait_ms': round(waits[int(len(waits) * 0.95)] * 1000, 2) if waits else 0,
+                    'max_wait_ms': round(metrics['wait_max'] * 1000, 2)
+                }
+            return {
+                'max_concurrent': self.max_concurrent,
+                'running': self.running_total,
+                'classes': classes
+            }
+
+class AdaptivePoller:
+    """自适应轮询器 - 起初以几十毫秒快速轮询，之后按指数退避逐步放慢到上限"""
+    
+    def __init__(self, timeout=None, initial_interval=None, max_interval=None, backoff=None):
+        self.timeout = timeout
+        self.initial_interval = initial_interval if initial_interval is not None else DREMIO_POLL_INITIAL_INTERVAL
+        self.max_interval = max_interval if max_interval is not None else DREMIO_POLL_MAX_INTERVAL
+        self.backoff = backoff if backoff is not None else DREMIO_POLL_BACKOFF
+        self.start_time = time.time()
+        self.next_interval = self.initial_interval
+        self.polls = 0
+        self.slept = 0.0
+        self.intervals = []
+    
+    def record_poll(self):
+        """记录一次状态检查"""
+        self.polls += 1
+    
+    def remaining(self):
+        """距离超时的剩余秒数，无超时限制时返回None"""
+        if self.timeout is None:
+            return None
+        return self.timeout - (time.time() - self.start_time)
+    
+    def sleep(self):
+        """按当前间隔休眠并放大下一次间隔，已超时则返回False"""
+        interval = self.next_interval
+        remaining = self.remaining()
+        if remaining is not None:
+            if remaining <= 0:
+                return False
+            interval = min(interval, remaining)
+        
+        time.sleep(interval)
+        self.slept += interval
+        self.intervals.append(interval)
+        self.next_interval = min(self.next_interval * self.backoff, self.max_interval)
+        return True
+    
+    def stats(self):
+        """获取轮询统计信息（毫秒）"""
+        return {
+            'polls': self.polls,
+            'elapsed_ms': round((time.time() - self.start_time) * 1000, 1),
+            'slept_ms': round(self.slept * 1000, 1),
+            'last_interval_ms': round(self.intervals[-1] * 1000, 1) if self.intervals else 0
+        }
+
+class DremioClient:
+    """Dremio客户端 - 负责获取数据集反射"""
+    
+    def __init__(self, host='localhost', port=9047, username='admin', password='admin123'):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.base_url = f"http://{host}:{port}"
+        self.token = None
+        self.session = requests.Session()
+        # 并发爬取的线程共用同一个session，token过期时只允许一个线程重新登录
+        self.auth_lock = threading.Lock()
+        
+        # 初始化表字段缓存
+        self.table_columns_cache = {}
+        
+        # 移除超时限制，允许长时间查询
+        # self.session.timeout = None  # 不设置超时限制
+        
+        # 登录获取token
+        self._authenticate()
+    
+    def _authenticate(self, stale_token=None):
+        """认证并获取token
+        
+        stale_token为请求失败时使用的token（默认取调用时的token）；在锁内发现token已被其他线程
+        更新时直接使用新token，不再重复登录。
+        """
+        if stale_token is None:
+            stale_token = self.token
+        with self.auth_lock:
+            if self.token and self.token != stale_token:
+                return True
+            return self._login()
+    
+    def _login(self):
+        """调用登录接口获取token并更新session的认证头，调用方需持有auth_lock"""
+        try:
+            auth_url = f"{self.base_url}/apiv2/login"
+            auth_data = {
+                "userName": self.username,
+                "password": self.password
+            }
+            
+            logger.info(f"正在连接Dremio: {self.base_url}")
+            response = self.session.post(auth_url, json=auth_data, timeout=None)
+            
+            if response.status_code == 200:
+                self.token = response.json().get('token')
+                self.session.headers.update({
+                    'Authorization': f'_dremio{self.token}',
+                    'Content-Type': 'application/json'
+                })
+                logger.info("Dremio认证成功")
+                return True
+            else:
+                logger.error(f"Dremio认证失败: {response.status_code} - {response.text}")
+                return False
+                
+        except Exception as e:
+            logger.error(f"Dremio认证异常: {e}")
+            return False
+    
+    def test_connection(self):
+        """测试连接"""
+        try:
+            if not self.token:
+                if not self._authenticate():
+                    return {'success': False, 'error': '认证失败'}
+            
+            # 测试API调用
+            response = self.session.get(f"{self.base_url}/api/v3/catalog", timeout=10)
+            
+            # 处理401错误 - token过期，重新认证后重试
+            if response.status_code == 401:
+                logger.warning("测试连接收到401错误，token可能已过期，尝试重新认证...")
+                if self._authenticate():
+                    logger.info("重新认证成功，重试测试连接...")
+                    response = self.session.get(f"{self.base_url}/api/v3/catalog", timeout=10)
+                else:
+                    return {'success': False, 'error': '认证失败'}
+            
+            if response.status_code == 200:
+                return {
+                    'success': True,
+                    'message': 'Dremio连接正常',
+                    'server_info': {
+                        'host': self.host,
+                        'port': self.port,
+                        'version': response.headers.get('Server', 'Unknown')
+                    }
+                }
+            else:
+                return {
+                    'success': False,
+                    'error': f'API调用失败: {response.status_code}'
+                }
+                
+        except Exception as e:
+            return {
+                'success': False,
+                'error': f'连接测试失败: {str(e)}'
+            }
+    
+    def get_complete_schema_with_columns(self, max_workers=None, request_timeout=None, previous_entities=None,
+                                         previous_containers=None):
+        """获取完整的schema和列信息 - 使用有界线程池并发抓取catalog
+        
+        Args:
+            max_workers: 并发线程数
+            request_timeout: 单个catalog请求超时（秒）
+            previous_entities: 上次抓取返回的entities；数据集tag未变化时直接复用其列信息
+            previous_containers: 上次抓取返回的containers；schema容器tag未变化且未超过
+                SCHEMA_CONTAINER_REUSE_MAX_AGE时不再列出该schema，直接复用上次的表
+        """
+        try:
+            if not self.token:
+                if not self._authenticate():
+                    return {'success': False, 'error': '认证失败'}
+            
+            max_workers = max_workers or SCHEMA_CRAWL_WORKERS
+            request_timeout = request_timeout or SCHEMA_CRAWL_TIMEOUT
+            start_time = time.time()
+            
+            # 获取catalog列表
+            catalog_response = self.session.get(f"{self.base_url}/api/v3/catalog", timeout=request_timeout)
+            
+            if catalog_response.status_code != 200:
+                return {
+                    'success': False,
+                    'error': f'获取catalog失败: {catalog_response.status_code}'
+                }
             
+            catalogs = catalog_response.json().get('data', [])
+            result = {}
+            errors = []
+            entities = {}
+            containers = {}
+            table_count = 0
+            reused_count = 0
+            reused_schema_count = 0
+            
+            # 上次的表按所属schema分组，复用整个schema时无需遍历全部entities
+            previous_by_schema = {}
+            for entity_id, entity in (previous_entities or {}).items():
+                previous_by_schema.setdefault(tuple(entity.get('path', [])[:2]), []).append((entity_id, entity))
+            
+            def reuse_schema_tables(catalog_name, schema_name):
+                """将上次抓取到的该schema下的表写入本次结果，返回表数量"""
+                tables = result[catalog_name]['schemas'][schema_name]['tables']
+                previous_tables = previous_by_schema.get((catalog_name, schema_name), [])
+                for entity_id, entity in previous_tables:
+                    tables[entity['path'][-1]] = {
+                        'type': entity.get('type'),
+                        'columns': entity.get('columns', [])
+                    }
+                    entities[entity_id] = entity
+                return len(previous_tables)
+            
+            with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='schema-crawl') as executor:
+                # 1. 并发获取每个catalog下的内容
+                catalog_futures = {}
+                for catalog in catalogs:
+                    catalog_name = catalog.get('path', [])[-1] if catalog.get('path') else 'Unknown'
+                    result[catalog_name] = {'schemas': {}}
+                    future = executor.submit(self._get_catalog_entity, catalog.get('id'), request_timeout)
+                    catalog_futures[future] = catalog_name
+                
+                # 2. catalog返回后立即并发获取其下各schema的表
+                schema_futures = {}
+                for future in as_completed(catalog_futures):
+                    catalog_name = catalog_futures[future]
+                    try:
+                        catalog_detail = future.result()
+                    except Exception as e:
+                        logger.error(f"获取catalog {catalog_name} 失败: {e}")
+                        errors.append({'path': catalog_name, 'level': 'catalog', 'error': str(e)})
+                        result.pop(catalog_name, None)
+                        continue
+                
+                    logger.info(f"处理catalog: {catalog_name}")
+                    for child in catalog_detail.get('children', []):
+                        if child.get('type') == 'CONTAINER':  # Schema
+                            schema_name = child.get('path', [])[-1]
+                            result[catalog_name]['schemas'][schema_name] = {'tables': {}}
+                            container_id = child.get('id')
+                            container_tag = child.get('tag')
+                            known = (previous_containers or {}).get(container_id)
+                            
+                            # 容器tag未变化且上次列出未超过复用时限，直接复用上次该schema下的表
+                            if (previous_entities is not None and known and container_tag
+                                    and known.get('tag') == container_tag
+                                    and start_time - known.get('listed_at', 0) < SCHEMA_CONTAINER_REUSE_MAX_AGE):
+                                reused_count += reuse_schema_tables(catalog_name, schema_name)
+                                reused_schema_count += 1
+                                containers[container_id] = known
+                                continue
+                            
+                            future = executor.submit(self._get_catalog_entity, container_id, request_timeout)
+                            schema_futures[future] = (catalog_name, schema_name, container_id, container_tag)
+                            
+                # 3. schema返回后并发获取每张表的列信息
+                table_futures = {}
+                listed_containers = {}  # {(catalog_name, schema_name): container_id}
+                for future in as_completed(schema_futures):
+                    catalog_name, schema_name, container_id, container_tag = schema_futures[future]
+                    try:
+                        schema_detail = future.result()
+                    except Exception as e:
+                        logger.error(f"获取schema {catalog_name}.{schema_name} 失败: {e}")
+                        errors.append({'path': f'{catalog_name}.{schema_name}', 'level': 'schema', 'error': str(e)})
+                        # 增量模式下保留该schema上次的表信息（不记录容器tag，下次会重新列出）
+                        reuse_schema_tables(catalog_name, schema_name)
+                        continue
+                    
+                    containers[container_id] = {
+                        'tag': container_tag or schema_detail.get('tag'),
+                        'path': [catalog_name, schema_name],
+                        'listed_at': start_time
+                    }
+                    listed_containers[(catalog_name, schema_name)] = container_id
+                    tables = result[catalog_name]['schemas'][schema_name]['tables']
+                    for child in schema_detail.get('children', []):
+                        if child.get('type') in ['PHYSICAL_DATASET', 'VIRTUAL_DATASET']:  # 表或视图
+                            table_name = child.get('path', [])[-1]
+                            table_id = child.get('id')
+                            tag = child.get('tag')
+                            known = (previous_entities or {}).get(table_id)
+                            
+                            # tag未变化，直接复用上次的列信息
+                            if known and tag and known.get('tag') == tag:
+                                tables[table_name] = {
+                                    'type': child.get('type'),
+                                    'columns': known.get('columns', [])
+                                }
+                                entities[table_id] = known
+                                reused_count += 1
+                                continue
+                            
+                            tables[table_name] = {
+                                'type': child.get('type'),
+                                'columns': []
+                            }
+                            future = executor.submit(self._get_catalog_entity, table_id, request_timeout)
+                            table_futures[future] = (catalog_name, schema_name, table_name, table_id, tag)
+                    
+                for future in as_completed(table_futures):
+                    catalog_name, schema_name, table_name, table_id, tag = table_futures[future]
+                    tables = result[catalog_name]['schemas'][schema_name]['tables']
+                    table_count += 1
+                    try:
+                        table_detail = future.result()
+                    except Exception as e:
+                        logger.error(f"获取表 {catalog_name}.{schema_name}.{table_name} 列信息失败: {e}")
+                        errors.append({'path': f'{catalog_name}.{schema_name}.{table_name}', 'level': 'table', 'error': str(e)})
+                        # 获取失败时沿用上次的列信息（不记录新tag，也不记录所在容器的tag，下次会重试）
+                        containers.pop(listed_containers.get((catalog_name, schema_name)), None)
+                        known = (previous_entities or {}).get(table_id)
+                        if known:
+                            tables[table_name]['columns'] = known.get('columns', [])
+                            entities[table_id] = {**known, 'tag': None}
+                        continue
+                    
+                    columns = self._extract_columns(table_detail)
+                    tables[table_name]['columns'] = columns
+                    entities[table_id] = {
+                        'tag': table_detail.get('tag') or tag,
+                        'type': tables[table_name]['type'],
+                        'columns': columns,
+                        'path': [catalog_name, schema_name, table_name]
+                    }
+            
+            elapsed = time.time() - start_time
+            added = [entity_id for entity_id in entities if previous_entities is not None and entity_id not in previous_entities]
+            removed = [entity_id for entity_id in (previous_entities or {}) if entity_id not in entities]
+            logger.info(f"Schema抓取完成: 列出 {len(schema_futures)} 个schema, 复用 {reused_schema_count} 个schema, "
+                        f"获取 {table_count} 张表, 复用 {reused_count} 张表, {len(errors)} 个失败, 耗时 {elapsed:.2f}秒")
+            
+            return {
+                'success': True,
+                'data': result,
+                'entities': entities,
+                'containers': containers,
+                'errors': errors,
+                'stats': {
+                    'incremental': previous_entities is not None,
+                    'catalogs': len(result),
+                    'schemas': len(schema_futures),
+                    'reused_schemas': reused_schema_count,
+                    'tables': table_count,
+                    'reused': reused_count,
+                    'added': len(added),
+                    'removed': len(removed),
+                    'failed': len(errors),
+                    'workers': max_workers,
+                    'elapsed': round(elapsed, 2)
+                }
+            }
+            
+        except Exception as e:
+            logger.error(f"获取schema信息异常: {e}")
+            return {
+                'success': False,
+                'error': f'获取schema信息失败: {str(e)}'
+            }
+    
+    def _get_catalog_entity(self, entity_id, timeout=None):
+        """获取catalog实体详情，失败时抛出异常"""
+        url = f"{self.base_url}/api/v3/catalog/{entity_id}"
+        token = self.token
+        response = self.session.get(url, timeout=timeout)
+        
+        # 处理401错误 - token过期，重新认证后重试（其他爬取线程已重新认证时直接重试）
+        if response.status_code == 401 and self._authenticate(stale_token=token):
+            response = self.session.get(url, timeout=timeout)
+            
+        if response.status_code != 200:
+            raise Exception(f'获取catalog实体失败: {response.status_code}')
+            
+        return response.json()
+                    
+    @staticmethod
+    def _extract_columns(table_detail):
+        """从表详情中提取列信息"""
+        columns = []
+        for field in table_detail.get('fields', []):
+            columns.append({
+                'name': field.get('name'),
+                'type': field.get('type', {}).get('name', 'Unknown')
+            })
+        return columns
+    
+    def submit_sql_query(self, sql, timeout=None):
+        """提交SQL查询到Dremio，仅返回作业ID，不等待执行完成"""
+        try:
             if not self.token:
                 logger.info("Token不存在，开始认证...")
                 if not self._authenticate():
@@ -359,8 +1771,6 @@ class DremioClient:
             logger.info(f"构建的查询数据: {query_data}")
             logger.info(f"Dremio API URL: {self.base_url}/api/v3/sql")
             
-            start_time = time.time()
-            
             # 提交查询 - 添加401错误重试机制
             logger.info(f"开始提交SQL查询到Dremio...")
             response = self.session.post(
@@ -370,7 +1780,6 @@ class DremioClient:
             )
             
             logger.info(f"API响应状态码: {response.status_code}")
-            logger.info(f"API响应头: {dict(response.headers)}")
             
             # 处理401错误 - token过期，重新认证后重试
             if response.status_code == 401:
@@ -396,7 +1805,6 @@ class DremioClient:
                 }
             
             query_result = response.json()
-            logger.info(f"查询提交成功，响应数据: {query_result}")
             job_id = query_result.get('id')
             logger.info(f"获取到Job ID: {job_id}")
             
@@ -407,178 +1815,298 @@ class DremioClient:
                     'error': '未获取到查询作业ID'
                 }
             
-            # 等待查询完成
-            if timeout is None:
-                # 无超时限制，持续等待直到完成
-                logger.info("开始等待Job执行完成，无超时限制")
-                wait_time = 0
-                while True:
-                    logger.info(f"检查Job状态，已等待: {wait_time}秒")
-                    job_response = self.session.get(
-                        f"{self.base_url}/api/v3/job/{job_id}",
-                        timeout=None
-                    )
-                    logger.info(f"Job状态检查响应码: {job_response.status_code}")
-                    
-                    if job_response.status_code == 200:
-                        job_info = job_response.json()
-                        job_state = job_info.get('jobState')
-                        logger.info(f"Job状态: {job_state}")
-                        logger.info(f"Job详细信息: {job_info}")
-                        
-                        if job_state == 'COMPLETED':
-                            logger.info("Job执行完成，开始获取结果...")
-                            # 获取查询结果
-                            results_response = self.session.get(
-                                f"{self.base_url}/api/v3/job/{job_id}/results",
-                                timeout=None
-                            )
-                            logger.info(f"结果获取响应码: {results_response.status_code}")
-                            
-                            if results_response.status_code == 200:
-                                results_data = results_response.json()
-                                execution_time = time.time() - start_time
-                                
-                                # 调试日志：查看Dremio API返回的数据结构
-                                logger.info(f"=== 查询结果详细信息 ===")
-                                logger.info(f"结果数据完整内容: {results_data}")
-                                logger.info(f"Dremio API返回的数据结构键: {list(results_data.keys())}")
-                                logger.info(f"数据行数: {len(results_data.get('rows', []))}")
-                                logger.info(f"执行时间: {round(execution_time, 2)}秒")
-                                
-                                if 'columns' in results_data:
-                                    logger.info(f"找到columns字段: {results_data['columns']}")
-                                    
-                                    return {
-                                        'success': True,
-                                        'columns': results_data.get('columns', []),
-                                        'data': results_data.get('rows', []),
-                                        'row_count': len(results_data.get('rows', [])),
-                                        'execution_time': round(execution_time, 2)
-                                    }
-                                else:
-                                    logger.warning("未找到columns字段，使用默认格式")
-                                    return {
-                                        'success': True,
-                                        'data': results_data.get('rows', []),
-                                        'row_count': len(results_data.get('rows', [])),
-                                        'execution_time': round(execution_time, 2)
-                                    }
-                            else:
-                                logger.error(f"获取查询结果失败: {results_response.status_code}")
-                                return {
-                                    'success': False,
-                                    'error': f'获取查询结果失败: {results_response.status_code}'
-                                }
-                        
-                        elif job_state in ['FAILED', 'CANCELED']:
-                            logger.error(f"Job执行失败，状态: {job_state}")
-                            error_message = job_info.get('errorMessage', '未知错误')
-                            return {
-                                'success': False,
-                                'error': f'查询失败: {error_message}'
-                            }
-                        
-                        # 继续等待
-                        time.sleep(2)
-                        wait_time += 2
-                    else:
-                        logger.error(f"检查作业状态失败: {job_response.status_code}")
-                        return {
-                            'success': False,
-                            'error': f'获取作业状态失败: {job_response.status_code}'
-                        }
-            else:
-                # 有超时限制的原有逻辑
-                max_wait_time = timeout
-                wait_time = 0
-                logger.info(f"开始等待Job执行完成，最大等待时间: {max_wait_time}秒")
-                
-                while wait_time < max_wait_time:
-                    logger.info(f"检查Job状态，已等待: {wait_time}秒")
-                    job_response = self.session.get(
-                        f"{self.base_url}/api/v3/job/{job_id}",
-                        timeout=10
-                    )
-                    logger.info(f"Job状态检查响应码: {job_response.status_code}")
-                    
-                    if job_response.status_code == 200:
-                        job_info = job_response.json()
-                        job_state = job_info.get('jobState')
-                        logger.info(f"Job状态: {job_state}")
-                        logger.info(f"Job详细信息: {job_info}")
+            return {
+                'success': True,
+                'job_id': job_id
+            }
                     
-                        if job_state == 'COMPLETED':
-                            logger.info("Job执行完成，开始获取结果...")
-                            # 获取查询结果
-                            results_response = self.session.get(
-                                f"{self.base_url}/api/v3/job/{job_id}/results",
-                                timeout=None
-                            )
-                            logger.info(f"结果获取响应码: {results_response.status_code}")
+        except Exception as e:
+            logger.error(f"SQL提交异常: {e}")
+            return {
+                'success': False,
+                'error': f'查询提交失败: {str(e)}'
+            }
+    
+    def wait_for_job(self, job_id, timeout=None, cancel_on_timeout=True):
+        """等待作业执行完成，返回作业信息（自适应轮询）
+        
+        超时后默认取消Dremio作业，避免已无人等待的查询继续占用执行器。
+        """
+        poller = AdaptivePoller(timeout=timeout)
+        logger.info(f"开始等待Job执行完成，{'无超时限制' if timeout is None else f'最大等待时间: {timeout}秒'}")
                             
-                            if results_response.status_code == 200:
-                                results_data = results_response.json()
-                                execution_time = time.time() - start_time
-                                
-                                # 调试日志：查看Dremio API返回的数据结构
-                                logger.info(f"=== 查询结果详细信息 ===")
-                                logger.info(f"结果数据完整内容: {results_data}")
-                                logger.info(f"Dremio API返回的数据结构键: {list(results_data.keys())}")
-                                logger.info(f"数据行数: {len(results_data.get('rows', []))}")
-                                logger.info(f"执行时间: {round(execution_time, 2)}秒")
+        while True:
+            status = self.get_job_status(job_id, timeout=None if timeout is None else 10)
+            poller.record_poll()
                                 
-                                if 'columns' in results_data:
-                                    logger.info(f"找到columns字段: {results_data['columns']}")
-                                else:
-                                    logger.warning("未找到columns字段")
-                                
-                                if 'rows' in results_data:
-                                    logger.info(f"找到rows字段，行数: {len(results_data['rows'])}")
-                                    if results_data['rows']:
-                                        logger.info(f"前3行数据示例: {results_data['rows'][:3]}")
-                                else:
-                                    logger.warning("未找到rows字段")
-                                
-                                result = {
-                                    'success': True,
-                                    'data': results_data.get('rows', []),
-                                    'columns': results_data.get('columns', []),
-                                    'row_count': results_data.get('rowCount', 0),
-                                    'execution_time': round(execution_time, 2)
-                                }
-                                logger.info(f"最终返回结果: {result}")
-                                return result
-                            else:
-                                logger.error(f"获取查询结果失败: {results_response.status_code}")
-                                logger.error(f"结果响应内容: {results_response.text}")
-                                return {
-                                    'success': False,
-                                    'error': f'获取查询结果失败: {results_response.status_code}'
-                                }
-                        
-                        elif job_state in ['FAILED', 'CANCELED']:
-                            error_message = job_info.get('errorMessage', '查询失败')
-                            return {
-                                'success': False,
-                                'error': f'查询失败: {error_message}'
-                            }
-                        
-                        # 查询仍在进行中，继续等待
-                        time.sleep(1)
-                        wait_time += 1
-                    else:
-                        return {
-                            'success': False,
-                            'error': f'获取作业状态失败: {job_response.status_code}'
-                        }
+            if not status['success']:
+                logger.error(f"检查作业状态失败: {status.get('error')}")
+                return {
+                    'success': False,
+                    'error': status.get('error', '获取作业状态失败'),
+                    'poll_stats': poller.stats()
+                }
+            
+            job_state = status['job_state']
+            logger.info(f"Job状态: {job_state}，已轮询 {poller.polls} 次")
+            
+            if job_state == 'COMPLETED':
+                return {
+                    'success': True,
+                    'job_info': status['job_info'],
+                    'poll_stats': poller.stats()
+                }
+            
+            if job_state in ['FAILED', 'CANCELED']:
+                logger.error(f"Job执行失败，状态: {job_state}")
+                error_message = status.get('error_message') or '未知错误'
+                return {
+                    'success': False,
+                    'error': f'查询失败: {error_message}',
+                    'poll_stats': poller.stats()
+                }
+            
+            # 查询仍在进行中，按退避间隔继续等待
+            if not poller.sleep():
+                canceled = cancel_on_timeout and self.cancel_job(job_id)['success']
+                return {
+                    'success': False,
+                    'job_id': job_id,
+                    'error': f"查询超时 ({timeout}秒){'，已取消Dremio作业' if canceled else ''}",
+                    'canceled': canceled,
+                    'poll_stats': poller.stats()
+                }
+    
+    def get_job_status(self, job_id, timeout=10):
+        """查询作业当前状态（不等待）"""
+        try:
+            if not self.token:
+                if not self._authenticate():
+                    return {'success': False, 'error': '认证失败'}
+            
+            url = f"{self.base_url}/api/v3/job/{job_id}"
+            response = self.session.get(url, timeout=timeout)
+            
+            # 处理401错误 - token过期，重新认证后重试
+            if response.status_code == 401 and self._authenticate():
+                response = self.session.get(url, timeout=timeout)
             
-                # 超时
+            if response.status_code == 404:
                 return {
                     'success': False,
-                    'error': f'查询超时 ({timeout}秒)'
+                    'error': f'作业不存在: {job_id}',
+                    'not_found': True
                 }
             
+            if response.status_code != 200:
+                return {
+                    'success': False,
+                    'error': f'获取作业状态失败: {response.status_code}'
+                }
+            
+            job_info = response.json()
+            return {
+                'success': True,
+                'job_id': job_id,
+                'job_state': job_info.get('jobState'),
+                'row_count': job_info.get('rowCount'),
+                'error_message': job_info.get('errorMessage'),
+                'job_info': job_info
+            }
+        
+        except Exception as e:
+            logger.error(f"获取作业状态异常: {e}")
+            return {
+                'success': False,
+                'error': f'获取作业状态失败: {str(e)}'
+            }
+    
+    def cancel_job(self, job_id):
+        """取消正在执行的Dremio作业"""
+        try:
+            if not self.token:
+                if not self._authenticate():
+                    return {'success': False, 'error': '认证失败'}
+            
+            url = f"{self.base_url}/api/v3/job/{job_id}/cancel"
+            response = self.session.post(url, timeout=10)
+            
+            # 处理401错误 - token过期，重新认证后重试
+            if response.status_code == 401 and self._authenticate():
+                response = self.session.post(url, timeout=10)
+            
+            if response.status_code in [200, 204]:
+                logger.info(f"已取消Dremio作业: {job_id}")
+                return {'success': True, 'job_id': job_id}
+            
+            if response.status_code == 404:
+                return {
+                    'success': False,
+                    'error': f'作业不存在: {job_id}',
+                    'not_found': True
+                }
+            
+            # 作业已结束等情况Dremio返回400及错误信息
+            try:
+                error_message = response.json().get('errorMessage')
+            except ValueError:
+                error_message = None
+            logger.warning(f"取消Dremio作业失败: {job_id}, 状态码: {response.status_code}, {error_message}")
+            return {
+                'success': False,
+                'error': error_message or f'取消作业失败: {response.status_code}',
+                'status_code': response.status_code
+            }
+        
+        except Exception as e:
+            logger.error(f"取消作业异常: {e}")
+            return {
+                'success': False,
+                'error': f'取消作业失败: {str(e)}'
+            }
+    
+    def get_job_results(self, job_id, offset=0, limit=None):
+        """获取已完成作业的一页结果"""
+        try:
+            if not self.token:
+                if not self._authenticate():
+                    return {'success': False, 'error': '认证失败'}
+            
+            limit = max(1, min(limit or DREMIO_RESULTS_PAGE_SIZE, DREMIO_RESULTS_MAX_PAGE_SIZE))
+            page = self._get_results_page(job_id, offset, limit)
+            rows = page.get('rows', [])
+            total = page.get('rowCount', 0)
+            next_offset = offset + len(rows)
+            
+            return {
+                'success': True,
+                'job_id': job_id,
+                'data': rows,
+                'schema': page.get('schema', []),
+                'offset': offset,
+                'limit': limit,
+                'row_count': total,
+                'next_offset': next_offset if next_offset < total else None,
+                'has_more': next_offset < total
+            }
+        
+        except Exception as e:
+            logger.error(f"获取作业结果异常: {e}")
+            return {
+                'success': False,
+                'error': str(e)
+            }
+    
+    def _get_results_page(self, job_id, offset, limit):
+        """获取作业结果的一页数据（Dremio单页最多500行）"""
+        url = f"{self.base_url}/api/v3/job/{job_id}/results"
+        params = {'offset': offset, 'limit': limit}
+        response = self.session.get(url, params=params, timeout=None)
+        
+        # 处理401错误 - token过期，重新认证后重试
+        if response.status_code == 401 and self._authenticate():
+            response = self.session.get(url, params=params, timeout=None)
+        
+        if response.status_code != 200:
+            logger.error(f"获取查询结果失败: {response.status_code} - {response.text}")
+            raise Exception(f'获取查询结果失败: {response.status_code}')
+        
+        return response.json()
+    
+    def iter_job_results(self, job_id, page_size=None, offset=0, max_rows=None):
+        """按offset/limit分页遍历作业结果，逐页产出Dremio返回的结果字典
+        
+        Args:
+            job_id: 已完成的Dremio作业ID
+            page_size: 每页行数，最大为Dremio允许的500行
+            offset: 起始行偏移
+            max_rows: 最多读取的行数，None表示读取全部
+        """
+        page_size = max(1, min(page_size or DREMIO_RESULTS_PAGE_SIZE, DREMIO_RESULTS_MAX_PAGE_SIZE))
+        fetched = 0
+        total = None
+        
+        while True:
+            limit = page_size if max_rows is None else min(page_size, max_rows - fetched)
+            if limit <= 0:
+                break
+            
+            page = self._get_results_page(job_id, offset, limit)
+            rows = page.get('rows', [])
+            if total is None:
+                total = page.get('rowCount')
+            
+            yield page
+            
+            fetched += len(rows)
+            offset += len(rows)
+            if not rows or (total is not None and offset >= total):
+                break
+    
+    def _fetch_job_results(self, job_id):
+        """分页读取作业的全部结果并合并为一个结果字典"""
+        results_data = None
+        rows = []
+        for page in self.iter_job_results(job_id):
+            if results_data is None:
+                results_data = {key: value for key, value in page.items() if key != 'rows'}
+            rows.extend(page.get('rows', []))
+        
+        results_data = results_data or {}
+        results_data['rows'] = rows
+        return results_data
+    
+    def execute_sql_query(self, sql, timeout=None):
+        """执行SQL查询"""
+        try:
+            # 添加详细的SQL打印日志
+            logger.info(f"=== SQL查询开始 ===")
+            logger.info(f"原始SQL: {sql}")
+            logger.info(f"SQL长度: {len(sql)}")
+            logger.info(f"超时设置: {'无限制' if timeout is None else f'{timeout}秒'}")
+            
+            start_time = time.time()
+            
+            submit_result = self.submit_sql_query(sql, timeout)
+            if not submit_result['success']:
+                return submit_result
+            job_id = submit_result['job_id']
+            
+            # 等待查询完成
+            wait_result = self.wait_for_job(job_id, timeout)
+            if not wait_result['success']:
+                return wait_result
+            
+            logger.info("Job执行完成，开始分页获取结果...")
+            try:
+                results_data = self._fetch_job_results(job_id)
+            except Exception as e:
+                return {
+                    'success': False,
+                    'error': str(e)
+                }
+            
+            rows = results_data.get('rows', [])
+            execution_time = time.time() - start_time
+            
+            logger.info(f"=== 查询结果详细信息 ===")
+            logger.info(f"Dremio API返回的数据结构键: {list(results_data.keys())}")
+            logger.info(f"数据行数: {len(rows)}")
+            if rows:
+                logger.info(f"前3行数据示例: {rows[:3]}")
+            logger.info(f"执行时间: {round(execution_time, 2)}秒")
+            
+            return {
+                'success': True,
+                'job_id': job_id,
+                'data': rows,
+                'columns': results_data.get('columns', []),
+                'schema': results_data.get('schema', []),
+                'row_count': len(rows),
+                'execution_time': round(execution_time, 2),
+                'poll_stats': wait_result.get('poll_stats')
+            }
+            
         except Exception as e:
             logger.error(f"SQL查询异常: {e}")
             return {
@@ -1259,19 +2787,140 @@ class DremioClient:
                             'reflections': reflections
                         }
             
-            # 如果所有格式都没找到反射
-            logger.warning(f"未找到数据集 {dataset_path} 的任何反射")
-            return {
-                'success': True,
-                'reflections': []
-            }
-                
+            # 如果所有格式都没找到反射
+            logger.warning(f"未找到数据集 {dataset_path} 的任何反射")
+            return {
+                'success': True,
+                'reflections': []
+            }
+                
+        except Exception as e:
+            logger.error(f"查询反射异常: {e}")
+            return {
+                'success': False,
+                'error': f'查询反射异常: {str(e)}'
+            }
+    
+    def _dataset_name_variants(self, dataset_path):
+        """生成数据集在sys.reflections中可能的dataset_name写法（按优先顺序去重）"""
+        formatted_dataset_path = self._format_table_name_for_sql(dataset_path)
+        
+        # 准备多种可能的数据集名称格式进行查询
+        dataset_name_variants = [
+            dataset_path,  # 原始格式
+            formatted_dataset_path,  # 格式化后的格式
+        ]
+        
+        # 对于包含@admin的路径，添加更多变体
+        if '@admin' in dataset_path:
+            # 去除外层引号的格式
+            if dataset_path.startswith('"') and dataset_path.endswith('"'):
+                unquoted = dataset_path[1:-1]
+                dataset_name_variants.append(unquoted)
+            
+            # 添加不同的引号组合
+            parts = dataset_path.replace('"', '').split('.')
+            if len(parts) >= 3:
+                # @admin.pdd.pdd_kpi_weekly 格式
+                variant1 = '.'.join(parts)
+                dataset_name_variants.append(variant1)
+                
+                # "@admin".pdd."pdd_kpi_weekly" 格式
+                variant2 = f'"{parts[0]}".{parts[1]}."{parts[2]}"'
+                dataset_name_variants.append(variant2)
+                
+                # 关键修复：添加实际存储的格式 "@admin".pdd.pdd_kpi_weekly（最后的表名不带引号）
+                variant3 = f'"{parts[0]}".{parts[1]}.{parts[2]}'
+                dataset_name_variants.append(variant3)
+        
+        # 去重
+        return list(dict.fromkeys(dataset_name_variants))
+    
+    def find_reflections_by_dataset_paths(self, dataset_paths):
+        """用一条sys.reflections查询获取多个数据集的现有反射（覆盖每个数据集名称的所有写法）
+        
+        返回 {'success': True, 'reflections': {dataset_path: [反射信息, ...]}}
+        """
+        try:
+            if not self.token:
+                if not self._authenticate():
+                    return {'success': False, 'error': '认证失败'}
+            
+            reflections = {dataset_path: [] for dataset_path in dataset_paths}
+            variant_owners = {}  # {dataset_name写法: [dataset_path, ...]}
+            for dataset_path in dataset_paths:
+                for variant in self._dataset_name_variants(dataset_path):
+                    variant_owners.setdefault(variant, []).append(dataset_path)
+            
+            if not variant_owners:
+                return {'success': True, 'reflections': reflections}
+            
+            quoted_variants = ', '.join("'" + variant.replace("'", "''") + "'" for variant in variant_owners)
+            query_sql = (
+                "SELECT reflection_id, reflection_name, dataset_name, type, status "
+                f"FROM sys.reflections WHERE dataset_name IN ({quoted_variants})"
+            )
+            logger.info(f"批量查询反射SQL: {query_sql}")
+            
+            result = self.execute_sql_query(query_sql)
+            if not result['success']:
+                return {'success': False, 'error': result.get('error', '查询sys.reflections失败')}
+            
+            for row in result.get('data', []):
+                for dataset_path in variant_owners.get(row.get('dataset_name'), []):
+                    reflections[dataset_path].append({
+                        'reflection_id': row.get('reflection_id'),
+                        'reflection_name': row.get('reflection_name'),
+                        'dataset_name': row.get('dataset_name'),
+                        'type': row.get('type'),
+                        'status': row.get('status')
+                    })
+            
+            found = sum(len(items) for items in reflections.values())
+            logger.info(f"一次查询找到 {len(dataset_paths)} 个数据集的 {found} 个反射")
+            return {'success': True, 'reflections': reflections}
+        
         except Exception as e:
-            logger.error(f"查询反射异常: {e}")
+            logger.error(f"批量查询反射异常: {e}")
             return {
                 'success': False,
-                'error': f'查询反射异常: {str(e)}'
+                'error': f'批量查询反射异常: {str(e)}'
+            }
+    
+    def _refreshed_reflection_name(self, dataset_path):
+        """删除-创建方式刷新后新反射的名称"""
+        table_name = dataset_path.split('.')[-1].replace('"', '')
+        return table_name + '_refreshed_reflection'
+    
+    def _reflection_refresh_result(self, dataset_path, reflections_total, deleted_count, failed_deletions, new_reflection_name, create_result):
+        """汇总单个数据集删除-创建刷新的结果"""
+        if create_result['success']:
+            logger.info(f"成功创建新反射: {new_reflection_name}")
+            return {
+                'success': True,
+                'message': f'反射刷新完成：删除了 {deleted_count} 个旧反射，创建了新反射 {new_reflection_name}',
+                'details': {
+                    'dataset_path': dataset_path,
+                    'deleted_reflections': deleted_count,
+                    'failed_deletions': failed_deletions,
+                    'new_reflection_name': new_reflection_name,
+                    'reflections_total': reflections_total,
+                    'reflections_refreshed': 1,
+                    'reflections_failed': len(failed_deletions)
+                }
             }
+        
+        logger.error(f"创建新反射失败: {create_result['error']}")
+        return {
+            'success': False,
+            'error': f'删除了 {deleted_count} 个旧反射，但创建新反射失败: {create_result["error"]}',
+            'details': {
+                'dataset_path': dataset_path,
+                'deleted_reflections': deleted_count,
+                'failed_deletions': failed_deletions,
+                'creation_error': create_result['error']
+            }
+        }
     
     def refresh_reflection_by_recreate(self, dataset_path, dataset_id=None):
         """通过删除-创建方式刷新反射（终版方法）"""
@@ -1282,250 +2931,1218 @@ class DremioClient:
             
             logger.info(f"开始使用删除-创建方式刷新数据集反射: {dataset_path}")
             
-            # 1. 获取现有反射（优先使用dataset_path查询）
-            existing_reflections = []
-            
-            # 首先尝试通过SQL查询获取反射
-            reflections_result = self.get_reflections_by_dataset_path(dataset_path)
-            if reflections_result['success']:
-                existing_reflections = reflections_result['reflections']
-                logger.info(f"通过SQL查询找到 {len(existing_reflections)} 个现有反射")
+            # 1. 一次查询sys.reflections获取现有反射（覆盖数据集名称的各种写法）
+            reflection_names_to_delete = []
+            reflections_total = 0
+            
+            lookup_result = self.find_reflections_by_dataset_paths([dataset_path])
+            if lookup_result['success']:
+                existing_reflections = lookup_result['reflections'][dataset_path]
+                reflection_names_to_delete = list(dict.fromkeys(r['reflection_name'] for r in existing_reflections))
+                reflections_total = len(existing_reflections)
+                logger.info(f"通过SQL查询找到 {reflections_total} 个现有反射: {reflection_names_to_delete}")
             elif dataset_id:
                 # 如果SQL查询失败且提供了dataset_id，则使用API方式
                 reflections_result = self.get_dataset_reflections(dataset_id)
                 if reflections_result['success']:
-                    existing_reflections = reflections_result['reflections']
-                    logger.info(f"通过API查询找到 {len(existing_reflections)} 个现有反射")
+                    reflections_total = len(reflections_result['reflections'])
+                    logger.info(f"通过API查询找到 {reflections_total} 个现有反射")
             
-            # 2. 删除所有现有反射
+            # 2. 删除所有现有反射（DROP语句完成即已删除，无需额外等待）
             deleted_count = 0
             failed_deletions = []
             
-            # 首先通过SQL查询获取正确的反射名称，尝试多种格式
-            formatted_dataset_path = self._format_table_name_for_sql(dataset_path)
-            
-            # 准备多种可能的数据集名称格式进行查询
-            dataset_name_variants = [
-                dataset_path,  # 原始格式
-                formatted_dataset_path,  # 格式化后的格式
-            ]
-            
-            # 对于包含@admin的路径，添加更多变体
-            if '@admin' in dataset_path:
-                # 去除外层引号的格式
-                if dataset_path.startswith('"') and dataset_path.endswith('"'):
-                    unquoted = dataset_path[1:-1]
-                    dataset_name_variants.append(unquoted)
-                
-                # 添加不同的引号组合
-                parts = dataset_path.replace('"', '').split('.')
-                if len(parts) >= 3:
-                    # @admin.pdd.pdd_kpi_weekly 格式
-                    variant1 = '.'.join(parts)
-                    dataset_name_variants.append(variant1)
-                    
-                    # "@admin".pdd."pdd_kpi_weekly" 格式
-                    variant2 = f'"{parts[0]}".{parts[1]}."{parts[2]}"'
-                    dataset_name_variants.append(variant2)
-                    
-                    # 关键修复：添加实际存储的格式 "@admin".pdd.pdd_kpi_weekly（最后的表名不带引号）
-                    variant3 = f'"{parts[0]}".{parts[1]}.{parts[2]}'
-                    dataset_name_variants.append(variant3)
-            
-            # 去重
-            dataset_name_variants = list(set(dataset_name_variants))
-            logger.info(f"尝试查询反射的数据集名称变体: {dataset_name_variants}")
-            
-            reflection_names_to_delete = []
-            for variant in dataset_name_variants:
-                query_reflections_sql = f"SELECT reflection_name FROM sys.reflections WHERE dataset_name='{variant}'"
-                logger.info(f"执行反射查询SQL: {query_reflections_sql}")
-                reflections_query_result = self.execute_sql_query(query_reflections_sql)
-                
-                if reflections_query_result['success'] and reflections_query_result['data']:
-                    found_reflections = [row['reflection_name'] for row in reflections_query_result['data']]
-                    reflection_names_to_delete.extend(found_reflections)
-                    logger.info(f"使用格式 '{variant}' 找到 {len(found_reflections)} 个反射: {found_reflections}")
-                    break  # 找到反射后就停止尝试其他格式
-                else:
-                    logger.info(f"使用格式 '{variant}' 未找到反射")
-            
-            # 去重反射名称
-            reflection_names_to_delete = list(set(reflection_names_to_delete))
-            logger.info(f"最终找到 {len(reflection_names_to_delete)} 个反射名称: {reflection_names_to_delete}")
-            
             for reflection_name in reflection_names_to_delete:
-                # 使用正确的ALTER DATASET语法删除反射
-                drop_sql = f"ALTER DATASET {formatted_dataset_path} DROP REFLECTION \"{reflection_name}\""
-                logger.info(f"执行删除反射SQL: {drop_sql}")
-                    
-                delete_result = self.execute_sql_query(drop_sql)
+                delete_result = self.delete_reflection_by_sql(reflection_name, dataset_path)
                 
                 if delete_result['success']:
                     deleted_count += 1
-                    logger.info(f"成功删除反射: {reflection_name}")
-                    time.sleep(1)  # 等待删除完成
                 else:
                     failed_deletions.append({
                         'reflection_name': reflection_name,
                         'error': delete_result['error']
                     })
-                    logger.error(f"删除反射失败: {reflection_name}, 错误: {delete_result['error']}")
             
             # 3. 创建新的原始反射
-            table_name = dataset_path.split('.')[-1].replace('"', '')
-            new_reflection_name = table_name + '_refreshed_reflection'
-            
+            new_reflection_name = self._refreshed_reflection_name(dataset_path)
             create_result = self.create_raw_reflection_by_sql(dataset_path, new_reflection_name)
             
-            if create_result['success']:
-                logger.info(f"成功创建新反射: {new_reflection_name}")
+            return self._reflection_refresh_result(
+                dataset_path, reflections_total, deleted_count, failed_deletions, new_reflection_name, create_result
+            )
                 
+        except Exception as e:
+            logger.error(f"刷新反射异常: {e}")
+            return {
+                'success': False,
+                'error': f'刷新反射异常: {str(e)}'
+            }
+    
+    def run_maintenance(self, func, *args, timeout=None):
+        """占用一个maintenance准入名额执行反射维护语句，未获准时返回失败结果
+        
+        timeout为排队等待名额的秒数，默认ADMISSION_QUEUE_TIMEOUT；后台刷新等内部调用可传入更长的等待时间
+        """
+        try:
+            with query_admission.admit('maintenance', timeout):
+                return func(*args)
+        except AdmissionRejected as e:
+            return {'success': False, 'error': str(e)}
+    
+    def refresh_reflections_batch(self, dataset_paths, max_workers=None, admission_timeout=None):
+        """批量通过删除-创建方式刷新多个数据集的反射
+        
+        先用一条sys.reflections查询定位全部现有反射，再并发删除所有旧反射，
+        全部删除完成后并发为每个数据集创建新的原始反射。每条语句各占一个maintenance准入名额，
+        并发数受max_workers（默认REFLECTION_BATCH_CONCURRENCY）限制且不超过maintenance类别的并发名额；
+        admission_timeout为每条语句排队等待名额的秒数，默认ADMISSION_QUEUE_TIMEOUT。
+        """
+        start_time = time.time()
+        max_workers = min(max_workers or REFLECTION_BATCH_CONCURRENCY, query_admission.class_concurrency['maintenance'])
+        dataset_paths = list(dict.fromkeys(dataset_paths))
+        results = {}
+        
+        # 路径格式无效的数据集直接记为失败，不影响其他数据集
+        valid_paths = []
+        for dataset_path in dataset_paths:
+            try:
+                self._format_table_name_for_sql(dataset_path)
+                valid_paths.append(dataset_path)
+            except (ValueError, TypeError) as e:
+                results[dataset_path] = {'success': False, 'error': f'数据集路径无效: {str(e)}', 'details': {'dataset_path': dataset_path}}
+        
+        lookup_result = self.run_maintenance(self.find_reflections_by_dataset_paths, valid_paths, timeout=admission_timeout)
+        if not lookup_result['success']:
+            return {
+                'success': False,
+                'error': f"查询现有反射失败: {lookup_result['error']}"
+            }
+        existing_reflections = lookup_result['reflections']
+        
+        deleted_counts = {dataset_path: 0 for dataset_path in valid_paths}
+        failed_deletions = {dataset_path: [] for dataset_path in valid_paths}
+        
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='reflection-batch') as executor:
+            # 1. 并发删除所有旧反射
+            drop_futures = {}
+            for dataset_path in valid_paths:
+                for reflection_name in dict.fromkeys(r['reflection_name'] for r in existing_reflections[dataset_path]):
+                    future = executor.submit(
+                        self.run_maintenance, self.delete_reflection_by_sql, reflection_name, dataset_path, timeout=admission_timeout
+                    )
+                    drop_futures[future] = (dataset_path, reflection_name)
+            
+            for future in as_completed(drop_futures):
+                dataset_path, reflection_name = drop_futures[future]
+                delete_result = future.result()
+                if delete_result['success']:
+                    deleted_counts[dataset_path] += 1
+                else:
+                    failed_deletions[dataset_path].append({
+                        'reflection_name': reflection_name,
+                        'error': delete_result['error']
+                    })
+            
+            # 2. 并发为每个数据集创建新反射
+            create_futures = {
+                executor.submit(
+                    self.run_maintenance, self.create_raw_reflection_by_sql, dataset_path,
+                    self._refreshed_reflection_name(dataset_path), timeout=admission_timeout
+                ): dataset_path
+                for dataset_path in valid_paths
+            }
+            for future in as_completed(create_futures):
+                dataset_path = create_futures[future]
+                results[dataset_path] = self._reflection_refresh_result(
+                    dataset_path,
+                    len(existing_reflections[dataset_path]),
+                    deleted_counts[dataset_path],
+                    failed_deletions[dataset_path],
+                    self._refreshed_reflection_name(dataset_path),
+                    future.result()
+                )
+        
+        ordered_results = [dict(results[dataset_path], dataset_path=dataset_path) for dataset_path in dataset_paths]
+        succeeded = sum(1 for result in ordered_results if result['success'])
+        execution_time = round(time.time() - start_time, 2)
+        logger.info(f"批量刷新反射完成: {succeeded}/{len(dataset_paths)} 个数据集成功，耗时 {execution_time}秒")
+        
+        return {
+            'success': succeeded == len(dataset_paths),
+            'results': ordered_results,
+            'succeeded': succeeded,
+            'failed': len(dataset_paths) - succeeded,
+            'execution_time': execution_time
+        }
+    
+    def get_reflection_status(self, reflection_id, timeout=10):
+        """通过REST API查询反射当前状态（不提交Dremio作业）"""
+        try:
+            if not self.token:
+                if not self._authenticate():
+                    return {'success': False, 'error': '认证失败'}
+            
+            url = f"{self.base_url}/api/v3/reflection/{reflection_id}"
+            response = self.session.get(url, timeout=timeout)
+            
+            # 处理401错误 - token过期，重新认证后重试
+            if response.status_code == 401 and self._authenticate():
+                response = self.session.get(url, timeout=timeout)
+            
+            if response.status_code == 404:
                 return {
-                    'success': True,
-                    'message': f'反射刷新完成：删除了 {deleted_count} 个旧反射，创建了新反射 {new_reflection_name}',
-                    'details': {
-                        'dataset_path': dataset_path,
-                        'deleted_reflections': deleted_count,
-                        'failed_deletions': failed_deletions,
-                        'new_reflection_name': new_reflection_name,
-                        'reflections_total': len(existing_reflections),
-                        'reflections_refreshed': 1 if create_result['success'] else 0,
-                        'reflections_failed': len(failed_deletions)
-                    }
+                    'success': False,
+                    'error': f'反射不存在: {reflection_id}',
+                    'not_found': True
                 }
-            else:
-                logger.error(f"创建新反射失败: {create_result['error']}")
+            
+            if response.status_code != 200:
                 return {
                     'success': False,
-                    'error': f'删除了 {deleted_count} 个旧反射，但创建新反射失败: {create_result["error"]}',
-                    'details': {
-                        'dataset_path': dataset_path,
-                        'deleted_reflections': deleted_count,
-                        'failed_deletions': failed_deletions,
-                        'creation_error': create_result['error']
-                    }
+                    'error': f'获取反射状态失败: {response.status_code}'
                 }
+            
+            reflection_info = response.json()
+            status = reflection_info.get('status') or {}
+            return {
+                'success': True,
+                'reflection_id': reflection_id,
+                'reflection_name': reflection_info.get('name'),
+                'status': status.get('combinedStatus'),
+                'refresh_status': status.get('refresh'),
+                'availability': status.get('availability'),
+                'failure_count': status.get('failureCount', 0),
+                'last_refresh_duration_ms': status.get('lastRefreshDurationMillis')
+            }
+        
+        except Exception as e:
+            logger.error(f"获取反射状态异常: {e}")
+            return {
+                'success': False,
+                'error': f'获取反射状态失败: {str(e)}'
+            }
+    
+    def find_reflection(self, dataset_path, reflection_name):
+        """在sys.reflections中查找数据集上指定名称的反射，未找到时reflection为None"""
+        lookup_result = self.find_reflections_by_dataset_paths([dataset_path])
+        if not lookup_result['success']:
+            return lookup_result
+        
+        for reflection in lookup_result['reflections'][dataset_path]:
+            if reflection['reflection_name'] == reflection_name:
+                return {'success': True, 'reflection': reflection}
+        return {'success': True, 'reflection': None}
+    
+    def wait_for_reflection(self, dataset_path, reflection_name, timeout=None):
+        """等待反射构建完成（可以加速查询）或失败，按退避间隔轮询
+        
+        先通过sys.reflections定位反射ID，之后改用REST API查询状态，避免每次轮询都提交Dremio作业。
+        """
+        timeout = REFLECTION_WAIT_TIMEOUT if timeout is None else timeout
+        poller = AdaptivePoller(
+            timeout=timeout,
+            initial_interval=REFLECTION_POLL_INITIAL_INTERVAL,
+            max_interval=REFLECTION_POLL_MAX_INTERVAL
+        )
+        reflection_id = None
+        status = None
+        logger.info(f"开始等待反射就绪: {dataset_path} / {reflection_name}，最大等待时间: {timeout}秒")
+        
+        while True:
+            if reflection_id:
+                status_result = self.get_reflection_status(reflection_id)
+                if status_result['success']:
+                    status = status_result['status']
+                elif status_result.get('not_found'):
+                    # 反射已被删除（例如被再次刷新），重新按名称查找
+                    reflection_id = None
+            else:
+                found = self.find_reflection(dataset_path, reflection_name)
+                if found['success'] and found['reflection']:
+                    reflection_id = found['reflection']['reflection_id']
+                    status = found['reflection']['status']
+            poller.record_poll()
+            
+            result = {
+                'dataset_path': dataset_path,
+                'reflection_name': reflection_name,
+                'reflection_id': reflection_id,
+                'status': status,
+                'poll_stats': poller.stats()
+            }
+            
+            if status in REFLECTION_READY_STATUSES:
+                logger.info(f"反射已就绪: {reflection_name}，状态: {status}，已轮询 {poller.polls} 次")
+                return dict(result, success=True, ready=True)
+            
+            if status in REFLECTION_FAILED_STATUSES:
+                logger.error(f"反射构建失败: {reflection_name}，状态: {status}")
+                return dict(result, success=False, ready=False, error=f'反射不可用，状态: {status}')
+            
+            if not poller.sleep():
+                logger.warning(f"等待反射就绪超时: {reflection_name}，当前状态: {status}")
+                return dict(result, success=False, ready=False, timed_out=True,
+                            error=f'等待反射就绪超时 ({timeout}秒)，当前状态: {status or "未找到"}')
+
+class CacheManager:
+    """缓存管理器"""
+    
+    def __init__(self, schema_cache, query_result_cache=None):
+        self.schema_cache = schema_cache
+        self.query_result_cache = query_result_cache
+        self.auto_refresh_thread = None
+        self.auto_refresh_running = False
+        self.auto_refresh_pid = None
+        self.lock = threading.Lock()
+    
+    def start_auto_refresh(self):
+        """启动自动刷新，每个进程只启动一次
+        
+        gunicorn等以fork方式启动worker时，父进程中启动的线程不会带到子进程，
+        因此按进程号判断当前进程是否已有刷新线程。
+        """
+        with self.lock:
+            if self.auto_refresh_running and self.auto_refresh_pid == os.getpid():
+                return
+            self.auto_refresh_running = True
+            self.auto_refresh_pid = os.getpid()
+            self.auto_refresh_thread = threading.Thread(target=self._auto_refresh_worker)
+            self.auto_refresh_thread.daemon = True
+            self.auto_refresh_thread.start()
+            logger.info(f"缓存自动刷新已启动 (pid={self.auto_refresh_pid})")
+    
+    def stop_auto_refresh(self):
+        """停止自动刷新"""
+        self.auto_refresh_running = False
+        if self.auto_refresh_thread:
+            self.auto_refresh_thread.join(timeout=5)
+        logger.info("缓存自动刷新已停止")
+    
+    def _auto_refresh_worker(self):
+        """自动刷新工作线程
+        
+        多个worker进程共用快照文件时，只有取得快照锁的进程从Dremio刷新并保存快照，
+        其余进程每隔SCHEMA_SNAPSHOT_RELOAD_INTERVAL秒检查快照文件，更新后重新加载。
+        """
+        while self.auto_refresh_running:
+            try:
+                if self.schema_cache.acquire_refresh_leadership():
+                    interval = 300  # 每5分钟检查一次是否过期
+                    if self.schema_cache.is_expired():
+                        logger.info("检测到缓存过期，开始自动刷新...")
+                        self.schema_cache.refresh_all(dremio_client)
+                else:
+                    interval = SCHEMA_SNAPSHOT_RELOAD_INTERVAL
+                    if self.schema_cache.reload_snapshot_if_changed():
+                        logger.info("已重新加载刷新进程保存的Schema缓存快照")
                 
+                for _ in range(int(interval)):
+                    if not self.auto_refresh_running:
+                        break
+                    time.sleep(1)
+                    
+            except Exception as e:
+                logger.error(f"自动刷新异常: {e}")
+                time.sleep(60)  # 出错后等待1分钟再继续
+    
+    def get_cache_stats(self):
+        """获取缓存统计信息"""
+        stats = self.schema_cache.stats()
+        stats['auto_refresh_running'] = self.auto_refresh_running
+        if self.query_result_cache is not None:
+            stats['query_result_cache'] = self.query_result_cache.stats()
+        return stats
+
+class MemoryLinkStore:
+    """进程内下载链接存储 - 仅适用于单进程部署"""
+    
+    name = 'memory'
+    
+    def __init__(self):
+        self.links = OrderedDict()  # {link_id: link_info}，链接有效期相同，插入顺序即过期顺序
+        self.lock = threading.Lock()
+    
+    def put(self, link_id, link_info):
+        with self.lock:
+            self.links[link_id] = link_info
+    
+    def get(self, link_id, now):
+        """获取未过期的链接信息"""
+        with self.lock:
+            link_info = self.links.get(link_id)
+            if link_info and link_info['expires_at'] > now:
+                return link_info
+            return None
+    
+    def delete(self, link_id):
+        with self.lock:
+            self.links.pop(link_id, None)
+    
+    def delete_expired(self, now):
+        """从最早创建的链接开始删除已过期的链接，返回删除数量"""
+        removed = 0
+        with self.lock:
+            while self.links:
+                link_id, link_info = next(iter(self.links.items()))
+                if link_info['expires_at'] > now:
+                    break
+                self.links.popitem(last=False)
+                removed += 1
+        return removed
+    
+    def count(self):
+        with self.lock:
+            return len(self.links)
+
+class SQLiteLinkStore:
+    """基于SQLite的下载链接存储 - WAL模式，多个worker进程共享同一个数据库文件
+    
+    过期时间建有索引，清理时按索引批量删除。
+    """
+    
+    name = 'sqlite'
+    
+    def __init__(self, db_path):
+        self.db_path = db_path
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS download_links (
+                    link_id TEXT PRIMARY KEY,
+                    sql TEXT NOT NULL,
+                    filename TEXT NOT NULL,
+                    format TEXT NOT NULL,
+                    options TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    expires_at REAL NOT NULL
+                )
+            """)
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_download_links_expires_at ON download_links (expires_at)')
+    
+    @contextmanager
+    def _connect(self):
+        """每次操作使用独立连接（自动提交），避免跨线程共享连接"""
+        conn = sqlite3.connect(self.db_path, timeout=10, isolation_level=None)
+        try:
+            conn.execute('PRAGMA synchronous=NORMAL')
+            yield conn
+        finally:
+            conn.close()
+    
+    def put(self, link_id, link_info):
+        with self._connect() as conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO download_links VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (link_id, link_info['sql'], link_info['filename'], link_info['format'],
+                 json.dumps(link_info['options'], ensure_ascii=False),
+                 link_info['created_at'], link_info['expires_at'])
+            )
+    
+    def get(self, link_id, now):
+        """获取未过期的链接信息"""
+        with self._connect() as conn:
+            row = conn.execute(
+                'SELECT sql, filename, format, options, created_at, expires_at '
+                'FROM download_links WHERE link_id = ? AND expires_at > ?',
+                (link_id, now)
+            ).fetchone()
+        
+        if row is None:
+            return None
+        return {
+            'sql': row[0],
+            'filename': row[1],
+            'format': row[2],
+            'options': json.loads(row[3]),
+            'created_at': row[4],
+            'expires_at': row[5]
+        }
+    
+    def delete(self, link_id):
+        with self._connect() as conn:
+            conn.execute('DELETE FROM download_links WHERE link_id = ?', (link_id,))
+    
+    def delete_expired(self, now):
+        """按过期时间索引批量删除过期链接，返回删除数量"""
+        with self._connect() as conn:
+            return conn.execute('DELETE FROM download_links WHERE expires_at <= ?', (now,)).rowcount
+    
+    def count(self):
+        with self._connect() as conn:
+            return conn.execute('SELECT COUNT(*) FROM download_links').fetchone()[0]
+
+def create_link_store():
+    """根据配置创建下载链接存储，SQLite不可用时回退到进程内存储"""
+    if DOWNLOAD_LINK_STORE == 'sqlite':
+        try:
+            store = SQLiteLinkStore(DOWNLOAD_LINK_DB)
+            logger.info(f"下载链接使用SQLite存储: {DOWNLOAD_LINK_DB}")
+            return store
         except Exception as e:
-            logger.error(f"刷新反射异常: {e}")
+            logger.warning(f"SQLite下载链接存储初始化失败: {e}，将使用进程内存储")
+    return MemoryLinkStore()
+
+class DownloadLinkManager:
+    """下载链接管理器"""
+    
+    def __init__(self, link_expiry_minutes=30, store=None, cleanup_interval=60):
+        self.store = store or MemoryLinkStore()
+        self.expiry_time = timedelta(minutes=link_expiry_minutes)
+        self.cleanup_interval = cleanup_interval
+        self.last_cleanup = 0
+        self.lock = threading.Lock()
+    
+    def generate_link(self, sql, filename, file_format, options=None):
+        """生成下载链接ID"""
+        link_id = str(uuid.uuid4())
+        created_at = time.time()
+        
+        self.store.put(link_id, {
+            'sql': sql,
+            'filename': filename,
+            'format': file_format,
+            'options': options or {},
+            'created_at': created_at,
+            'expires_at': created_at + self.expiry_time.total_seconds()
+        })
+        
+        logger.info(f"生成下载链接: {link_id} for {filename}")
+        return link_id
+    
+    def get_link_info(self, link_id):
+        """获取链接信息，过期链接返回None"""
+        return self.store.get(link_id, time.time())
+    
+    def cleanup_expired_links(self, force=False):
+        """批量清理过期链接，默认每个清理周期最多执行一次"""
+        now = time.time()
+        with self.lock:
+            if not force and now - self.last_cleanup < self.cleanup_interval:
+                return 0
+            self.last_cleanup = now
+        
+        removed = self.store.delete_expired(now)
+        if removed:
+            logger.info(f"清理了 {removed} 个过期下载链接")
+        return removed
+    
+    def stats(self):
+        """获取下载链接统计信息"""
+        return {
+            'store': self.store.name,
+            'links': self.store.count(),
+            'expiry_minutes': self.expiry_time.total_seconds() / 60
+        }
+
+class DownloadSpool:
+    """下载结果落盘缓存 - 生成链接时在后台执行查询并写入本地文件，重复下载直接从磁盘读取
+    
+    文件按链接ID命名，超过容量上限时按最近访问时间淘汰，链接过期后删除。
+    """
+    
+    def __init__(self, spool_dir, max_bytes, ttl_seconds, max_workers=2, wait_timeout=10):
+        self.spool_dir = spool_dir
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.wait_timeout = wait_timeout
+        self.entries = OrderedDict()  # {link_id: {state, path, size, format, error, future, expires_at}}，按访问顺序排列
+        self.total_bytes = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='download-spool')
+        self._load_existing_files()
+    
+    def _load_existing_files(self):
+        """启动时登记已有的落盘文件，删除未写完的临时文件"""
+        try:
+            os.makedirs(self.spool_dir, exist_ok=True)
+            files = []
+            for name in os.listdir(self.spool_dir):
+                path = os.path.join(self.spool_dir, name)
+                if name.endswith('.part'):
+                    # 其他worker进程可能仍在写入，只删除超过有效期的残留文件
+                    if time.time() - os.path.getmtime(path) > self.ttl_seconds:
+                        os.remove(path)
+                    continue
+                link_id, _, file_format = name.partition('.')
+                stat = os.stat(path)
+                files.append((stat.st_mtime, link_id, file_format, path, stat.st_size))
+            
+            for mtime, link_id, file_format, path, size in sorted(files):
+                self.entries[link_id] = {
+                    'state': 'ready',
+                    'path': path,
+                    'size': size,
+                    'format': file_format,
+                    'error': None,
+                    'future': None,
+                    'expires_at': mtime + self.ttl_seconds
+                }
+                self.total_bytes += size
+            
+            if files:
+                logger.info(f"已登记 {len(files)} 个落盘下载文件，共 {self.total_bytes / (1024 * 1024):.1f} MB")
+            self.evict_expired()
+        except Exception as e:
+            logger.warning(f"加载落盘下载文件失败: {e}")
+    
+    def _file_path(self, link_id, file_format):
+        return os.path.join(self.spool_dir, f"{link_id}.{file_format}")
+    
+    def materialize(self, link_id, sql, file_format, options=None, ttl_seconds=None):
+        """提交后台任务，将查询结果写入落盘文件"""
+        entry = {
+            'state': 'pending',
+            'path': self._file_path(link_id, file_format),
+            'size': 0,
+            'format': file_format,
+            'error': None,
+            'future': None,
+            'expires_at': time.time() + (ttl_seconds or self.ttl_seconds)
+        }
+        with self.lock:
+            self.entries[link_id] = entry
+            entry['future'] = self.executor.submit(self._materialize, link_id, entry, sql, file_format, options or {})
+        
+        logger.info(f"已提交下载结果落盘任务: {link_id} ({file_format})")
+    
+    def _materialize(self, link_id, entry, sql, file_format, options):
+        """后台任务：执行查询并写入临时文件，完成后重命名为正式文件"""
+        start_time = time.time()
+        temp_path = f"{entry['path']}.part"
+        batches = None
+        try:
+            batches = iter_query_batches(sql, options.get('parallel_endpoints'))
+            if file_format == 'xlsx':
+                write_xlsx_from_batches(batches, temp_path)
+            else:
+                written = 0
+                with open(temp_path, 'wb') as output:
+                    for chunk in iter_export_chunks(batches, file_format, options):
+                        output.write(chunk)
+                        written += len(chunk)
+                        if written > self.max_bytes:
+                            raise Exception(f"结果超过落盘容量上限 {self.max_bytes / (1024 * 1024):.0f} MB")
+            
+            size = os.path.getsize(temp_path)
+            if size > self.max_bytes:
+                raise Exception(f"结果超过落盘容量上限 {self.max_bytes / (1024 * 1024):.0f} MB")
+            batches.close()
+            os.replace(temp_path, entry['path'])
+            
+            with self.lock:
+                if self.entries.get(link_id) is not entry:
+                    # 生成期间链接已被删除
+                    os.remove(entry['path'])
+                    return
+                entry['size'] = size
+                entry['state'] = 'ready'
+                self.total_bytes += size
+                self._evict_over_capacity(keep=link_id)
+            
+            logger.info(f"下载结果已落盘: {link_id}, {size / (1024 * 1024):.2f} MB, 耗时 {time.time() - start_time:.2f}秒")
+        
+        except Exception as e:
+            logger.error(f"下载结果落盘失败: {link_id}, {e}")
+            if batches is not None:
+                batches.close()
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            with self.lock:
+                entry['state'] = 'failed'
+                entry['error'] = str(e)
+    
+    def _adopt_file(self, link_id, file_format):
+        """登记由其他worker进程生成的落盘文件（调用方需持有锁）"""
+        path = self._file_path(link_id, file_format)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        
+        entry = {
+            'state': 'ready',
+            'path': path,
+            'size': stat.st_size,
+            'format': file_format,
+            'error': None,
+            'future': None,
+            'expires_at': stat.st_mtime + self.ttl_seconds
+        }
+        self.entries[link_id] = entry
+        self.total_bytes += stat.st_size
+        return entry
+    
+    def _wait_for_external(self, link_id, file_format, timeout, poll_interval=0.5):
+        """等待其他worker进程写完落盘文件，最多等待timeout秒；返回文件是否仍在生成"""
+        part_path = f"{self._file_path(link_id, file_format)}.part"
+        deadline = time.time() + timeout
+        while os.path.exists(part_path):
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                return True
+            time.sleep(min(poll_interval, remaining))
+        return False
+    
+    def get(self, link_id, file_format=None, wait=True, timeout=None):
+        """获取落盘文件信息，不存在时返回None
+        
+        文件仍在生成时最多等待timeout秒（默认wait_timeout），仍未完成则返回state为pending的信息，
+        由调用方稍后重试，不长时间占用请求线程。
+        多进程部署时链接可能由其他worker生成，传入file_format后会在共享目录中查找。
+        """
+        timeout = self.wait_timeout if timeout is None else timeout
+        with self.lock:
+            entry = self.entries.get(link_id)
+            if entry is None and file_format:
+                entry = self._adopt_file(link_id, file_format)
+        
+        if entry is None and file_format and wait:
+            if self._wait_for_external(link_id, file_format, timeout):
+                return {'state': 'pending', 'path': self._file_path(link_id, file_format), 'size': 0,
+                        'format': file_format, 'error': None}
+            with self.lock:
+                entry = self.entries.get(link_id) or self._adopt_file(link_id, file_format)
+        
+        with self.lock:
+            if entry is None:
+                return None
+            if link_id in self.entries:
+                self.entries.move_to_end(link_id)
+            future = entry['future']
+        
+        if wait and entry['state'] == 'pending' and future is not None:
+            try:
+                future.result(timeout=timeout)
+            except FutureTimeoutError:
+                pass
+        
+        with self.lock:
+            if entry['state'] == 'ready' and not os.path.exists(entry['path']):
+                # 文件已被淘汰或在外部删除
+                self._remove_entry(link_id)
+                return None
+            return {key: value for key, value in entry.items() if key != 'future'}
+    
+    def _remove_entry(self, link_id):
+        """删除条目及其文件（调用方需持有锁）"""
+        entry = self.entries.pop(link_id, None)
+        if entry is None:
+            return
+        if entry['state'] == 'ready':
+            self.total_bytes -= entry['size']
+            try:
+                os.remove(entry['path'])
+            except FileNotFoundError:
+                pass
+    
+    def _evict_over_capacity(self, keep=None):
+        """容量超限时按最近访问时间淘汰已完成的文件（调用方需持有锁）"""
+        for link_id in list(self.entries.keys()):
+            if self.total_bytes <= self.max_bytes:
+                break
+            if link_id == keep or self.entries[link_id]['state'] != 'ready':
+                continue
+            self._remove_entry(link_id)
+            self.evictions += 1
+            logger.info(f"落盘下载文件超出容量上限，已淘汰: {link_id}")
+    
+    def remove(self, link_id):
+        """删除指定链接的落盘文件"""
+        with self.lock:
+            self._remove_entry(link_id)
+    
+    def evict_expired(self):
+        """删除链接已过期的落盘文件，返回删除数量"""
+        now = time.time()
+        with self.lock:
+            expired = [
+                link_id for link_id, entry in self.entries.items()
+                if entry['expires_at'] <= now and entry['state'] != 'pending'
+            ]
+            for link_id in expired:
+                self._remove_entry(link_id)
+        
+        if expired:
+            logger.info(f"清理了 {len(expired)} 个过期落盘下载文件")
+        return len(expired)
+    
+    def stats(self):
+        """获取落盘缓存统计信息"""
+        with self.lock:
+            states = {}
+            for entry in self.entries.values():
+                states[entry['state']] = states.get(entry['state'], 0) + 1
             return {
-                'success': False,
-                'error': f'刷新反射异常: {str(e)}'
+                'spool_dir': self.spool_dir,
+                'entries': len(self.entries),
+                'states': states,
+                'total_mb': round(self.total_bytes / (1024 * 1024), 2),
+                'max_mb': round(self.max_bytes / (1024 * 1024), 2),
+                'evictions': self.evictions
             }
 
-class CacheManager:
-    """缓存管理器"""
+class MemoryRefreshTicketStore:
+    """进程内刷新ticket存储 - 仅适用于单进程部署"""
     
-    def __init__(self, schema_cache):
-        self.schema_cache = schema_cache
-        self.auto_refresh_thread = None
-        self.auto_refresh_running = False
+    name = 'memory'
     
-    def start_auto_refresh(self):
-        """启动自动刷新"""
-        if not self.auto_refresh_running:
-            self.auto_refresh_running = True
-            self.auto_refresh_thread = threading.Thread(target=self._auto_refresh_worker)
-            self.auto_refresh_thread.daemon = True
-            self.auto_refresh_thread.start()
-            logger.info("缓存自动刷新已启动")
+    def __init__(self):
+        self.tickets = OrderedDict()  # {ticket_id: ticket}，按创建顺序排列
+        self.lock = threading.Lock()
     
-    def stop_auto_refresh(self):
-        """停止自动刷新"""
-        self.auto_refresh_running = False
-        if self.auto_refresh_thread:
-            self.auto_refresh_thread.join(timeout=5)
-        logger.info("缓存自动刷新已停止")
+    def add(self, ticket, debounce_seconds):
+        """登记ticket：已有待执行ticket时加入当前批次窗口，否则打开新窗口；返回是否与同一数据集的待执行请求合并"""
+        with self.lock:
+            queued = [t for t in self.tickets.values() if t['state'] == 'queued']
+            ticket['scheduled_at'] = min(t['scheduled_at'] for t in queued) if queued else ticket['created_at'] + debounce_seconds
+            self.tickets[ticket['ticket_id']] = dict(ticket)
+            return any(t['dataset_path'] == ticket['dataset_path'] for t in queued)
     
-    def _auto_refresh_worker(self):
-        """自动刷新工作线程"""
-        while self.auto_refresh_running:
-            try:
-                if self.schema_cache.is_expired():
-                    logger.info("检测到缓存过期，开始自动刷新...")
-                    self.schema_cache.refresh_all(dremio_client)
-                
-                # 每5分钟检查一次
-                for _ in range(300):  # 5分钟 = 300秒
-                    if not self.auto_refresh_running:
-                        break
-                    time.sleep(1)
-                    
-            except Exception as e:
-                logger.error(f"自动刷新异常: {e}")
-                time.sleep(60)  # 出错后等待1分钟再继续
+    def get(self, ticket_id):
+        with self.lock:
+            ticket = self.tickets.get(ticket_id)
+            return dict(ticket) if ticket else None
     
-    def get_cache_stats(self):
-        """获取缓存统计信息"""
-        stats = self.schema_cache.stats()
-        stats['auto_refresh_running'] = self.auto_refresh_running
-        return stats
-
-class DownloadLinkManager:
-    """下载链接管理器"""
+    def next_scheduled_at(self):
+        """当前批次窗口的结束时间，没有待执行ticket时返回None"""
+        with self.lock:
+            return min((t['scheduled_at'] for t in self.tickets.values() if t['state'] == 'queued'), default=None)
     
-    def __init__(self, link_expiry_minutes=30):
-        self.links = {}  # {link_id: {sql, filename, format, created_at}}
-        self.expiry_time = timedelta(minutes=link_expiry_minutes)
-        self.lock = threading.Lock()
+    def claim(self, now):
+        """领取窗口已结束的全部待执行ticket并标记为running"""
+        with self.lock:
+            claimed = []
+            for ticket in self.tickets.values():
+                if ticket['state'] == 'queued' and ticket['scheduled_at'] <= now:
+                    ticket['state'] = 'running'
+                    ticket['started_at'] = now
+                    claimed.append(dict(ticket))
+            return claimed
     
-    def generate_link(self, sql, filename, file_format):
-        """生成下载链接ID"""
-        link_id = str(uuid.uuid4())
-        
+    def finish(self, ticket_ids, state, result, finished_at):
         with self.lock:
-            self.links[link_id] = {
-                'sql': sql,
-                'filename': filename,
-                'format': file_format,
-                'created_at': datetime.now()
-            }
-        
-        logger.info(f"生成下载链接: {link_id} for {filename}")
-        return link_id
+            for ticket_id in ticket_ids:
+                ticket = self.tickets.get(ticket_id)
+                if ticket is not None:
+                    ticket.update(state=state, finished_at=finished_at, result=result, error=result.get('error'))
     
-    def get_link_info(self, link_id):
-        """获取链接信息"""
+    def prune(self, now, ttl):
+        """删除已完成且超过保留时间的ticket"""
         with self.lock:
-            link_info = self.links.get(link_id)
-            
-            if link_info:
-                # 检查是否过期
-                if datetime.now() - link_info['created_at'] > self.expiry_time:
-                    del self.links[link_id]
-                    return None
-                
-                return link_info
-            
-            return None
+            expired = [ticket_id for ticket_id, t in self.tickets.items()
+                       if t['finished_at'] is not None and now - t['finished_at'] >= ttl]
+            for ticket_id in expired:
+                del self.tickets[ticket_id]
     
-    def cleanup_expired_links(self):
-        """清理过期链接"""
+    def summary(self):
+        """各状态ticket数与待执行的数据集（按首次请求顺序）"""
         with self.lock:
-            current_time = datetime.now()
-            expired_links = []
-            
-            for link_id, link_info in self.links.items():
-                if current_time - link_info['created_at'] > self.expiry_time:
-                    expired_links.append(link_id)
+            states = {}
+            pending = []
+            for ticket in self.tickets.values():
+                states[ticket['state']] = states.get(ticket['state'], 0) + 1
+                if ticket['state'] == 'queued' and ticket['dataset_path'] not in pending:
+                    pending.append(ticket['dataset_path'])
+            return {'tickets': states, 'pending_datasets': pending}
+
+class SQLiteRefreshTicketStore:
+    """基于SQLite的刷新ticket存储 - 多个worker进程共享批次窗口与ticket状态
+    
+    登记与领取批次都在BEGIN IMMEDIATE事务中执行，同一批次只会被一个进程领取；
+    任一进程都可以查询其他进程登记的ticket。
+    """
+    
+    name = 'sqlite'
+    
+    COLUMNS = ('ticket_id', 'dataset_path', 'metadata', 'reflection', 'state', 'created_at',
+               'scheduled_at', 'started_at', 'finished_at', 'result', 'error')
+    
+    def __init__(self, db_path):
+        self.db_path = db_path
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS dataset_refresh_tickets (
+                    ticket_id TEXT PRIMARY KEY,
+                    dataset_path TEXT NOT NULL,
+                    metadata INTEGER NOT NULL,
+                    reflection INTEGER NOT NULL,
+                    state TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    scheduled_at REAL NOT NULL,
+                    started_at REAL,
+                    finished_at REAL,
+                    result TEXT,
+                    error TEXT
+                )
+            """)
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_refresh_tickets_state ON dataset_refresh_tickets (state, scheduled_at)')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_refresh_tickets_finished_at ON dataset_refresh_tickets (finished_at)')
+    
+    @contextmanager
+    def _connect(self):
+        """每次操作使用独立连接（自动提交），避免跨线程共享连接"""
+        conn = sqlite3.connect(self.db_path, timeout=10, isolation_level=None)
+        try:
+            conn.execute('PRAGMA synchronous=NORMAL')
+            yield conn
+        finally:
+            conn.close()
+    
+    @contextmanager
+    def _transaction(self):
+        """写事务：多个进程同时登记或领取批次时串行执行"""
+        with self._connect() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                yield conn
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
+            conn.execute('COMMIT')
+    
+    def _ticket(self, row):
+        ticket = dict(zip(self.COLUMNS, row))
+        ticket['metadata'] = bool(ticket['metadata'])
+        ticket['reflection'] = bool(ticket['reflection'])
+        if ticket['result'] is not None:
+            ticket['result'] = json.loads(ticket['result'])
+        return ticket
+    
+    def add(self, ticket, debounce_seconds):
+        """登记ticket：已有待执行ticket时加入当前批次窗口，否则打开新窗口；返回是否与同一数据集的待执行请求合并"""
+        with self._transaction() as conn:
+            scheduled_at = conn.execute(
+                "SELECT MIN(scheduled_at) FROM dataset_refresh_tickets WHERE state = 'queued'"
+            ).fetchone()[0]
+            merged = conn.execute(
+                "SELECT 1 FROM dataset_refresh_tickets WHERE state = 'queued' AND dataset_path = ? LIMIT 1",
+                (ticket['dataset_path'],)
+            ).fetchone() is not None
+            ticket['scheduled_at'] = scheduled_at if scheduled_at is not None else ticket['created_at'] + debounce_seconds
+            conn.execute(
+                f"INSERT INTO dataset_refresh_tickets ({', '.join(self.COLUMNS)}) VALUES ({', '.join('?' * len(self.COLUMNS))})",
+                tuple(ticket[column] for column in self.COLUMNS)
+            )
+        return merged
+    
+    def get(self, ticket_id):
+        with self._connect() as conn:
+            row = conn.execute(
+                f"SELECT {', '.join(self.COLUMNS)} FROM dataset_refresh_tickets WHERE ticket_id = ?", (ticket_id,)
+            ).fetchone()
+        return self._ticket(row) if row else None
+    
+    def next_scheduled_at(self):
+        """当前批次窗口的结束时间，没有待执行ticket时返回None"""
+        with self._connect() as conn:
+            return conn.execute(
+                "SELECT MIN(scheduled_at) FROM dataset_refresh_tickets WHERE state = 'queued'"
+            ).fetchone()[0]
+    
+    def claim(self, now):
+        """领取窗口已结束的全部待执行ticket并标记为running"""
+        with self._transaction() as conn:
+            rows = conn.execute(
+                f"SELECT {', '.join(self.COLUMNS)} FROM dataset_refresh_tickets "
+                "WHERE state = 'queued' AND scheduled_at <= ? ORDER BY created_at",
+                (now,)
+            ).fetchall()
+            conn.execute(
+                "UPDATE dataset_refresh_tickets SET state = 'running', started_at = ? "
+                "WHERE state = 'queued' AND scheduled_at <= ?",
+                (now, now)
+            )
+        claimed = [self._ticket(row) for row in rows]
+        for ticket in claimed:
+            ticket['state'] = 'running'
+            ticket['started_at'] = now
+        return claimed
+    
+    def finish(self, ticket_ids, state, result, finished_at):
+        with self._connect() as conn:
+            conn.executemany(
+                'UPDATE dataset_refresh_tickets SET state = ?, finished_at = ?, result = ?, error = ? WHERE ticket_id = ?',
+                [(state, finished_at, json.dumps(result, ensure_ascii=False, default=str), result.get('error'), ticket_id)
+                 for ticket_id in ticket_ids]
+            )
+    
+    def prune(self, now, ttl):
+        """删除已完成且超过保留时间的ticket；执行中的进程退出后遗留的running ticket超过保留时间时标记为失败"""
+        with self._connect() as conn:
+            conn.execute('DELETE FROM dataset_refresh_tickets WHERE finished_at <= ?', (now - ttl,))
+            conn.execute(
+                "UPDATE dataset_refresh_tickets SET state = 'failed', finished_at = ?, error = ? "
+                "WHERE state = 'running' AND started_at <= ?",
+                (now, '刷新进程已退出，批次未完成', now - ttl)
+            )
+    
+    def summary(self):
+        """各状态ticket数与待执行的数据集（按首次请求顺序）"""
+        with self._connect() as conn:
+            states = dict(conn.execute('SELECT state, COUNT(*) FROM dataset_refresh_tickets GROUP BY state').fetchall())
+            pending = [row[0] for row in conn.execute(
+                "SELECT dataset_path FROM dataset_refresh_tickets WHERE state = 'queued' "
+                'GROUP BY dataset_path ORDER BY MIN(created_at)'
+            )]
+        return {'tickets': states, 'pending_datasets': pending}
+
+def create_refresh_ticket_store():
+    """刷新队列与下载链接使用同一存储配置（DOWNLOAD_LINK_STORE / DOWNLOAD_LINK_DB），SQLite不可用时回退到进程内存储"""
+    if DOWNLOAD_LINK_STORE == 'sqlite':
+        try:
+            store = SQLiteRefreshTicketStore(DOWNLOAD_LINK_DB)
+            logger.info(f"数据集刷新队列使用SQLite存储: {DOWNLOAD_LINK_DB}")
+            return store
+        except Exception as e:
+            logger.warning(f"SQLite刷新队列存储初始化失败: {e}，将使用进程内存储")
+    return MemoryRefreshTicketStore()
+
+class DatasetRefreshQueue:
+    """数据集刷新队列 - 合并去抖窗口内对同一数据集的重复刷新请求，按批次先刷新元数据再重建反射
+    
+    队列为空时的第一个请求打开一个批次窗口，窗口内到达的所有请求（不论数据集）在窗口结束时作为同一批次执行。
+    每个请求返回一个ticket，调用方可轮询ticket状态；同一数据集的多个ticket共享同一次刷新结果。
+    ticket与批次窗口保存在store中，使用SQLite存储时多个worker进程共享同一个队列，
+    每个进程的后台线程定期检查窗口是否结束，由先领取到批次的进程执行。
+    
+    元数据刷新与反射重建都占用maintenance准入名额：并发线程数默认等于该类别的并发名额，
+    排队等待名额的时间与元数据刷新超时相同，避免批次内的刷新因排队超时而失败。
+    """
+    
+    def __init__(self, debounce_seconds=30, ticket_ttl=3600, metadata_timeout=600, max_workers=None,
+                 store=None, poll_interval=5):
+        self.debounce_seconds = debounce_seconds
+        self.ticket_ttl = ticket_ttl
+        self.metadata_timeout = metadata_timeout
+        self.max_workers = max_workers or query_admission.class_concurrency['maintenance']
+        self.store = store or MemoryRefreshTicketStore()
+        self.poll_interval = poll_interval
+        self.condition = threading.Condition()
+        self.worker = None
+        self.counters = {'requests': 0, 'merged': 0, 'batches': 0, 'metadata_refreshes': 0, 'reflection_refreshes': 0}
+    
+    def enqueue(self, dataset_path, metadata=True, reflection=True):
+        """登记一次刷新请求，返回ticket信息；窗口内已有同一数据集的待刷新请求时合并"""
+        now = time.time()
+        ticket = {
+            'ticket_id': str(uuid.uuid4()),
+            'dataset_path': dataset_path,
+            'metadata': metadata,
+            'reflection': reflection,
+            'state': 'queued',
+            'created_at': now,
+            'scheduled_at': None,
+            'started_at': None,
+            'finished_at': None,
+            'result': None,
+            'error': None
+        }
+        self.store.prune(now, self.ticket_ttl)
+        merged = self.store.add(ticket, self.debounce_seconds)
+        
+        with self.condition:
+            self.counters['requests'] += 1
+            if merged:
+                self.counters['merged'] += 1
+            if self.worker is None or not self.worker.is_alive():
+                self.worker = threading.Thread(target=self._run, name='dataset-refresh-queue', daemon=True)
+                self.worker.start()
+            self.condition.notify_all()
+        
+        logger.info(f"数据集刷新请求已排队: {dataset_path}, ticket={ticket['ticket_id']}, 与已排队请求合并: {merged}")
+        return self._ticket_view(ticket)
+    
+    def get_ticket(self, ticket_id):
+        """获取ticket状态，不存在或已过期时返回None"""
+        ticket = self.store.get(ticket_id)
+        return self._ticket_view(ticket) if ticket else None
+    
+    def _ticket_view(self, ticket):
+        view = dict(ticket)
+        for key in ('created_at', 'scheduled_at', 'started_at', 'finished_at'):
+            if view[key] is not None:
+                view[key] = datetime.fromtimestamp(view[key]).isoformat()
+        return view
+    
+    def _wait_for_window(self):
+        """等到当前批次窗口结束；没有待执行ticket时按poll_interval检查其他进程登记的请求"""
+        with self.condition:
+            while True:
+                now = time.time()
+                next_at = self.store.next_scheduled_at()
+                if next_at is not None and now >= next_at:
+                    return
+                timeout = self.poll_interval if next_at is None else min(next_at - now, self.poll_interval)
+                self.condition.wait(timeout)
+    
+    def _run(self):
+        """后台线程：等到批次窗口结束，领取窗口内的全部数据集作为一个批次执行"""
+        while True:
+            try:
+                self._wait_for_window()
+                tickets = self.store.claim(time.time())
+            except Exception as e:
+                logger.error(f"读取数据集刷新队列失败: {e}")
+                time.sleep(self.poll_interval)
+                continue
+            if not tickets:
+                continue  # 批次已被其他进程领取
+            
+            batch = OrderedDict()  # {dataset_path: {metadata, reflection, tickets}}，按首次请求顺序排列
+            for ticket in tickets:
+                entry = batch.setdefault(ticket['dataset_path'], {'metadata': False, 'reflection': False, 'tickets': []})
+                entry['metadata'] = entry['metadata'] or ticket['metadata']
+                entry['reflection'] = entry['reflection'] or ticket['reflection']
+                entry['tickets'].append(ticket['ticket_id'])
+            with self.condition:
+                self.counters['batches'] += 1
             
-            for link_id in expired_links:
-                del self.links[link_id]
+            try:
+                results = self._refresh_batch(batch)
+            except Exception as e:
+                logger.error(f"数据集刷新批次异常: {e}")
+                results = {path: {'success': False, 'error': f'刷新异常: {str(e)}'} for path in batch}
             
-            if expired_links:
-                logger.info(f"清理了 {len(expired_links)} 个过期下载链接")
+            finished_at = time.time()
+            for path, entry in batch.items():
+                result = results[path]
+                if result['success']:
+                    state = 'done'
+                elif result.get('metadata', {}).get('success') or result.get('reflection', {}).get('success'):
+                    state = 'partial'
+                else:
+                    state = 'failed'
+                try:
+                    self.store.finish(entry['tickets'], state, result, finished_at)
+                except Exception as e:
+                    logger.error(f"保存数据集刷新结果失败: {path}, {e}")
+    
+    def _refresh_batch(self, batch):
+        """执行一个批次：先并发刷新元数据，再用一次批量操作重建反射
+        
+        元数据刷新失败时仍然重建反射（对虚拟数据集执行ALTER PDS总会失败），
+        两步的错误分别记录在metadata_error与reflection_error中。
+        """
+        logger.info(f"开始执行数据集刷新批次: {len(batch)} 个数据集")
+        results = {path: {'success': True} for path in batch}
+        
+        metadata_paths = [path for path, entry in batch.items() if entry['metadata']]
+        if metadata_paths:
+            with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='dataset-refresh') as executor:
+                futures = {
+                    executor.submit(
+                        dremio_client.run_maintenance, dremio_client.refresh_dataset_metadata, path, self.metadata_timeout,
+                        timeout=self.metadata_timeout
+                    ): path
+                    for path in metadata_paths
+                }
+                for future in as_completed(futures):
+                    path = futures[future]
+                    metadata_result = future.result()
+                    results[path]['metadata'] = metadata_result
+                    if not metadata_result['success']:
+                        results[path]['success'] = False
+                        results[path]['metadata_error'] = f"元数据刷新失败: {metadata_result.get('error')}"
+            with self.condition:
+                self.counters['metadata_refreshes'] += len(metadata_paths)
+        
+        reflection_paths = [path for path, entry in batch.items() if entry['reflection']]
+        if reflection_paths:
+            batch_result = dremio_client.refresh_reflections_batch(
+                reflection_paths, self.max_workers, admission_timeout=self.metadata_timeout
+            )
+            if 'results' in batch_result:
+                for item in batch_result['results']:
+                    path = item['dataset_path']
+                    results[path]['reflection'] = item
+                    if not item['success']:
+                        results[path]['success'] = False
+                        results[path]['reflection_error'] = f"反射刷新失败: {item.get('error')}"
+            else:
+                for path in reflection_paths:
+                    results[path]['success'] = False
+                    results[path]['reflection_error'] = f"反射刷新失败: {batch_result.get('error')}"
+            with self.condition:
+                self.counters['reflection_refreshes'] += len(reflection_paths)
+        
+        for path, result in results.items():
+            if not result['success']:
+                result['error'] = '; '.join(result[key] for key in ('metadata_error', 'reflection_error') if key in result)
+            if result.get('metadata', {}).get('success') or result.get('reflection', {}).get('success'):
+                invalidate_dataset_caches(path)
+        
+        succeeded = sum(1 for result in results.values() if result['success'])
+        logger.info(f"数据集刷新批次完成: {succeeded}/{len(batch)} 个数据集成功")
+        return results
+    
+    def stats(self):
+        """获取刷新队列统计信息"""
+        summary = self.store.summary()
+        with self.condition:
+            counters = dict(self.counters)
+        return {
+            'debounce_seconds': self.debounce_seconds,
+            'store': self.store.name,
+            'pending_datasets': summary['pending_datasets'],
+            'tickets': summary['tickets'],
+            **counters
+        }
 
 # 初始化组件
-schema_cache = SchemaCache(refresh_interval_minutes=30)
+schema_cache = SchemaCache(
+    refresh_interval_minutes=30,
+    snapshot_path=SCHEMA_CACHE_SNAPSHOT,
+    snapshot_save_delay=SCHEMA_SNAPSHOT_SAVE_DELAY
+)
+schema_cache.load_snapshot()
 # 从环境变量获取Dremio连接配置
 dremio_host = os.environ.get('DREMIO_HOST', 'localhost')
 dremio_port = int(os.environ.get('DREMIO_PORT', 9047))
 dremio_username = os.environ.get('DREMIO_USERNAME', 'admin')
 dremio_password = os.environ.get('DREMIO_PASSWORD', 'admin123')
 dremio_client = DremioClient(host=dremio_host, port=dremio_port, username=dremio_username, password=dremio_password)
-cache_manager = CacheManager(schema_cache)
-download_manager = DownloadLinkManager()
+query_result_cache = QueryResultCache(
+    max_bytes=QUERY_CACHE_MAX_MB * 1024 * 1024,
+    max_entry_bytes=QUERY_CACHE_MAX_ENTRY_MB * 1024 * 1024,
+    default_ttl=QUERY_CACHE_TTL
+)
+cache_manager = CacheManager(schema_cache, query_result_cache)
+# 只合并返回JSON的查询（结果本身就要完整返回）；导出与下载不在内存中保存完整结果，由shared_export_streams合并为一个批次流
+query_single_flight = SingleFlight()
+shared_export_streams = SharedBatchStreams(
+    replay_bytes=EXPORT_SHARED_REPLAY_MB * 1024 * 1024,
+    max_lag_bytes=EXPORT_SHARED_MAX_LAG_MB * 1024 * 1024,
+    lag_timeout=EXPORT_SHARED_LAG_TIMEOUT
+)
+query_admission = AdmissionController(
+    ADMISSION_MAX_CONCURRENT,
+    ADMISSION_CLASS_CONCURRENCY,
+    ADMISSION_QUEUE_LIMITS,
+    queue_timeout=ADMISSION_QUEUE_TIMEOUT
+)
+download_manager = DownloadLinkManager(store=create_link_store(), cleanup_interval=DOWNLOAD_LINK_CLEANUP_INTERVAL)
+download_spool = DownloadSpool(
+    DOWNLOAD_SPOOL_DIR,
+    max_bytes=DOWNLOAD_SPOOL_MAX_MB * 1024 * 1024,
+    ttl_seconds=download_manager.expiry_time.total_seconds(),
+    max_workers=DOWNLOAD_SPOOL_WORKERS,
+    wait_timeout=DOWNLOAD_SPOOL_WAIT_SECONDS
+)
+dataset_refresh_queue = DatasetRefreshQueue(
+    debounce_seconds=DATASET_REFRESH_DEBOUNCE_SECONDS,
+    ticket_ttl=DATASET_REFRESH_TICKET_TTL,
+    store=create_refresh_ticket_store()
+)
 
 # Arrow Flight客户端（用于高速数据导出）
 try:
@@ -1533,82 +4150,1054 @@ try:
     import pyarrow as pa
     
     class DremioFlightClient:
-        """Dremio Arrow Flight客户端 - 用于高速数据传输"""
+        """Dremio Arrow Flight客户端连接池 - 用于高速数据传输
+        
+        连接在首次查询时才建立，多个线程各自使用独立的gRPC连接。Bearer Token在连接间共享，
+        过期或被拒绝时重新认证；连接出错后丢弃，下次使用时重新建立。
+        空闲超过idle_timeout的连接取出时重新建立；复用的连接提交查询时服务不可达，换新连接重试一次。
+        """
+        
+        # 这些错误说明服务不可达，在重试间隔内不再新建连接
+        CONNECTION_ERRORS = (flight.FlightUnavailableError, flight.FlightTimedOutError)
         
-        def __init__(self, host=None, port=32010, username=None, password=None):
+        def __init__(self, host=None, port=None, username=None, password=None,
+                     pool_size=4, token_ttl=3600, retry_interval=30, acquire_timeout=30, idle_timeout=300):
             # 使用环境变量或默认值
             self.host = host or os.environ.get('DREMIO_HOST', 'localhost')
             self.username = username or os.environ.get('DREMIO_USERNAME', 'admin')
             self.password = password or os.environ.get('DREMIO_PASSWORD', 'admin123')
-            self.port = port
-            self.client = None
-            self._connect()
-        
-        def _connect(self):
-            """连接到Dremio Flight服务"""
-            try:
-                location = flight.Location.for_grpc_tcp(self.host, self.port)
-                self.client = flight.FlightClient(location)
-                
-                # 认证
-                auth_handler = flight.BasicAuthHandler(self.username, self.password)
-                self.client.authenticate(auth_handler)
-                
-                logger.info(f"Arrow Flight连接成功: {self.host}:{self.port}")
+            self.port = port or 32010
+            self.location = flight.Location.for_grpc_tcp(self.host, self.port)
+            self.pool_size = pool_size
+            self.token_ttl = token_ttl
+            self.retry_interval = retry_interval
+            self.acquire_timeout = acquire_timeout
+            self.idle_timeout = idle_timeout
+            
+            self.idle_clients = []  # [(client, released_at)]
+            self.created = 0
+            self.condition = threading.Condition()
+            
+            self.token = None  # (b'authorization', b'Bearer ...')
+            self.token_expires_at = 0
+            self.token_lock = threading.Lock()
+            
+            self.last_failure_at = 0
+            self.last_error = None
+            self.counters = {'connects': 0, 'discarded': 0, 'recycled': 0, 'retries': 0,
+                             'authentications': 0, 'pool_waits': 0}
+        
+        def _acquire(self):
+            """从连接池取出一个连接，返回 (client, 是否复用的空闲连接)
+            
+            池中没有空闲连接且未达上限时新建连接；空闲超过idle_timeout的连接关闭后重新建立。
+            """
+            stale_clients = []
+            with self.condition:
+                while not self.idle_clients and self.created >= self.pool_size:
+                    self.counters['pool_waits'] += 1
+                    if not self.condition.wait(self.acquire_timeout):
+                        raise Exception("Arrow Flight连接池已满，等待空闲连接超时")
                 
-            except Exception as e:
-                logger.warning(f"Arrow Flight连接失败: {e}，将使用REST API作为备选")
-                self.client = None
-        
-        def execute_query_to_dataframe(self, sql):
-            """执行查询并返回DataFrame"""
-            if not self.client:
-                raise Exception("Arrow Flight客户端未连接")
+                # 最近归还的连接在列表末尾，从末尾取出，遇到空闲过久的连接时其之前的也都已过期
+                pooled = None
+                if self.idle_clients:
+                    client, released_at = self.idle_clients.pop()
+                    if time.time() - released_at <= self.idle_timeout:
+                        pooled = client
+                    else:
+                        stale_clients = [client] + [client for client, _ in self.idle_clients]
+                        self.idle_clients = []
+                        self.created -= len(stale_clients)
+                        self.counters['recycled'] += len(stale_clients)
+                if pooled is None:
+                    self.created += 1
+            
+            for client in stale_clients:
+                try:
+                    client.close()
+                except Exception:
+                    pass
+            if stale_clients:
+                logger.info(f"Arrow Flight关闭 {len(stale_clients)} 个空闲超过 {self.idle_timeout:g} 秒的连接")
+            
+            if pooled is not None:
+                return pooled, True
+            
+            try:
+                return self._create_client(), False
+            except Exception:
+                with self.condition:
+                    self.created -= 1
+                    self.condition.notify()
+                raise
+        
+        def _release(self, client, broken=False):
+            """归还连接；出错的连接直接关闭，下次使用时重新建立"""
+            with self.condition:
+                if broken:
+                    self.created -= 1
+                    self.counters['discarded'] += 1
+                else:
+                    self.idle_clients.append((client, time.time()))
+                self.condition.notify()
+            
+            if broken:
+                try:
+                    client.close()
+                except Exception:
+                    pass
+        
+        def _create_client(self):
+            """建立新的Flight连接；最近连接失败时在重试间隔内直接失败，让调用方尽快回退到REST"""
+            if self.last_failure_at and time.time() - self.last_failure_at < self.retry_interval:
+                raise Exception(f"Arrow Flight暂不可用（{self.retry_interval}秒内连接失败过）: {self.last_error}")
+            
+            client = flight.FlightClient(self.location)
+            self.counters['connects'] += 1
+            logger.info(f"Arrow Flight新建连接: {self.host}:{self.port}")
+            return client
+        
+        def _call_options(self, client, renew=False):
+            """获取带Bearer Token的调用参数，Token不存在、过期或被拒绝时重新认证"""
+            with self.token_lock:
+                if renew or self.token is None or time.time() >= self.token_expires_at:
+                    try:
+                        self.token = client.authenticate_basic_token(self.username, self.password)
+                    except Exception as e:
+                        # 认证阶段失败（服务不可达或账号错误）时短时间内不再尝试
+                        self._record_failure(e)
+                        raise
+                    self.token_expires_at = time.time() + self.token_ttl
+                    self.counters['authentications'] += 1
+                    logger.info("Arrow Flight认证成功，已缓存Bearer Token")
+                token = self.token
+            return flight.FlightCallOptions(headers=[token])
+        
+        def _get_flight_info(self, client, sql):
+            """提交查询并获取结果的endpoint列表，Token失效时重新认证后重试一次"""
+            flight_desc = flight.FlightDescriptor.for_command(sql.encode('utf-8'))
+            try:
+                options = self._call_options(client)
+                flight_info = client.get_flight_info(flight_desc, options)
+            except flight.FlightUnauthenticatedError:
+                logger.info("Arrow Flight Token已失效，重新认证")
+                options = self._call_options(client, renew=True)
+                flight_info = client.get_flight_info(flight_desc, options)
+            
+            return flight_info, options
+        
+        def _read_endpoint(self, client, endpoint, options, on_open=None):
+            """读取单个endpoint的结果流；endpoint指向其他节点时临时连接该节点
+            
+            on_open在数据流打开后以reader为参数调用，供并行读取时从其他线程取消读取。
+            """
+            endpoint_client = None
+            locations = [location for location in endpoint.locations if location.uri != self.location.uri]
+            if locations:
+                endpoint_client = flight.FlightClient(locations[0])
+            
+            reader = (endpoint_client or client).do_get(endpoint.ticket, options)
+            if on_open is not None:
+                on_open(reader)
+            finished = False
+            try:
+                while True:
+                    try:
+                        chunk = reader.read_chunk()
+                    except StopIteration:
+                        break
+                    if chunk.data is not None:
+                        yield chunk.data
+                finished = True
+            finally:
+                if not finished:
+                    # 客户端断开或提前停止读取时取消服务端的数据流，Dremio随之取消查询
+                    logger.info("Arrow Flight数据流未读完即停止，已取消")
+                    reader.cancel()
+                if endpoint_client is not None:
+                    endpoint_client.close()
+        
+        def _iter_endpoints_sequential(self, client, endpoints, options):
+            """依次读取所有endpoint"""
+            for endpoint in endpoints:
+                yield from self._read_endpoint(client, endpoint, options)
+        
+        def _iter_endpoints_parallel(self, client, endpoints, options):
+            """并行读取多个endpoint，通过有界队列按到达顺序合并批次，内存占用不超过队列长度"""
+            merged = queue.Queue(maxsize=FLIGHT_MERGE_QUEUE_SIZE)
+            stop = threading.Event()
+            finished = object()
+            readers = []  # 已打开的endpoint数据流，停止时逐个取消，使阻塞在读取中的线程退出
+            readers_lock = threading.Lock()
+            
+            def track(reader):
+                with readers_lock:
+                    if not stop.is_set():
+                        readers.append(reader)
+                        return
+                reader.cancel()
+            
+            def put(item):
+                while not stop.is_set():
+                    try:
+                        merged.put(item, timeout=0.1)
+                        return True
+                    except queue.Full:
+                        continue
+                return False
             
+            def read(endpoint):
+                try:
+                    for batch in self._read_endpoint(client, endpoint, options, on_open=track):
+                        if not put(batch):
+                            return
+                    put(finished)
+                except Exception as e:
+                    put(e)
+            
+            executor = ThreadPoolExecutor(
+                max_workers=min(len(endpoints), FLIGHT_MAX_PARALLEL_ENDPOINTS),
+                thread_name_prefix='flight-endpoint'
+            )
             try:
-                # 创建Flight描述符
-                flight_desc = flight.FlightDescriptor.for_command(sql.encode('utf-8'))
+                for endpoint in endpoints:
+                    executor.submit(read, endpoint)
                 
-                # 获取Flight信息
-                flight_info = self.client.get_flight_info(flight_desc)
+                remaining = len(endpoints)
+                while remaining:
+                    item = merged.get()
+                    if item is finished:
+                        remaining -= 1
+                    elif isinstance(item, Exception):
+                        raise item
+                    else:
+                        yield item
+            finally:
+                stop.set()
+                with readers_lock:
+                    active_readers = list(readers)
+                for reader in active_readers:
+                    try:
+                        reader.cancel()
+                    except Exception:
+                        pass
+                # 等待读取线程全部退出后再返回，调用方随后才会把连接归还连接池
+                executor.shutdown(wait=True, cancel_futures=True)
+        
+        def _record_failure(self, error):
+            """记录连接失败，并关闭所有空闲连接（服务不可达时它们同样无法使用）"""
+            self.last_failure_at = time.time()
+            self.last_error = str(error)
+            
+            with self.condition:
+                idle_clients = [client for client, _ in self.idle_clients]
+                self.idle_clients = []
+                self.created -= len(idle_clients)
+                self.counters['discarded'] += len(idle_clients)
+                self.condition.notify_all()
+            
+            for client in idle_clients:
+                try:
+                    client.close()
+                except Exception:
+                    pass
+        
+        def iter_record_batches(self, sql, parallel=False):
+            """执行查询并逐批返回RecordBatch，不在内存中合并整个结果集
+            
+            查询在取第一个批次时提交，读取期间占用一个池中连接，读完或生成器关闭后归还。
+            Dremio返回多个endpoint时全部读取，parallel为True时并行读取并按到达顺序合并
+            （不保证endpoint之间的行顺序）。结果为空时仍返回一个带schema的空批次，便于下游输出表头。
+            """
+            client, reused = self._acquire()
+            broken = False
+            try:
+                try:
+                    flight_info, options = self._get_flight_info(client, sql)
+                except flight.FlightUnavailableError as e:
+                    if not reused:
+                        raise
+                    # 复用的空闲连接可能已被断开：换一个新连接（占用同一个池名额）重试一次
+                    logger.info(f"Arrow Flight复用的连接不可用，使用新连接重试: {e}")
+                    try:
+                        client.close()
+                    except Exception:
+                        pass
+                    self.counters['discarded'] += 1
+                    self.counters['retries'] += 1
+                    client = self._create_client()
+                    flight_info, options = self._get_flight_info(client, sql)
+                endpoints = flight_info.endpoints
                 
-                # 读取数据
-                reader = self.client.do_get(flight_info.endpoints[0].ticket)
+                if parallel and len(endpoints) > 1:
+                    batches = self._iter_endpoints_parallel(client, endpoints, options)
+                else:
+                    batches = self._iter_endpoints_sequential(client, endpoints, options)
                 
-                # 转换为DataFrame
-                table = reader.read_all()
-                df = table.to_pandas()
+                batch_count = 0
+                row_count = 0
+                for batch in batches:
+                    batch_count += 1
+                    row_count += batch.num_rows
+                    yield batch
                 
-                logger.info(f"Arrow Flight查询成功，返回 {len(df)} 行数据")
-                return df
+                if batch_count == 0:
+                    yield pa.RecordBatch.from_pylist([], schema=flight_info.schema)
                 
+                self.last_failure_at = 0
+                logger.info(f"Arrow Flight流式读取完成，{len(endpoints)} 个endpoint，共 {batch_count} 个批次，{row_count} 行数据")
+            
             except Exception as e:
-                logger.error(f"Arrow Flight查询失败: {e}")
-                raise e
+                # 出错的连接直接丢弃（重新建立的代价很小），连接类错误同时触发重试间隔
+                broken = True
+                if isinstance(e, self.CONNECTION_ERRORS):
+                    self._record_failure(e)
+                logger.warning(f"Arrow Flight查询出错，已丢弃该连接: {e}")
+                raise
+            
+            finally:
+                self._release(client, broken)
+        
+        def stats(self):
+            """获取连接池状态"""
+            with self.condition:
+                idle = len(self.idle_clients)
+                created = self.created
+            return {
+                'endpoint': f"{self.host}:{self.port}",
+                'pool_size': self.pool_size,
+                'connections': created,
+                'idle': idle,
+                'in_use': created - idle,
+                'token_cached': self.token is not None and time.time() < self.token_expires_at,
+                'last_error': self.last_error,
+                **self.counters
+            }
+    
+    # 初始化Flight客户端连接池（不在启动时连接，首次导出时再建立连接）
+    dremio_flight_client = DremioFlightClient(
+        port=FLIGHT_PORT,
+        pool_size=FLIGHT_POOL_SIZE,
+        token_ttl=FLIGHT_TOKEN_TTL,
+        retry_interval=FLIGHT_RETRY_INTERVAL,
+        idle_timeout=FLIGHT_IDLE_TIMEOUT
+    )
+    
+except ImportError:
+    logger.warning("PyArrow未安装，将仅使用REST API进行数据查询")
+    dremio_flight_client = None
+
+# 性能监控装饰器
+def monitor_performance(func):
+    """性能监控装饰器"""
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        start_time = time.time()
+        try:
+            result = func(*args, **kwargs)
+            execution_time = time.time() - start_time
+            logger.info(f"{func.__name__} 执行时间: {execution_time:.2f}秒")
+            return result
+        except Exception as e:
+            execution_time = time.time() - start_time
+            logger.error(f"{func.__name__} 执行失败 ({execution_time:.2f}秒): {e}")
+            raise
+    return wrapper
+
+def _execute_admitted_query(sql, timeout, priority):
+    """获得准入名额后执行SQL查询"""
+    with query_admission.admit(priority):
+        return dremio_client.execute_sql_query(sql, timeout)
+
+def run_sql_query(sql, timeout=None, use_cache=True, cache_ttl=None, priority='interactive'):
+    """执行SQL查询（带结果缓存与准入控制），返回 (result, cached)
+    
+    排队已满或超时时抛出AdmissionRejected。
+    """
+    use_cache = use_cache and QUERY_CACHE_ENABLED
+    
+    if use_cache:
+        cached_result = query_result_cache.get(sql)
+        if cached_result is not None:
+            logger.info("SQL查询结果缓存命中")
+            return cached_result, True
+    
+    # 相同SQL的并发请求只在Dremio上执行一次
+    key = ('rest', QueryResultCache.normalize_sql(sql))
+    result, shared = query_single_flight.do(key, _execute_admitted_query, sql, timeout, priority)
+    
+    if shared:
+        logger.info("复用并发执行中的相同SQL查询结果")
+    elif use_cache and result.get('success'):
+        query_result_cache.set(sql, result, ttl=cache_ttl)
+    
+    return result, False
+
+# Dremio REST结果列类型到Arrow类型工厂函数的映射（日期时间类在JSON中为字符串）
+REST_ARROW_TYPES = {
+    'BIGINT': 'int64',
+    'INTEGER': 'int32',
+    'SMALLINT': 'int32',
+    'TINYINT': 'int32',
+    'DOUBLE': 'float64',
+    'FLOAT': 'float32',
+    'DECIMAL': 'float64',
+    'BOOLEAN': 'bool_',
+    'VARCHAR': 'string',
+    'CHAR': 'string',
+    'DATE': 'string',
+    'TIME': 'string',
+    'TIMESTAMP': 'string'
+}
+
+def _iter_rest_record_batches(sql):
+    """通过REST API执行查询，按结果分页返回RecordBatch"""
+    submit_result = dremio_client.submit_sql_query(sql)
+    if not submit_result['success']:
+        raise Exception(f"REST API查询也失败: {submit_result['error']}")
+    
+    job_id = submit_result['job_id']
+    wait_result = dremio_client.wait_for_job(job_id)
+    if not wait_result['success']:
+        raise Exception(f"REST API查询也失败: {wait_result['error']}")
+    
+    def to_record_batch(page):
+        # Dremio返回的行会省略值为null的字段，按结果schema对齐列
+        rows = page.get('rows', [])
+        fields = page.get('schema', [])
+        if not fields:
+            return pa.RecordBatch.from_pylist(rows)
+        
+        arrays = []
+        for field in fields:
+            values = [row.get(field['name']) for row in rows]
+            # 按Dremio列类型确定Arrow类型，保证各页schema一致
+            type_name = REST_ARROW_TYPES.get(field.get('type', {}).get('name'))
+            arrow_type = getattr(pa, type_name)() if type_name else None
+            try:
+                arrays.append(pa.array(values, type=arrow_type))
+            except (pa.ArrowInvalid, pa.ArrowTypeError):
+                arrays.append(pa.array(values))
+        return pa.RecordBatch.from_arrays(arrays, names=[field['name'] for field in fields])
+    
+    def generate():
+        yielded = False
+        for page in dremio_client.iter_job_results(job_id):
+            if page.get('rows') or not yielded:
+                yielded = True
+                yield to_record_batch(page)
+        
+        if not yielded:
+            yield pa.RecordBatch.from_pylist([])
+    
+    return generate()
+
+class QueryBatchStream:
+    """导出查询的批次迭代器 - 读完、出错或关闭时关闭底层数据流并归还准入名额"""
+    
+    def __init__(self, first_batch, batches, priority):
+        self.pending = first_batch
+        self.batches = batches
+        self.priority = priority
+        self.closed = False
+    
+    def __iter__(self):
+        return self
+    
+    def __next__(self):
+        if self.pending is not None:
+            batch, self.pending = self.pending, None
+            return batch
+        if self.closed:
+            raise StopIteration
+        try:
+            return next(self.batches)
+        except BaseException:
+            self.close()
+            raise
+    
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        self.pending = None
+        try:
+            self.batches.close()
+        finally:
+            query_admission.release(self.priority)
+    
+    def __del__(self):
+        # 调用方未读完也未关闭时兜底归还名额
+        self.close()
+
+def _open_query_batches(sql, parallel_endpoints, priority):
+    """提交导出查询并取得首个批次：优先使用Arrow Flight，失败时回退到REST API分页"""
+    query_admission.acquire(priority)
+    try:
+        try:
+            batches = dremio_flight_client.iter_record_batches(sql, parallel=parallel_endpoints)
+            first_batch = next(batches)
+        except Exception as flight_error:
+            logger.warning(f"Arrow Flight查询失败，尝试使用REST API: {flight_error}")
+            batches = _iter_rest_record_batches(sql)
+            first_batch = next(batches)
+    except BaseException:
+        query_admission.release(priority)
+        raise
+    
+    return QueryBatchStream(first_batch, batches, priority)
+
+def iter_query_batches(sql, parallel_endpoints=None, priority='export'):
+    """执行导出查询并逐批返回RecordBatch：优先使用Arrow Flight，失败时回退到REST API分页
+    
+    查询在调用时即提交，首个批次之前的错误（包括准入控制拒绝）会直接抛出，调用方可以在响应开始前返回错误。
+    读取期间占用一个准入名额，返回的迭代器读完或关闭后归还。
+    相同SQL的并发导出合并为一次Dremio查询，共用同一个批次流（只占用一个准入名额）。
+    parallel_endpoints为None时使用FLIGHT_PARALLEL_ENDPOINTS配置。
+    """
+    if parallel_endpoints is None:
+        parallel_endpoints = FLIGHT_PARALLEL_ENDPOINTS
+    
+    key = ('batches', QueryResultCache.normalize_sql(sql), bool(parallel_endpoints), priority)
+    batches = shared_export_streams.open(key, lambda: _open_query_batches(sql, parallel_endpoints, priority))
+    if batches.token > 0:
+        logger.info("复用并发执行中的相同导出查询批次流")
+    return batches
+
+def iter_closing(chunks, batches, description):
+    """输出编码后的数据块；未输出完（客户端断开或出错）时关闭批次迭代器，取消Dremio上的数据流"""
+    completed = False
+    try:
+        yield from chunks
+        completed = True
+    except Exception as e:
+        # 响应头已发送，只能记录错误并中断输出
+        logger.error(f"{description}流式输出中断: {e}")
+        raise
+    finally:
+        if not completed:
+            logger.warning(f"{description}未完成即停止输出（客户端断开或读取出错），关闭查询数据流")
+        batches.close()
+
+def _csv_compatible(batch):
+    """CSV写入器不支持嵌套类型（list/struct/map），将这类列转换为JSON字符串"""
+    if not any(pa.types.is_nested(field.type) for field in batch.schema):
+        return batch
+    columns = []
+    for column in batch.columns:
+        if pa.types.is_nested(column.type):
+            column = pa.array(
+                [json.dumps(value, ensure_ascii=False, default=str) if value is not None else None for value in column.to_pylist()],
+                pa.string()
+            )
+        columns.append(column)
+    return pa.RecordBatch.from_arrays(columns, names=batch.schema.names)
+
+def iter_csv_chunks(batches):
+    """使用pyarrow.csv.CSVWriter将RecordBatch逐批编码为CSV（UTF-8字节），表头只输出一次
+    
+    按首个批次的schema统一各批次的列类型与格式（如含null的整数列在各批次中都写成整数）。
+    """
+    from pyarrow import csv as pa_csv
+    
+    sink = _ChunkSink()
+    writer = None
+    
+    for batch in batches:
+        batch = _csv_compatible(batch)
+        if writer is None:
+            schema = batch.schema
+            writer = pa_csv.CSVWriter(pa.PythonFile(sink, mode='w'), schema)
+        
+        if batch.num_rows:
+            writer.write_table(_conform_to_schema(batch, schema))
+        data = sink.drain()
+        if data:
+            yield data
+    
+    if writer is not None:
+        writer.close()
+    
+    data = sink.drain()
+    if data:
+        yield data
+
+def _xlsx_column_values(column):
+    """将Arrow列转换为openpyxl可写入的Python值列表"""
+    values = column.to_pylist()
+    column_type = column.type
+    
+    if pa.types.is_timestamp(column_type) and column_type.tz is not None:
+        # Excel不支持带时区的时间，保留该时区下的本地时间
+        return [value.replace(tzinfo=None) if value is not None else None for value in values]
+    if pa.types.is_floating(column_type):
+        # NaN写成空单元格，与pandas导出保持一致
+        return [None if value is not None and value != value else value for value in values]
+    if pa.types.is_nested(column_type):
+        return [json.dumps(value, ensure_ascii=False, default=str) if value is not None else None for value in values]
+    if pa.types.is_binary(column_type) or pa.types.is_large_binary(column_type):
+        return [value.hex() if value is not None else None for value in values]
+    return values
+
+def write_xlsx_from_batches(batches, output, sheet_name='Data', max_rows_per_sheet=None):
+    """使用openpyxl只写模式逐批写入XLSX，行数超过单个工作表上限时自动新建工作表
+    
+    Args:
+        batches: RecordBatch迭代器
+        output: 文件路径或可写的二进制文件对象
+        sheet_name: 工作表名称，后续工作表依次命名为 Data_2、Data_3 ...
+        max_rows_per_sheet: 每个工作表的数据行数上限（不含表头）
+    
+    Returns:
+        dict: 写入的行数、列名和工作表数量
+    """
+    from openpyxl import Workbook
+    
+    max_rows_per_sheet = max_rows_per_sheet or XLSX_MAX_ROWS_PER_SHEET
+    workbook = Workbook(write_only=True)
+    worksheet = None
+    columns = None
+    sheet_count = 0
+    sheet_rows = 0
+    total_rows = 0
+    
+    for batch in batches:
+        if columns is None:
+            columns = batch.schema.names
+        
+        remaining = batch.num_rows
+        rows = zip(*[_xlsx_column_values(column) for column in batch.columns])
+        
+        while remaining > 0 or worksheet is None:
+            if worksheet is None or sheet_rows >= max_rows_per_sheet:
+                sheet_count += 1
+                title = sheet_name if sheet_count == 1 else f"{sheet_name}_{sheet_count}"
+                worksheet = workbook.create_sheet(title)
+                worksheet.append(columns)
+                sheet_rows = 0
+            
+            take = min(remaining, max_rows_per_sheet - sheet_rows)
+            for row in itertools.islice(rows, take):
+                worksheet.append(row)
+            
+            sheet_rows += take
+            total_rows += take
+            remaining -= take
+    
+    if worksheet is None:
+        sheet_count = 1
+        workbook.create_sheet(sheet_name)
+    
+    workbook.save(output)
+    
+    return {
+        'rows': total_rows,
+        'columns': columns or [],
+        'sheets': sheet_count
+    }
+
+def build_xlsx_tempfile(sql, parallel_endpoints=None):
+    """执行查询并将结果逐批写入临时XLSX文件，返回 (文件对象, 写入统计)
+    
+    文件在关闭时自动删除，写入过程中内存只保留当前批次。
+    """
+    batches = iter_query_batches(sql, parallel_endpoints)
+    output = tempfile.TemporaryFile(suffix='.xlsx')
+    try:
+        stats = write_xlsx_from_batches(batches, output)
+    except Exception:
+        output.close()
+        raise
+    finally:
+        batches.close()
+    
+    output.seek(0)
+    return output, stats
+
+class _ChunkSink:
+    """收集Arrow写入器输出的字节，供流式响应逐段取出"""
+    
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+        self.closed = False
+    
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+    
+    def tell(self):
+        return self.position
+    
+    def flush(self):
+        pass
+    
+    def close(self):
+        self.closed = True
+    
+    def drain(self):
+        """取出并清空已写入的字节"""
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+def _conform_to_schema(batch, schema):
+    """将批次转换为Table，schema不一致时（如REST分页推断的类型不同）转换为首个批次的schema"""
+    table = pa.Table.from_batches([batch])
+    if not batch.schema.equals(schema, check_metadata=False):
+        table = table.cast(schema)
+    return table
+
+def iter_parquet_chunks(batches, compression=None):
+    """将RecordBatch流式写为Parquet，每写完一个行组即输出已生成的字节"""
+    import pyarrow.parquet as pq
+    
+    compression = compression or PARQUET_DEFAULT_COMPRESSION
+    sink = _ChunkSink()
+    writer = None
+    pending = []
+    pending_rows = 0
+    
+    for batch in batches:
+        if writer is None:
+            schema = batch.schema
+            writer = pq.ParquetWriter(
+                pa.PythonFile(sink, mode='w'),
+                schema,
+                compression=None if compression == 'none' else compression
+            )
+        
+        pending.append(_conform_to_schema(batch, schema))
+        pending_rows += batch.num_rows
+        
+        # 攒够一个行组再写出，避免小批次产生大量行组
+        if pending_rows >= PARQUET_ROW_GROUP_SIZE:
+            writer.write_table(pa.concat_tables(pending), row_group_size=PARQUET_ROW_GROUP_SIZE)
+            pending = []
+            pending_rows = 0
+            data = sink.drain()
+            if data:
+                yield data
+    
+    if writer is not None:
+        if pending:
+            writer.write_table(pa.concat_tables(pending), row_group_size=PARQUET_ROW_GROUP_SIZE)
+        writer.close()
+    
+    data = sink.drain()
+    if data:
+        yield data
+
+def iter_arrow_stream_chunks(batches):
+    """将RecordBatch流式写为Arrow IPC流格式，每个批次写入后立即输出"""
+    sink = _ChunkSink()
+    writer = None
+    
+    for batch in batches:
+        if writer is None:
+            schema = batch.schema
+            writer = pa.ipc.new_stream(pa.PythonFile(sink, mode='w'), schema)
+        
+        writer.write_table(_conform_to_schema(batch, schema))
+        data = sink.drain()
+        if data:
+            yield data
+    
+    if writer is not None:
+        writer.close()
+    
+    data = sink.drain()
+    if data:
+        yield data
+
+def iter_export_chunks(batches, file_format, options=None):
+    """按导出格式将RecordBatch逐段编码（csv、parquet、arrow）"""
+    options = options or {}
+    if file_format == 'csv':
+        return iter_csv_chunks(batches)
+    if file_format == 'parquet':
+        return iter_parquet_chunks(batches, options.get('compression'))
+    if file_format == 'arrow':
+        return iter_arrow_stream_chunks(batches)
+    raise ValueError(f"不支持流式输出的文件格式: {file_format}")
+
+class ExportRequestError(Exception):
+    """导出请求参数无效（存储桶不存在、分区列不在结果中等），返回400；其他导出失败返回500"""
+    pass
+
+def get_minio_client():
+    """获取MinIO客户端（连接配置与minio_api_server.py一致）"""
+    if Minio is None:
+        raise RuntimeError("minio未安装，无法导出到MinIO")
+    return Minio(
+        MINIO_ENDPOINT,
+        access_key=MINIO_ACCESS_KEY,
+        secret_key=MINIO_SECRET_KEY,
+        secure=MINIO_SECURE
+    )
+
+class _ChunkReader:
+    """将字节块生成器包装为可read()的文件对象，MinIO分片上传按需拉取时才继续读取查询结果"""
+    
+    def __init__(self, chunks):
+        self.chunks = iter(chunks)
+        self.buffer = bytearray()
+        self.bytes_read = 0
+    
+    def read(self, size=-1):
+        while size is None or size < 0 or len(self.buffer) < size:
+            chunk = next(self.chunks, None)
+            if chunk is None:
+                break
+            self.buffer += chunk
+        
+        if size is None or size < 0:
+            size = len(self.buffer)
+        data = bytes(self.buffer[:size])
+        del self.buffer[:size]
+        self.bytes_read += len(data)
+        return data
+
+def _count_batches(batches, stats):
+    """透传RecordBatch并累计行数，记录首个批次的列名"""
+    for batch in batches:
+        if 'columns' not in stats:
+            stats['columns'] = batch.schema.names
+        stats['rows'] += batch.num_rows
+        yield batch
+
+def _write_partitioned_dataset(batches, directory, partition_by, compression):
+    """将RecordBatch按Hive风格目录（col=value/）写为本地分区Parquet数据集，返回写出的文件列表"""
+    import pyarrow.dataset as ds
     
-    # 初始化Flight客户端
-    dremio_flight_client = DremioFlightClient()
+    first_batch = next(batches)
+    schema = first_batch.schema
+    missing = [column for column in partition_by if column not in schema.names]
+    if missing:
+        raise ExportRequestError(f"分区列不在查询结果中: {', '.join(missing)}")
     
-except ImportError:
-    logger.warning("PyArrow未安装，将仅使用REST API进行数据查询")
-    dremio_flight_client = None
+    def conformed_batches():
+        for batch in itertools.chain([first_batch], batches):
+            yield from _conform_to_schema(batch, schema).to_batches()
+    
+    compression = compression or PARQUET_DEFAULT_COMPRESSION
+    file_format = ds.ParquetFileFormat()
+    ds.write_dataset(
+        conformed_batches(),
+        directory,
+        schema=schema,
+        format=file_format,
+        file_options=file_format.make_write_options(compression=None if compression == 'none' else compression),
+        partitioning=partition_by,
+        partitioning_flavor='hive',
+        basename_template='part-{i}.parquet',
+        max_partitions=MINIO_EXPORT_MAX_PARTITIONS,
+        max_rows_per_group=PARQUET_ROW_GROUP_SIZE,
+        existing_data_behavior='overwrite_or_ignore'
+    )
+    
+    files = []
+    for root, _, names in os.walk(directory):
+        for name in sorted(names):
+            local_path = os.path.join(root, name)
+            files.append((local_path, os.path.relpath(local_path, directory).replace(os.sep, '/')))
+    return files
 
-# 性能监控装饰器
-def monitor_performance(func):
-    """性能监控装饰器"""
-    @wraps(func)
-    def wrapper(*args, **kwargs):
-        start_time = time.time()
+def _read_export_manifest(client, bucket, manifest_name):
+    """读取分区导出目录下已提交的清单，不存在或无法读取时返回None"""
+    response = None
+    try:
+        response = client.get_object(bucket, manifest_name)
+        return json.loads(response.read().decode('utf-8'))
+    except Exception as e:
+        if getattr(e, 'code', None) != 'NoSuchKey':
+            logger.warning(f"读取导出清单失败: {bucket}/{manifest_name}, {e}")
+        return None
+    finally:
+        if response is not None:
+            response.close()
+            response.release_conn()
+
+def _remove_export_run(client, bucket, manifest):
+    """删除清单中记录的一次分区导出的全部对象（新的导出提交后清理上一次的导出）"""
+    for item in manifest.get('objects', []):
         try:
-            result = func(*args, **kwargs)
-            execution_time = time.time() - start_time
-            logger.info(f"{func.__name__} 执行时间: {execution_time:.2f}秒")
-            return result
+            client.remove_object(bucket, item['object_path'])
         except Exception as e:
-            execution_time = time.time() - start_time
-            logger.error(f"{func.__name__} 执行失败 ({execution_time:.2f}秒): {e}")
-            raise
-    return wrapper
+            logger.warning(f"清理上一次导出的分区文件失败: {item['object_path']}, {e}")
+
+def export_query_to_minio(sql, bucket, object_path, partition_by=None, compression=None, parallel_endpoints=None):
+    """执行查询并将结果以Parquet写入MinIO，返回 {bucket, objects, rows, columns, bytes}
+    
+    不分区时写为单个对象：Parquet字节边生成边通过分片上传写入（put_object length=-1），结果不在内存中整体缓存。
+    指定partition_by时object_path作为目录前缀：结果先按分区写入本地临时目录，再逐个上传到本次导出独有的
+    {object_path}/run-{run_id}/ 下，全部上传后写入 {object_path}/_manifest.json 作为提交（读取方应以清单为准），
+    随后删除上一次清单记录的对象；上传失败时删除本次已上传的对象，原有数据与清单不受影响。
+    返回值中额外包含 manifest 与 run_prefix。
+    """
+    client = get_minio_client()
+    if not client.bucket_exists(bucket):
+        raise ExportRequestError(f"存储桶不存在: {bucket}")
+    
+    part_size = MINIO_EXPORT_PART_SIZE_MB * 1024 * 1024
+    stats = {'rows': 0}
+    objects = []
+    batches = iter_query_batches(sql, parallel_endpoints)
+    try:
+        counted = _count_batches(batches, stats)
+        
+        if not partition_by:
+            # put_object在读取数据或上传分片出错时会中止本次分片上传
+            reader = _ChunkReader(iter_parquet_chunks(counted, compression))
+            result = client.put_object(
+                bucket, object_path, reader, length=-1, part_size=part_size,
+                content_type=DOWNLOAD_FORMAT_MIMETYPES['parquet']
+            )
+            objects.append({'object_path': object_path, 'size': reader.bytes_read, 'etag': result.etag})
+        else:
+            prefix = object_path.strip('/')
+            manifest_name = f"{prefix}/_manifest.json"
+            run_id = f"{datetime.now():%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:8]}"
+            run_prefix = f"{prefix}/run-{run_id}"
+            temp_dir = tempfile.mkdtemp(prefix='minio-export-')
+            try:
+                files = _write_partitioned_dataset(counted, temp_dir, partition_by, compression)
+                batches.close()  # 结果已全部落到本地，提前归还准入名额
+                for local_path, relative_path in files:
+                    object_name = f"{run_prefix}/{relative_path}"
+                    result = client.fput_object(
+                        bucket, object_name, local_path, part_size=part_size,
+                        content_type=DOWNLOAD_FORMAT_MIMETYPES['parquet']
+                    )
+                    objects.append({'object_path': object_name, 'size': os.path.getsize(local_path), 'etag': result.etag})
+                
+                # 所有分区文件上传后再写清单，清单替换即视为本次导出提交
+                previous_manifest = _read_export_manifest(client, bucket, manifest_name)
+                manifest = json.dumps({
+                    'run_id': run_id,
+                    'run_prefix': run_prefix,
+                    'created_at': datetime.now().isoformat(),
+                    'partition_by': partition_by,
+                    'rows': stats['rows'],
+                    'columns': stats.get('columns', []),
+                    'objects': objects
+                }, ensure_ascii=False, indent=2).encode('utf-8')
+                client.put_object(
+                    bucket, manifest_name, io.BytesIO(manifest), length=len(manifest), content_type='application/json'
+                )
+            except Exception:
+                for uploaded in objects:
+                    try:
+                        client.remove_object(bucket, uploaded['object_path'])
+                    except Exception as e:
+                        logger.warning(f"清理已上传的分区文件失败: {uploaded['object_path']}, {e}")
+                raise
+            finally:
+                shutil.rmtree(temp_dir, ignore_errors=True)
+            
+            if previous_manifest and previous_manifest.get('run_prefix') != run_prefix:
+                _remove_export_run(client, bucket, previous_manifest)
+    finally:
+        batches.close()
+    
+    result = {
+        'bucket': bucket,
+        'objects': objects,
+        'rows': stats['rows'],
+        'columns': stats.get('columns', []),
+        'bytes': sum(item['size'] for item in objects)
+    }
+    if partition_by:
+        result.update({'manifest': manifest_name, 'run_prefix': run_prefix})
+    return result
+
+def invalidate_dataset_caches(dataset_path):
+    """数据集元数据或反射刷新后，使引用该数据集的缓存失效"""
+    schema_cache.invalidate_table_details(dataset_path)
+    dremio_client.table_columns_cache.pop(dataset_path, None)
+    return query_result_cache.invalidate_dataset(dataset_path)
+
+def admission_rejected_response(error):
+    """准入控制拒绝时的响应：队列已满返回429，排队超时返回503，均带Retry-After"""
+    logger.warning(f"查询未获准执行: {error}")
+    response = jsonify({
+        'success': False,
+        'error': str(error),
+        'priority': error.priority,
+        'reason': error.reason,
+        'timestamp': datetime.now().isoformat()
+    })
+    response.status_code = 429 if error.reason == 'queue_full' else 503
+    response.headers['Retry-After'] = str(error.retry_after)
+    return response
+
+def shape_query_rows(rows, schema, response_format):
+    """按响应格式重排查询结果，返回 (columns, data)
+    
+    objects原样返回逐行字典；columnar返回与columns对应的列数组；rows返回不带列名的行数组。
+    Dremio省略值为null的字段，列顺序以结果schema为准，缺失时按字段首次出现的顺序。
+    """
+    columns = [field['name'] for field in schema or [] if field.get('name')]
+    if not columns:
+        seen = {}
+        for row in rows:
+            for name in row:
+                seen.setdefault(name, None)
+        columns = list(seen)
+    
+    if response_format == 'columnar':
+        return columns, [[row.get(name) for row in rows] for name in columns]
+    if response_format == 'rows':
+        return columns, [[row.get(name) for name in columns] for row in rows]
+    return columns, rows
+
+def dumps_json(payload):
+    """序列化为UTF-8 JSON字节串：已安装orjson时使用orjson，否则回退到标准库json"""
+    if orjson is not None:
+        return orjson.dumps(payload, default=str, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(payload, ensure_ascii=False, default=str, separators=(',', ':')).encode('utf-8')
+
+def json_response(payload, status=200):
+    """返回JSON响应，按Accept-Encoding协商br/gzip压缩（小于RESPONSE_COMPRESSION_MIN_BYTES的响应不压缩）"""
+    body = dumps_json(payload)
+    response = Response(body, status=status, mimetype='application/json')
+    response.vary.add('Accept-Encoding')
+    
+    if len(body) < RESPONSE_COMPRESSION_MIN_BYTES:
+        return response
+    
+    encodings = ['br', 'gzip'] if brotli is not None else ['gzip']
+    encoding = request.accept_encodings.best_match(encodings)
+    if encoding == 'br':
+        response.set_data(brotli.compress(body, quality=RESPONSE_BROTLI_QUALITY))
+    elif encoding == 'gzip':
+        response.set_data(gzip.compress(body, compresslevel=RESPONSE_GZIP_LEVEL))
+    else:
+        return response
+    
+    response.headers['Content-Encoding'] = encoding
+    return response
+
+def reflection_wait_status_code(wait_result):
+    """反射等待结果对应的HTTP状态码：已就绪200，等待超时（仍在构建）202，构建失败500"""
+    if wait_result['ready']:
+        return 200
+    return 202 if wait_result.get('timed_out') else 500
+
+def queued_refresh_response(tickets):
+    """刷新请求排队后的响应（202），附带每个ticket的状态查询地址"""
+    return jsonify({
+        'success': True,
+        'message': f'已加入刷新队列，{DATASET_REFRESH_DEBOUNCE_SECONDS:g}秒内对同一数据集的请求将合并执行',
+        'data': {
+            'tickets': [
+                dict(ticket, status_url=f"/api/dataset/refresh-queue/{ticket['ticket_id']}") for ticket in tickets
+            ]
+        },
+        'timestamp': datetime.now().isoformat()
+    }), 202
 
 # Flask路由
 
@@ -1665,6 +5254,42 @@ def get_schema_info():
             'timestamp': datetime.now().isoformat()
         }), 500
 
+@app.route('/api/schema/search', methods=['GET'])
+def search_schema():
+    """在Schema缓存中搜索catalog/schema/表/列名 - 例如查找包含某列的表"""
+    try:
+        query = request.args.get('q', '').strip()
+        limit = request.args.get('limit', 20, type=int)
+        kind = request.args.get('kind')  # catalog / schema / table / column
+        
+        if not query:
+            return jsonify({
+                'success': False,
+                'error': '缺少查询参数q',
+                'timestamp': datetime.now().isoformat()
+            }), 400
+        
+        start_time = time.time()
+        results = schema_cache.search_index.search(query, limit=max(1, min(limit, 200)), kind=kind)
+        
+        return jsonify({
+            'success': True,
+            'query': query,
+            'results': results,
+            'count': len(results),
+            'ready': schema_cache.is_ready(),
+            'took_ms': round((time.time() - start_time) * 1000, 2),
+            'timestamp': datetime.now().isoformat()
+        })
+    
+    except Exception as e:
+        logger.error(f"Schema搜索异常: {e}")
+        return jsonify({
+            'success': False,
+            'error': f'服务器内部错误: {str(e)}',
+            'timestamp': datetime.now().isoformat()
+        }), 500
+
 @app.route('/api/query', methods=['POST'])
 @monitor_performance
 def execute_sql_query():
@@ -1684,6 +5309,9 @@ def execute_sql_query():
         
         sql = data['sql'].strip()
         timeout = data.get('timeout', None)  # 默认无超时限制
+        use_cache = data.get('use_cache', True)
+        cache_ttl = data.get('cache_ttl')  # 秒，默认使用QUERY_CACHE_TTL
+        response_format = str(data.get('format', 'objects')).lower()  # objects / columnar / rows
         
         logger.info(f"=== 接收到的SQL查询详情 ===")
         logger.info(f"原始SQL: {repr(sql)}")
@@ -1699,30 +5327,431 @@ def execute_sql_query():
                 'timestamp': datetime.now().isoformat()
             }), 400
         
+        if response_format not in QUERY_RESPONSE_FORMATS:
+            return jsonify({
+                'success': False,
+                'error': f"不支持的响应格式: {response_format}，可选: {', '.join(QUERY_RESPONSE_FORMATS)}",
+                'timestamp': datetime.now().isoformat()
+            }), 400
+        
         logger.info(f"开始执行SQL查询: {sql}")
         
         # 执行查询
-        result = dremio_client.execute_sql_query(sql, timeout)
-        logger.info(f"SQL查询执行完成，结果: {result}")
+        result, cached = run_sql_query(sql, timeout, use_cache, cache_ttl)
+        logger.info(f"SQL查询执行完成，共 {result.get('row_count', 0)} 行，缓存命中: {cached}")
         
         if result.get('success'):
-            return jsonify({
+            schema = result.get('schema', [])
+            if response_format == 'objects':
+                columns, rows = result.get('columns', []), result.get('data', [])
+            else:
+                columns, rows = shape_query_rows(result.get('data', []), schema, response_format)
+            
+            payload = {
                 'success': True,
-                'data': result.get('data', []),
-                'columns': result.get('columns', []),
+                'format': response_format,
+                'data': rows,
+                'columns': columns,
                 'row_count': result.get('row_count', 0),
                 'execution_time': result.get('execution_time', 0),
+                'poll_stats': result.get('poll_stats'),
+                'cached': cached,
                 'timestamp': datetime.now().isoformat()
-            })
+            }
+            if response_format != 'objects':
+                payload['schema'] = schema
+            return json_response(payload)
         else:
             return jsonify({
                 'success': False,
                 'error': result.get('error', 'SQL查询执行失败'),
+                'job_id': result.get('job_id'),
+                'canceled': result.get('canceled', False),
+                'timestamp': datetime.now().isoformat()
+            }), 500
+    
+    except AdmissionRejected as e:
+        return admission_rejected_response(e)
+    except Exception as e:
+        logger.error(f"SQL查询异常: {e}")
+        return jsonify({
+            'success': False,
+            'error': f'服务器内部错误: {str(e)}',
+            'timestamp': datetime.now().isoformat()
+        }), 500
+
+def run_batch_statement(index, statement, response_format):
+    """执行批量查询中的一条语句，返回该语句的结果、耗时与错误信息"""
+    start_time = time.time()
+    item = {'index': index, 'id': statement.get('id', index)}
+    try:
+        result, cached = run_sql_query(
+            statement['sql'],
+            statement.get('timeout'),
+            statement.get('use_cache', True),
+            statement.get('cache_ttl')
+        )
+    except AdmissionRejected as e:
+        result, cached = {'success': False, 'error': str(e), 'admission': e.reason}, False
+    except Exception as e:
+        result, cached = {'success': False, 'error': f'查询执行失败: {str(e)}'}, False
+    
+    item['elapsed_ms'] = round((time.time() - start_time) * 1000, 1)
+    if not result.get('success'):
+        item.update({
+            'success': False,
+            'error': result.get('error', 'SQL查询执行失败'),
+            'job_id': result.get('job_id'),
+            'canceled': result.get('canceled', False)
+        })
+        if result.get('admission'):
+            item['admission'] = result['admission']
+        return item
+    
+    if response_format == 'objects':
+        columns, rows = result.get('columns', []), result.get('data', [])
+    else:
+        columns, rows = shape_query_rows(result.get('data', []), result.get('schema', []), response_format)
+    item.update({
+        'success': True,
+        'data': rows,
+        'columns': columns,
+        'row_count': result.get('row_count', 0),
+        'execution_time': result.get('execution_time', 0),
+        'cached': cached
+    })
+    return item
+
+@app.route('/api/query/batch', methods=['POST'])
+@monitor_performance
+def execute_sql_query_batch():
+    """批量SQL查询 - 并发执行多条互不依赖的SQL，一次返回全部结果及每条语句的耗时与错误"""
+    try:
+        data = request.get_json(silent=True)
+        statements = data.get('statements') if isinstance(data, dict) else None
+        
+        if not isinstance(statements, list) or not statements:
+            return jsonify({
+                'success': False,
+                'error': '请求体中缺少statements字段（SQL语句列表）',
+                'timestamp': datetime.now().isoformat()
+            }), 400
+        
+        if len(statements) > QUERY_BATCH_MAX_STATEMENTS:
+            return jsonify({
+                'success': False,
+                'error': f'单次最多执行 {QUERY_BATCH_MAX_STATEMENTS} 条SQL，当前: {len(statements)}',
+                'timestamp': datetime.now().isoformat()
+            }), 400
+        
+        # 每条语句可以是SQL字符串，也可以是 {id, sql, timeout, use_cache, cache_ttl}，未指定的参数使用请求级默认值
+        defaults = {key: data[key] for key in ('timeout', 'use_cache', 'cache_ttl') if key in data}
+        normalized = []
+        for index, statement in enumerate(statements):
+            if isinstance(statement, str):
+                statement = {'sql': statement}
+            if not isinstance(statement, dict) or not statement.get('sql'):
+                return jsonify({
+                    'success': False,
+                    'error': f'第 {index + 1} 条语句缺少sql',
+                    'timestamp': datetime.now().isoformat()
+                }), 400
+            if not isinstance(statement['sql'], str) or not statement['sql'].strip():
+                return jsonify({
+                    'success': False,
+                    'error': f'第 {index + 1} 条语句的sql必须是非空字符串',
+                    'timestamp': datetime.now().isoformat()
+                }), 400
+            statement = dict(defaults, **statement)
+            statement['sql'] = statement['sql'].strip()
+            normalized.append(statement)
+        
+        response_format = str(data.get('format', 'objects')).lower()
+        if response_format not in QUERY_RESPONSE_FORMATS:
+            return jsonify({
+                'success': False,
+                'error': f"不支持的响应格式: {response_format}，可选: {', '.join(QUERY_RESPONSE_FORMATS)}",
+                'timestamp': datetime.now().isoformat()
+            }), 400
+        
+        max_workers = min(len(normalized), QUERY_BATCH_CONCURRENCY)
+        logger.info(f"批量SQL查询: {len(normalized)} 条语句，并发数 {max_workers}")
+        start_time = time.time()
+        
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='query-batch') as executor:
+            results = list(executor.map(
+                lambda args: run_batch_statement(*args, response_format),
+                enumerate(normalized)
+            ))
+        
+        succeeded = sum(1 for item in results if item['success'])
+        elapsed_ms = round((time.time() - start_time) * 1000, 1)
+        logger.info(f"批量SQL查询完成: {succeeded}/{len(results)} 条成功，耗时 {elapsed_ms}毫秒")
+        
+        return json_response({
+            'success': succeeded == len(results),
+            'format': response_format,
+            'results': results,
+            'succeeded': succeeded,
+            'failed': len(results) - succeeded,
+            'elapsed_ms': elapsed_ms,
+            'statements_elapsed_ms': round(sum(item['elapsed_ms'] for item in results), 1),
+            'timestamp': datetime.now().isoformat()
+        }, 200 if succeeded else 500)
+    
+    except Exception as e:
+        logger.error(f"批量SQL查询异常: {e}")
+        return jsonify({
+            'success': False,
+            'error': f'服务器内部错误: {str(e)}',
+            'timestamp': datetime.now().isoformat()
+        }), 500
+
+@app.route('/api/query/stream', methods=['POST'])
+@monitor_performance
+def stream_sql_query():
+    """流式SQL查询 - 分页读取Dremio结果并以NDJSON逐行返回"""
+    try:
+        data = request.get_json()
+        
+        if not data or not (data.get('sql') or '').strip():
+            return jsonify({
+                'success': False,
+                'error': '请求体中缺少sql字段',
+                'timestamp': datetime.now().isoformat()
+            }), 400
+        
+        sql = data['sql'].strip()
+        timeout = data.get('timeout', None)
+        page_size = data.get('page_size', DREMIO_RESULTS_PAGE_SIZE)
+        
+        logger.info(f"流式SQL查询: {sql}")
+        
+        # 结果分页读取不再占用Dremio执行资源，名额只覆盖提交和等待阶段
+        with query_admission.admit('interactive'):
+            submit_result = dremio_client.submit_sql_query(sql, timeout)
+            if not submit_result['success']:
+                return jsonify({
+                    'success': False,
+                    'error': submit_result.get('error', 'SQL查询提交失败'),
+                    'timestamp': datetime.now().isoformat()
+                }), 500
+            
+            job_id = submit_result['job_id']
+            wait_result = dremio_client.wait_for_job(job_id, timeout)
+        if not wait_result['success']:
+            return jsonify({
+                'success': False,
+                'job_id': job_id,
+                'error': wait_result.get('error', 'SQL查询执行失败'),
+                'timestamp': datetime.now().isoformat()
+            }), 500
+        
+        row_count = wait_result['job_info'].get('rowCount')
+        
+        def generate_ndjson():
+            streamed = 0
+            try:
+                for page in dremio_client.iter_job_results(job_id, page_size):
+                    rows = page.get('rows', [])
+                    if rows:
+                        streamed += len(rows)
+                        yield ''.join(json.dumps(row, ensure_ascii=False, default=str) + '\n' for row in rows)
+                logger.info(f"流式查询完成: job_id={job_id}, 共 {streamed} 行")
+            except Exception as e:
+                # 响应头已发送，只能在流末尾追加错误行
+                logger.error(f"流式查询读取结果失败: job_id={job_id}, {e}")
+                yield json.dumps({'error': str(e)}, ensure_ascii=False) + '\n'
+        
+        return Response(
+            generate_ndjson(),
+            mimetype='application/x-ndjson',
+            headers={
+                'X-Dremio-Job-Id': job_id,
+                'X-Row-Count': str(row_count) if row_count is not None else '',
+                'Access-Control-Expose-Headers': 'X-Dremio-Job-Id, X-Row-Count',
+                'Cache-Control': 'no-cache'
+            }
+        )
+    
+    except AdmissionRejected as e:
+        return admission_rejected_response(e)
+    except Exception as e:
+        logger.error(f"流式SQL查询异常: {e}")
+        return jsonify({
+            'success': False,
+            'error': f'服务器内部错误: {str(e)}',
+            'timestamp': datetime.now().isoformat()
+        }), 500
+
+@app.route('/api/query/submit', methods=['POST'])
+@monitor_performance
+def submit_sql_query():
+    """异步提交SQL查询 - 立即返回Dremio作业ID"""
+    try:
+        data = request.get_json()
+        
+        if not data or not (data.get('sql') or '').strip():
+            return jsonify({
+                'success': False,
+                'error': '请求体中缺少sql字段',
+                'timestamp': datetime.now().isoformat()
+            }), 400
+        
+        sql = data['sql'].strip()
+        logger.info(f"异步提交SQL查询: {sql}")
+        
+        # 提交本身也占用一个交互式名额，队列已满时与同步查询一样返回429/503
+        with query_admission.admit('interactive'):
+            result = dremio_client.submit_sql_query(sql)
+        
+        if not result['success']:
+            return jsonify({
+                'success': False,
+                'error': result.get('error', 'SQL查询提交失败'),
+                'timestamp': datetime.now().isoformat()
+            }), 500
+        
+        job_id = result['job_id']
+        return jsonify({
+            'success': True,
+            'job_id': job_id,
+            'status_url': f'/api/query/{job_id}/status',
+            'results_url': f'/api/query/{job_id}/results',
+            'cancel_url': f'/api/query/{job_id}/cancel',
+            'timestamp': datetime.now().isoformat()
+        }), 202
+    
+    except AdmissionRejected as e:
+        return admission_rejected_response(e)
+    except Exception as e:
+        logger.error(f"异步提交SQL查询异常: {e}")
+        return jsonify({
+            'success': False,
+            'error': f'服务器内部错误: {str(e)}',
+            'timestamp': datetime.now().isoformat()
+        }), 500
+
+@app.route('/api/query/<job_id>/status', methods=['GET'])
+def get_query_status(job_id: str):
+    """查询异步作业状态"""
+    try:
+        result = dremio_client.get_job_status(job_id)
+        
+        if not result['success']:
+            status_code = 404 if result.get('not_found') else 500
+            return jsonify({
+                'success': False,
+                'job_id': job_id,
+                'error': result.get('error', '获取作业状态失败'),
+                'timestamp': datetime.now().isoformat()
+            }), status_code
+        
+        return jsonify({
+            'success': True,
+            'job_id': job_id,
+            'job_state': result['job_state'],
+            'finished': result['job_state'] in ['COMPLETED', 'FAILED', 'CANCELED'],
+            'row_count': result.get('row_count'),
+            'error': result.get('error_message'),
+            'timestamp': datetime.now().isoformat()
+        })
+    
+    except Exception as e:
+        logger.error(f"查询作业状态异常: {e}")
+        return jsonify({
+            'success': False,
+            'error': f'服务器内部错误: {str(e)}',
+            'timestamp': datetime.now().isoformat()
+        }), 500
+
+@app.route('/api/query/<job_id>/cancel', methods=['POST'])
+def cancel_query(job_id: str):
+    """取消正在执行的Dremio作业"""
+    try:
+        result = dremio_client.cancel_job(job_id)
+        
+        if not result['success']:
+            if result.get('not_found'):
+                status_code = 404
+            elif result.get('status_code') == 400:
+                # 作业已结束，无法取消
+                status_code = 409
+            else:
+                status_code = 500
+            return jsonify({
+                'success': False,
+                'job_id': job_id,
+                'error': result.get('error', '取消作业失败'),
+                'timestamp': datetime.now().isoformat()
+            }), status_code
+        
+        return jsonify({
+            'success': True,
+            'job_id': job_id,
+            'message': '已提交取消请求',
+            'timestamp': datetime.now().isoformat()
+        })
+    
+    except Exception as e:
+        logger.error(f"取消作业异常: {e}")
+        return jsonify({
+            'success': False,
+            'error': f'服务器内部错误: {str(e)}',
+            'timestamp': datetime.now().isoformat()
+        }), 500
+
+@app.route('/api/query/<job_id>/results', methods=['GET'])
+def get_query_results(job_id: str):
+    """分页获取异步作业结果 - 支持offset/limit参数"""
+    try:
+        offset = request.args.get('offset', 0, type=int)
+        limit = request.args.get('limit', DREMIO_RESULTS_PAGE_SIZE, type=int)
+        
+        if offset < 0 or limit <= 0:
+            return jsonify({
+                'success': False,
+                'error': 'offset不能为负数，limit必须大于0',
+                'timestamp': datetime.now().isoformat()
+            }), 400
+        
+        status = dremio_client.get_job_status(job_id)
+        if not status['success']:
+            status_code = 404 if status.get('not_found') else 500
+            return jsonify({
+                'success': False,
+                'job_id': job_id,
+                'error': status.get('error', '获取作业状态失败'),
+                'timestamp': datetime.now().isoformat()
+            }), status_code
+        
+        if status['job_state'] != 'COMPLETED':
+            # 作业尚未完成或已失败，结果不可用
+            return jsonify({
+                'success': False,
+                'job_id': job_id,
+                'job_state': status['job_state'],
+                'error': status.get('error_message') or '作业尚未完成',
+                'timestamp': datetime.now().isoformat()
+            }), 409
+        
+        result = dremio_client.get_job_results(job_id, offset, limit)
+        
+        if not result['success']:
+            return jsonify({
+                'success': False,
+                'job_id': job_id,
+                'error': result.get('error', '获取作业结果失败'),
                 'timestamp': datetime.now().isoformat()
             }), 500
-            
+        
+        return jsonify({
+            **result,
+            'timestamp': datetime.now().isoformat()
+        })
+    
     except Exception as e:
-        logger.error(f"SQL查询异常: {e}")
+        logger.error(f"获取作业结果异常: {e}")
         return jsonify({
             'success': False,
             'error': f'服务器内部错误: {str(e)}',
@@ -1788,10 +5817,13 @@ def get_table_details():
 def refresh_cache():
     """手动刷新缓存"""
     try:
-        schema_cache.refresh_all(dremio_client)
+        data = request.get_json(silent=True) or {}
+        result = schema_cache.refresh_all(dremio_client, incremental=not data.get('full', False))
         return jsonify({
             'success': True,
             'message': '缓存刷新完成',
+            'stats': result.get('stats'),
+            'errors': result.get('errors', []),
             'timestamp': datetime.now().isoformat()
         })
     except Exception as e:
@@ -1813,9 +5845,13 @@ def clear_cache():
         elif cache_type == 'table_details':
             schema_cache.clear_table_details()
             message = '表详细信息缓存已清空'
+        elif cache_type == 'query':
+            query_result_cache.clear()
+            message = '查询结果缓存已清空'
         else:
             schema_cache.clear()
             schema_cache.clear_table_details()
+            query_result_cache.clear()
             message = '所有缓存已清空'
         
         return jsonify({
@@ -1835,6 +5871,10 @@ def get_cache_stats():
     """获取缓存统计信息"""
     try:
         stats = cache_manager.get_cache_stats()
+        stats['single_flight'] = query_single_flight.stats()
+        stats['shared_exports'] = shared_export_streams.stats()
+        stats['download_links'] = download_manager.stats()
+        stats['download_spool'] = download_spool.stats()
         return jsonify({
             'success': True,
             'data': stats
@@ -1846,6 +5886,15 @@ def get_cache_stats():
             'error': str(e)
         }), 500
 
+@app.route('/api/admission/stats', methods=['GET'])
+def get_admission_stats():
+    """获取查询准入控制统计（各优先级的运行数、排队数与等待时间）"""
+    return jsonify({
+        'success': True,
+        'data': query_admission.stats(),
+        'timestamp': datetime.now().isoformat()
+    })
+
 @app.route('/api/dataset/refresh', methods=['POST'])
 @monitor_performance
 def refresh_dataset():
@@ -1872,8 +5921,9 @@ def refresh_dataset():
         
         logger.info(f"刷新数据集请求: {dataset_path}")
         
-        # 执行数据集刷新
-        result = dremio_client.refresh_dataset(dataset_path, timeout_secs)
+        # 执行数据集刷新（按维护类查询排队）
+        with query_admission.admit('maintenance'):
+            result = dremio_client.refresh_dataset(dataset_path, timeout_secs)
         
         if result.get('success'):
             return jsonify({
@@ -1888,7 +5938,9 @@ def refresh_dataset():
                 'error': result.get('error', '数据集刷新失败'),
                 'timestamp': datetime.now().isoformat()
             }), 500
-            
+    
+    except AdmissionRejected as e:
+        return admission_rejected_response(e)
     except Exception as e:
         logger.error(f"数据集刷新异常: {e}")
         return jsonify({
@@ -1923,10 +5975,16 @@ def refresh_dataset_metadata():
         
         logger.info(f"刷新数据集元数据请求: {dataset_path}")
         
-        # 执行数据集元数据刷新
-        result = dremio_client.refresh_dataset_metadata(dataset_path, timeout_secs)
+        if data.get('queue'):
+            # 加入刷新队列，与其他请求合并后执行，立即返回ticket
+            return queued_refresh_response([dataset_refresh_queue.enqueue(dataset_path, metadata=True, reflection=False)])
+        
+        # 执行数据集元数据刷新（按维护类查询排队）
+        with query_admission.admit('maintenance'):
+            result = dremio_client.refresh_dataset_metadata(dataset_path, timeout_secs)
         
         if result.get('success'):
+            invalidate_dataset_caches(dataset_path)
             return jsonify({
                 'success': True,
                 'message': result.get('message', '数据集元数据刷新完成'),
@@ -1941,7 +5999,9 @@ def refresh_dataset_metadata():
                 'sql_executed': result.get('sql_executed', ''),
                 'timestamp': datetime.now().isoformat()
             }), 500
-            
+    
+    except AdmissionRejected as e:
+        return admission_rejected_response(e)
     except Exception as e:
         logger.error(f"数据集元数据刷新异常: {e}")
         return jsonify({
@@ -1950,6 +6010,74 @@ def refresh_dataset_metadata():
             'timestamp': datetime.now().isoformat()
         }), 500
 
+@app.route('/api/dataset/refresh-queue', methods=['POST'])
+@monitor_performance
+def enqueue_dataset_refresh():
+    """将数据集刷新请求加入刷新队列 - 去抖窗口内同一数据集的请求合并，先刷新元数据再重建反射"""
+    try:
+        data = request.get_json() or {}
+        dataset_paths = data.get('dataset_paths') or ([data['dataset_path']] if data.get('dataset_path') else [])
+        metadata = bool(data.get('metadata', True))
+        reflection = bool(data.get('reflection', True))
+        
+        if not isinstance(dataset_paths, list) or not dataset_paths:
+            return jsonify({
+                'success': False,
+                'error': '请求体中缺少dataset_path或dataset_paths字段',
+                'timestamp': datetime.now().isoformat()
+            }), 400
+        
+        if not all(isinstance(path, str) and path.strip() for path in dataset_paths):
+            return jsonify({
+                'success': False,
+                'error': '数据集路径必须是非空字符串',
+                'timestamp': datetime.now().isoformat()
+            }), 400
+        
+        if not (metadata or reflection):
+            return jsonify({
+                'success': False,
+                'error': 'metadata和reflection至少需要启用一项',
+                'timestamp': datetime.now().isoformat()
+            }), 400
+        
+        tickets = [dataset_refresh_queue.enqueue(path.strip(), metadata, reflection) for path in dataset_paths]
+        return queued_refresh_response(tickets)
+    
+    except Exception as e:
+        logger.error(f"加入刷新队列失败: {e}")
+        return jsonify({
+            'success': False,
+            'error': f'服务器内部错误: {str(e)}',
+            'timestamp': datetime.now().isoformat()
+        }), 500
+
+@app.route('/api/dataset/refresh-queue', methods=['GET'])
+def get_dataset_refresh_queue_stats():
+    """获取刷新队列统计（待执行的数据集、各状态ticket数、合并次数）"""
+    return jsonify({
+        'success': True,
+        'data': dataset_refresh_queue.stats(),
+        'timestamp': datetime.now().isoformat()
+    })
+
+@app.route('/api/dataset/refresh-queue/<ticket_id>', methods=['GET'])
+def get_dataset_refresh_ticket(ticket_id):
+    """查询刷新ticket状态：queued / running / done / partial（元数据与反射只有一步成功）/ failed"""
+    ticket = dataset_refresh_queue.get_ticket(ticket_id)
+    if not ticket:
+        return jsonify({
+            'success': False,
+            'error': f'ticket不存在或已过期: {ticket_id}',
+            'timestamp': datetime.now().isoformat()
+        }), 404
+    
+    return jsonify({
+        'success': True,
+        'data': ticket,
+        'timestamp': datetime.now().isoformat()
+    })
+
 @app.route('/api/export/xlsx', methods=['POST'])
 def export_data_to_xlsx():
     """导出Dremio数据到XLSX文件"""
@@ -1969,6 +6097,7 @@ def export_data_to_xlsx():
         # 支持两种参数名：host_path 和 output_path
         host_path = data.get('host_path') or data.get('output_path')  # 主机路径
         filename = data.get('filename', 'export_data.xlsx')
+        parallel_endpoints = data.get('parallel_endpoints')  # 是否并行读取Flight的多个endpoint
         logger.info(f"解析后的参数: sql={sql}, host_path={host_path}, filename={filename}")
         
         logger.info(f"解析参数 - SQL: {sql}, host_path: {host_path}, filename: {filename}")
@@ -1996,42 +6125,18 @@ def export_data_to_xlsx():
         
         logger.info(f"开始执行SQL查询并导出到: {full_path}")
         
-        # 使用Arrow Flight执行查询
+        # 使用Arrow Flight逐批读取（失败时回退REST API分页），以只写模式写入临时文件后替换
+        batches = iter_query_batches(sql, parallel_endpoints)
+        temp_path = f"{full_path}.{uuid.uuid4().hex}.tmp"
         try:
-            df = dremio_flight_client.execute_query_to_dataframe(sql)
-        except Exception as flight_error:
-            logger.warning(f"Arrow Flight查询失败，尝试使用REST API: {flight_error}")
-            # 如果Arrow Flight失败，回退到REST API
-            result = dremio_client.execute_sql_query(sql)
-            if result['success']:
-                # 将结果转换为DataFrame
-                rows = result['data']  # data已经是rows列表
+            export_stats = write_xlsx_from_batches(batches, temp_path)
+            os.replace(temp_path, full_path)
+        finally:
+            batches.close()
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
                 
-                if rows:
-                    # 从第一行数据推断列名
-                    if isinstance(rows[0], dict):
-                        # 如果行是字典格式
-                        df = pd.DataFrame(rows)
-                    else:
-                        # 如果行是列表格式，需要获取列信息
-                        # 先执行一个简单查询获取列信息
-                        schema_sql = f"SELECT * FROM ({sql}) LIMIT 0"
-                        schema_result = dremio_client.execute_sql_query(schema_sql)
-                        if schema_result['success']:
-                            df = pd.DataFrame(rows)
-                        else:
-                            # 如果无法获取schema，使用通用列名
-                            df = pd.DataFrame(rows)
-                else:
-                    df = pd.DataFrame()
-            else:
-                raise Exception(f"REST API查询也失败: {result['error']}")
-        
-        # 导出到XLSX
-        with pd.ExcelWriter(full_path, engine='openpyxl') as writer:
-            df.to_excel(writer, sheet_name='Data', index=False)
-        
-        logger.info(f"数据导出成功: {full_path}, 共{len(df)} 行")
+        logger.info(f"数据导出成功: {full_path}, 共{export_stats['rows']} 行, {export_stats['sheets']} 个工作表")
         
         # 计算主机路径
         host_file_path = os.path.join(host_path, filename)
@@ -2042,12 +6147,15 @@ def export_data_to_xlsx():
             'data': {
                 'host_file_path': host_file_path,  # 主机文件路径
                 'container_file_path': full_path,  # 容器文件路径
-                'rows_exported': len(df),
-                'columns': list(df.columns) if not df.empty else [],
+                'rows_exported': export_stats['rows'],
+                'columns': export_stats['columns'],
+                'sheets': export_stats['sheets'],
                 'file_size_mb': round(os.path.getsize(full_path) / (1024 * 1024), 2) if os.path.exists(full_path) else 0
             }
         })
-        
+    
+    except AdmissionRejected as e:
+        return admission_rejected_response(e)
     except Exception as e:
         logger.error(f"数据导出失败: {e}")
         return jsonify({
@@ -2055,6 +6163,87 @@ def export_data_to_xlsx():
             'error': str(e)
         }), 500
 
+@app.route('/api/export/minio', methods=['POST'])
+@monitor_performance
+def export_data_to_minio():
+    """将查询结果直接写入MinIO（Parquet单文件或分区数据集），数据不经过客户端"""
+    try:
+        data = request.get_json()
+        
+        if not data or not (data.get('sql') or '').strip():
+            return jsonify({
+                'success': False,
+                'error': '请求体中缺少sql字段',
+                'timestamp': datetime.now().isoformat()
+            }), 400
+        
+        sql = data['sql'].strip()
+        bucket = data.get('bucket') or MINIO_BUCKET
+        object_path = (data.get('object_path') or '').strip().lstrip('/')
+        partition_by = data.get('partition_by') or []
+        compression = str(data.get('compression', PARQUET_DEFAULT_COMPRESSION)).lower()
+        parallel_endpoints = data.get('parallel_endpoints')  # 是否并行读取Flight的多个endpoint
+        
+        if isinstance(partition_by, str):
+            partition_by = [partition_by]
+        
+        if not object_path:
+            return jsonify({
+                'success': False,
+                'error': '缺少object_path参数（单文件为对象路径，分区导出为目录前缀）',
+                'timestamp': datetime.now().isoformat()
+            }), 400
+        
+        if compression not in PARQUET_COMPRESSION_CODECS:
+            return jsonify({
+                'success': False,
+                'error': f"不支持的压缩算法: {compression}，可选: {', '.join(PARQUET_COMPRESSION_CODECS)}",
+                'timestamp': datetime.now().isoformat()
+            }), 400
+        
+        if Minio is None:
+            return jsonify({
+                'success': False,
+                'error': 'minio未安装，无法导出到MinIO',
+                'timestamp': datetime.now().isoformat()
+            }), 501
+        
+        logger.info(f"导出查询结果到MinIO: {bucket}/{object_path}, 分区列: {partition_by or '无'}")
+        start_time = time.time()
+        
+        result = export_query_to_minio(sql, bucket, object_path, partition_by, compression, parallel_endpoints)
+        execution_time = round(time.time() - start_time, 2)
+        logger.info(f"MinIO导出完成: {result['rows']} 行, {len(result['objects'])} 个对象, "
+                    f"{result['bytes'] / (1024 * 1024):.2f} MB, 耗时 {execution_time}秒")
+        
+        return jsonify({
+            'success': True,
+            'data': {
+                **result,
+                'object_path': object_path,
+                'partition_by': partition_by,
+                'compression': compression,
+                'execution_time': execution_time
+            },
+            'timestamp': datetime.now().isoformat()
+        })
+    
+    except AdmissionRejected as e:
+        return admission_rejected_response(e)
+    except ExportRequestError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e),
+            'timestamp': datetime.now().isoformat()
+        }), 400
+    except Exception as e:
+        logger.error(f"MinIO导出失败: {e}")
+        return jsonify({
+            'success': False,
+            'error': f'MinIO导出失败: {str(e)}',
+            'timestamp': datetime.now().isoformat()
+        }), 500
+
 @app.route('/api/download/csv', methods=['POST', 'OPTIONS'])
 def download_csv():
     """直接触发浏览器下载CSV文件 - 专为Dify工作流优化"""
@@ -2079,6 +6268,7 @@ def download_csv():
         
         sql = data.get('sql')
         filename = data.get('filename', 'export_data.csv')
+        parallel_endpoints = data.get('parallel_endpoints')  # 是否并行读取Flight的多个endpoint
         
         logger.info(f"解析参数 - SQL: {sql}, filename: {filename}")
         
@@ -2090,44 +6280,14 @@ def download_csv():
         
         logger.info(f"开始执行SQL查询并生成CSV流: {sql}")
         
-        # 使用Arrow Flight执行查询
-        try:
-            df = dremio_flight_client.execute_query_to_dataframe(sql)
-        except Exception as flight_error:
-            logger.warning(f"Arrow Flight查询失败，尝试使用REST API: {flight_error}")
-            # 如果Arrow Flight失败，回退到REST API
-            result = dremio_client.execute_sql_query(sql)
-            if result['success']:
-                rows = result['data']
-                if rows:
-                    if isinstance(rows[0], dict):
-                        df = pd.DataFrame(rows)
-                    else:
-                        df = pd.DataFrame(rows)
-                else:
-                    df = pd.DataFrame()
-            else:
-                raise Exception(f"REST API查询也失败: {result['error']}")
-        
-        logger.info(f"查询成功，共 {len(df)} 行数据，开始生成CSV")
+        # 使用Arrow Flight逐批读取（失败时回退REST API分页），每个批次编码后立即发送
+        batches = iter_query_batches(sql, parallel_endpoints)
         
-        # 强制浏览器下载模式 - 生成CSV内容
-        def generate_csv():
-            # 使用StringIO作为缓冲区
-            from io import StringIO
-            output = StringIO()
-            df.to_csv(output, index=False, encoding='utf-8')
-            csv_content = output.getvalue()
-            output.close()
-            
-            # 分块发送数据
-            chunk_size = 8192  # 8KB chunks
-            for i in range(0, len(csv_content), chunk_size):
-                yield csv_content[i:i + chunk_size]
+        logger.info("查询已开始返回数据，开始流式生成CSV")
         
         # 设置强制下载的响应头
         response = Response(
-            generate_csv(),
+            iter_closing(iter_csv_chunks(batches), batches, 'CSV'),
             mimetype='application/octet-stream',  # 使用通用二进制类型强制下载
             headers={
                 'Content-Disposition': f'attachment; filename="{filename}"',
@@ -2146,7 +6306,9 @@ def download_csv():
         
         logger.info(f"CSV下载响应已生成: {filename}")
         return response
-        
+    
+    except AdmissionRejected as e:
+        return admission_rejected_response(e)
     except Exception as e:
         logger.error(f"CSV下载失败: {e}")
         return jsonify({
@@ -2178,6 +6340,7 @@ def download_xlsx():
         
         sql = data.get('sql')
         filename = data.get('filename', 'export_data.xlsx')
+        parallel_endpoints = data.get('parallel_endpoints')  # 是否并行读取Flight的多个endpoint
         
         logger.info(f"解析参数 - SQL: {sql}, filename: {filename}")
         
@@ -2189,42 +6352,22 @@ def download_xlsx():
         
         logger.info(f"开始执行SQL查询并生成Excel流: {sql}")
         
-        # 使用Arrow Flight执行查询
-        try:
-            df = dremio_flight_client.execute_query_to_dataframe(sql)
-        except Exception as flight_error:
-            logger.warning(f"Arrow Flight查询失败，尝试使用REST API: {flight_error}")
-            # 如果Arrow Flight失败，回退到REST API
-            result = dremio_client.execute_sql_query(sql)
-            if result['success']:
-                rows = result['data']
-                if rows:
-                    if isinstance(rows[0], dict):
-                        df = pd.DataFrame(rows)
-                    else:
-                        df = pd.DataFrame(rows)
-                else:
-                    df = pd.DataFrame()
-            else:
-                raise Exception(f"REST API查询也失败: {result['error']}")
+        # 逐批读取查询结果并以只写模式写入临时文件
+        excel_file, export_stats = build_xlsx_tempfile(sql, parallel_endpoints)
         
-        logger.info(f"查询成功，共 {len(df)} 行数据，开始生成Excel")
+        logger.info(f"Excel生成完成，共 {export_stats['rows']} 行数据，{export_stats['sheets']} 个工作表")
         
-        # 强制浏览器下载模式 - 生成Excel内容
+        # 强制浏览器下载模式 - 分块发送Excel内容
         def generate_excel():
-            from io import BytesIO
-            output = BytesIO()
-            
-            with pd.ExcelWriter(output, engine='openpyxl') as writer:
-                df.to_excel(writer, sheet_name='Data', index=False)
-            
-            excel_content = output.getvalue()
-            output.close()
-            
-            # 分块发送数据
-            chunk_size = 8192  # 8KB chunks
-            for i in range(0, len(excel_content), chunk_size):
-                yield excel_content[i:i + chunk_size]
+            try:
+                chunk_size = 64 * 1024  # 64KB chunks
+                while True:
+                    chunk = excel_file.read(chunk_size)
+                    if not chunk:
+                        break
+                    yield chunk
+            finally:
+                excel_file.close()
         
         # 设置强制下载的响应头
         response = Response(
@@ -2232,6 +6375,7 @@ def download_xlsx():
             mimetype='application/octet-stream',  # 使用通用二进制类型强制下载
             headers={
                 'Content-Disposition': f'attachment; filename="{filename}"',
+                'Content-Length': str(os.fstat(excel_file.fileno()).st_size),
                 'Content-Type': 'application/octet-stream',  # 强制下载而非预览
                 'Access-Control-Allow-Origin': '*',
                 'Access-Control-Allow-Methods': 'POST, OPTIONS',
@@ -2247,7 +6391,9 @@ def download_xlsx():
         
         logger.info(f"Excel下载响应已生成: {filename}")
         return response
-        
+    
+    except AdmissionRejected as e:
+        return admission_rejected_response(e)
     except Exception as e:
         logger.error(f"Excel下载失败: {e}")
         return jsonify({
@@ -2270,8 +6416,8 @@ def generate_download_link():
             }), 400
         
         sql = data.get('sql')
-        filename = data.get('filename', 'export_data.csv')
-        file_format = data.get('format', 'csv').lower()  # csv 或 xlsx
+        file_format = data.get('format', 'csv').lower()  # csv、xlsx、parquet 或 arrow
+        filename = data.get('filename', f'export_data.{file_format}')
         
         if not sql:
             return jsonify({
@@ -2279,14 +6425,33 @@ def generate_download_link():
                 'error': 'SQL查询语句不能为空'
             }), 400
         
-        if file_format not in ['csv', 'xlsx']:
+        if file_format not in DOWNLOAD_FORMAT_MIMETYPES:
             return jsonify({
                 'success': False,
-                'error': '文件格式只支持 csv 或 xlsx'
+                'error': f"文件格式只支持 {', '.join(DOWNLOAD_FORMAT_MIMETYPES)}"
             }), 400
         
+        options = {}
+        if data.get('parallel_endpoints') is not None:
+            options['parallel_endpoints'] = bool(data['parallel_endpoints'])
+        if file_format == 'parquet':
+            compression = str(data.get('compression', PARQUET_DEFAULT_COMPRESSION)).lower()
+            if compression not in PARQUET_COMPRESSION_CODECS:
+                return jsonify({
+                    'success': False,
+                    'error': f"Parquet压缩算法只支持 {', '.join(PARQUET_COMPRESSION_CODECS)}"
+                }), 400
+            options['compression'] = compression
+        
         # 生成下载链接ID
-        link_id = download_manager.generate_link(sql, filename, file_format)
+        materialize = data.get('materialize', DOWNLOAD_MATERIALIZE_DEFAULT)
+        if materialize:
+            options['materialize'] = True
+        link_id = download_manager.generate_link(sql, filename, file_format, options)
+        
+        # 需要预生成时在后台执行查询并落盘，用户点击链接时直接从磁盘下载
+        if materialize:
+            download_spool.materialize(link_id, sql, file_format, options)
         
         # 构建完整的下载URL
         # 强制使用localhost:8000确保浏览器可以访问
@@ -2311,8 +6476,9 @@ def download_file_by_link(link_id: str):
     """通过临时链接下载文件"""
     logger.info(f"=== 进入 download_file_by_link 函数，link_id: {link_id} ===")
     try:
-        # 清理过期链接
+        # 清理过期链接及其落盘文件
         download_manager.cleanup_expired_links()
+        download_spool.evict_expired()
         
         # 获取链接信息
         link_info = download_manager.get_link_info(link_id)
@@ -2326,62 +6492,55 @@ def download_file_by_link(link_id: str):
         sql = link_info['sql']
         filename = link_info['filename']
         file_format = link_info['format']
+        options = link_info.get('options', {})
         
-        logger.info(f"开始执行SQL查询: {sql[:100]}...")
-        
-        # 使用Arrow Flight执行查询
-        try:
-            df = dremio_flight_client.execute_query_to_dataframe(sql)
-        except Exception as flight_error:
-            logger.warning(f"Arrow Flight查询失败，尝试使用REST API: {flight_error}")
-            # 如果Arrow Flight失败，回退到REST API
-            result = dremio_client.execute_sql_query(sql)
-            if result['success']:
-                rows = result['data']
-                if rows:
-                    if isinstance(rows[0], dict):
-                        df = pd.DataFrame(rows)
-                    else:
-                        df = pd.DataFrame(rows)
-                else:
-                    df = pd.DataFrame()
-            else:
-                raise Exception(f"REST API查询也失败: {result['error']}")
+        # 已预生成的结果直接从磁盘发送（支持Range断点续传）；仍在生成时短暂等待，未完成则返回202稍后重试
+        if options.get('materialize'):
+            spool_entry = download_spool.get(link_id, file_format)
+            if spool_entry and spool_entry['state'] == 'pending':
+                response = jsonify({
+                    'success': True,
+                    'message': '下载文件仍在生成中，请稍后重试',
+                    'data': {'link_id': link_id, 'state': 'pending'},
+                    'timestamp': datetime.now().isoformat()
+                })
+                response.status_code = 202
+                response.headers['Retry-After'] = str(DOWNLOAD_SPOOL_RETRY_AFTER)
+                return response
+            if spool_entry and spool_entry['state'] == 'ready':
+                logger.info(f"从落盘文件发送下载结果: {spool_entry['path']}")
+                return send_file(
+                    os.path.abspath(spool_entry['path']),
+                    mimetype=DOWNLOAD_FORMAT_MIMETYPES[file_format],
+                    as_attachment=True,
+                    download_name=filename,
+                    conditional=True
+                )
+            if spool_entry and spool_entry['state'] == 'failed':
+                logger.warning(f"预生成下载结果失败，改为实时查询: {spool_entry['error']}")
         
-        logger.info(f"查询成功，共 {len(df)} 行数据，开始生成 {file_format.upper()} 文件")
+        logger.info(f"开始执行SQL查询: {sql[:100]}...")
         
-        if file_format == 'csv':
-            # 生成CSV
-            output = StringIO()
-            df.to_csv(output, index=False, encoding='utf-8')
-            csv_content = output.getvalue()
-            output.close()
+        if file_format in ('csv', 'parquet', 'arrow'):
+            # 逐批读取并流式输出，列式格式直接由RecordBatch写出
+            batches = iter_query_batches(sql, options.get('parallel_endpoints'))
+            logger.info(f"查询已开始返回数据，开始流式生成 {file_format.upper()} 文件")
             
-            # 创建BytesIO对象用于send_file
-            file_buffer = BytesIO(csv_content.encode('utf-8'))
-            
-            return send_file(
-                file_buffer,
-                mimetype='text/csv',
-                as_attachment=True,
-                download_name=filename
+            return Response(
+                iter_closing(iter_export_chunks(batches, file_format, options), batches, file_format.upper()),
+                mimetype=DOWNLOAD_FORMAT_MIMETYPES[file_format],
+                headers={'Content-Disposition': f'attachment; filename="{filename}"'}
             )
             
         elif file_format == 'xlsx':
-            # 生成Excel
-            output = BytesIO()
-            with pd.ExcelWriter(output, engine='openpyxl') as writer:
-                df.to_excel(writer, sheet_name='Data', index=False)
+            # 逐批读取查询结果并以只写模式写入临时文件
+            excel_file, export_stats = build_xlsx_tempfile(sql, options.get('parallel_endpoints'))
             
-            excel_content = output.getvalue()
-            output.close()
-            
-            # 创建BytesIO对象用于send_file
-            file_buffer = BytesIO(excel_content)
+            logger.info(f"XLSX 文件生成完成，共 {export_stats['rows']} 行数据")
             
             return send_file(
-                file_buffer,
-                mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+                excel_file,
+                mimetype=DOWNLOAD_FORMAT_MIMETYPES['xlsx'],
                 as_attachment=True,
                 download_name=filename
             )
@@ -2391,7 +6550,9 @@ def download_file_by_link(link_id: str):
                 'success': False,
                 'error': '不支持的文件格式'
             }), 400
-            
+    
+    except AdmissionRejected as e:
+        return admission_rejected_response(e)
     except Exception as e:
         logger.error(f"下载文件时发生错误: {str(e)}")
         return jsonify({
@@ -2415,19 +6576,39 @@ def refresh_reflection_endpoint():
         
         dataset_path = data['dataset_path']
         dataset_id = data.get('dataset_id')  # 可选参数
+        wait = data.get('wait', False)  # 是否等待新反射构建完成后再返回
+        wait_timeout = data.get('wait_timeout')  # 秒，默认使用REFLECTION_WAIT_TIMEOUT
+        
+        if data.get('queue'):
+            # 加入刷新队列，与其他请求合并后执行，立即返回ticket
+            return queued_refresh_response([dataset_refresh_queue.enqueue(dataset_path, metadata=False, reflection=True)])
         
         logger.info(f"开始刷新反射: {dataset_path}")
         
-        # 调用DremioClient的refresh_reflection_by_recreate方法
-        result = dremio_client.refresh_reflection_by_recreate(dataset_path, dataset_id)
+        # 调用DremioClient的refresh_reflection_by_recreate方法（按维护类查询排队）
+        with query_admission.admit('maintenance'):
+            result = dremio_client.refresh_reflection_by_recreate(dataset_path, dataset_id)
         
         if result['success']:
             logger.info(f"反射刷新成功: {dataset_path}")
+            invalidate_dataset_caches(dataset_path)
+            if not wait:
+                return jsonify({
+                    'success': True,
+                    'message': result['message'],
+                    'data': result.get('details', {})
+                })
+            
+            # 等待期间不占用准入名额，只有状态轮询会访问Dremio
+            wait_result = dremio_client.wait_for_reflection(dataset_path, result['details']['new_reflection_name'], wait_timeout)
             return jsonify({
-                'success': True,
+                'success': wait_result['success'],
                 'message': result['message'],
-                'data': result.get('details', {})
-            })
+                'ready': wait_result['ready'],
+                'error': wait_result.get('error'),
+                'data': result.get('details', {}),
+                'reflection_status': wait_result
+            }), reflection_wait_status_code(wait_result)
         else:
             logger.error(f"反射刷新失败: {dataset_path}, 错误: {result['error']}")
             return jsonify({
@@ -2435,7 +6616,9 @@ def refresh_reflection_endpoint():
                 'error': result['error'],
                 'data': result.get('details', {})
             }), 500
-            
+    
+    except AdmissionRejected as e:
+        return admission_rejected_response(e)
     except Exception as e:
         logger.error(f"刷新反射时发生错误: {str(e)}")
         return jsonify({
@@ -2443,6 +6626,67 @@ def refresh_reflection_endpoint():
             'error': f'刷新反射失败: {str(e)}'
         }), 500
 
+@app.route('/api/reflection/refresh-batch', methods=['POST'])
+@monitor_performance
+def refresh_reflection_batch_endpoint():
+    """批量刷新多个数据集的反射 - 一次查询定位全部现有反射，DROP/CREATE语句并发执行"""
+    try:
+        data = request.get_json()
+        dataset_paths = (data or {}).get('dataset_paths')
+        if not isinstance(dataset_paths, list) or not dataset_paths:
+            return jsonify({
+                'success': False,
+                'error': '缺少必需的参数: dataset_paths（数据集路径列表）',
+                'timestamp': datetime.now().isoformat()
+            }), 400
+        
+        if not all(isinstance(path, str) and path.strip() for path in dataset_paths):
+            return jsonify({
+                'success': False,
+                'error': 'dataset_paths中的每一项都必须是非空字符串',
+                'timestamp': datetime.now().isoformat()
+            }), 400
+        
+        if len(dataset_paths) > REFLECTION_BATCH_MAX_DATASETS:
+            return jsonify({
+                'success': False,
+                'error': f'单次最多刷新 {REFLECTION_BATCH_MAX_DATASETS} 个数据集，当前: {len(dataset_paths)}',
+                'timestamp': datetime.now().isoformat()
+            }), 400
+        
+        dataset_paths = [path.strip() for path in dataset_paths]
+        max_concurrency = data.get('max_concurrency')
+        if max_concurrency is not None:
+            max_concurrency = max(1, min(int(max_concurrency), REFLECTION_BATCH_CONCURRENCY))
+        
+        logger.info(f"开始批量刷新反射: {len(dataset_paths)} 个数据集")
+        result = dremio_client.refresh_reflections_batch(dataset_paths, max_concurrency)
+        
+        if 'results' not in result:
+            return jsonify({
+                'success': False,
+                'error': result['error'],
+                'timestamp': datetime.now().isoformat()
+            }), 500
+        
+        for item in result['results']:
+            if item['success']:
+                invalidate_dataset_caches(item['dataset_path'])
+        
+        return jsonify({
+            'success': result['success'],
+            'data': result,
+            'timestamp': datetime.now().isoformat()
+        }), 200 if result['succeeded'] else 500
+    
+    except Exception as e:
+        logger.error(f"批量刷新反射时发生错误: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': f'批量刷新反射失败: {str(e)}',
+            'timestamp': datetime.now().isoformat()
+        }), 500
+
 @app.route('/api/debug/columns', methods=['POST'])
 @monitor_performance
 def debug_get_columns_endpoint():
@@ -2751,29 +6995,46 @@ def create_reflection_endpoint():
         
         dataset_path = data['dataset_path']
         reflection_name = data.get('reflection_name')  # 可选参数
+        wait = data.get('wait', False)  # 是否等待反射构建完成后再返回
+        wait_timeout = data.get('wait_timeout')  # 秒，默认使用REFLECTION_WAIT_TIMEOUT
         
         logger.info(f"创建反射: {dataset_path}")
         
-        # 调用DremioClient的create_raw_reflection_by_sql方法
-        result = dremio_client.create_raw_reflection_by_sql(dataset_path, reflection_name)
+        # 调用DremioClient的create_raw_reflection_by_sql方法（按维护类查询排队）
+        with query_admission.admit('maintenance'):
+            result = dremio_client.create_raw_reflection_by_sql(dataset_path, reflection_name)
         
         if result['success']:
             logger.info(f"反射创建成功: {dataset_path}")
+            response_data = {
+                'dataset_path': dataset_path,
+                'reflection_name': result.get('reflection_name')
+            }
+            if not wait:
+                return jsonify({
+                    'success': True,
+                    'message': result['message'],
+                    'data': response_data
+                })
+            
+            wait_result = dremio_client.wait_for_reflection(dataset_path, result.get('reflection_name'), wait_timeout)
             return jsonify({
-                'success': True,
+                'success': wait_result['success'],
                 'message': result['message'],
-                'data': {
-                    'dataset_path': dataset_path,
-                    'reflection_name': result.get('reflection_name')
-                }
-            })
+                'ready': wait_result['ready'],
+                'error': wait_result.get('error'),
+                'data': response_data,
+                'reflection_status': wait_result
+            }), reflection_wait_status_code(wait_result)
         else:
             logger.error(f"反射创建失败: {dataset_path}, 错误: {result['error']}")
             return jsonify({
                 'success': False,
                 'error': result['error']
             }), 500
-            
+    
+    except AdmissionRejected as e:
+        return admission_rejected_response(e)
     except Exception as e:
         logger.error(f"创建反射时发生错误: {str(e)}")
         return jsonify({
@@ -2781,6 +7042,80 @@ def create_reflection_endpoint():
             'error': f'创建反射失败: {str(e)}'
         }), 500
 
+@app.route('/api/reflection/status', methods=['GET'])
+@monitor_performance
+def reflection_status_endpoint():
+    """查询反射状态 - 指定reflection_name时可用wait=true阻塞到反射就绪、失败或超时"""
+    try:
+        dataset_path = request.args.get('dataset_path', '').strip()
+        reflection_name = request.args.get('reflection_name', '').strip()
+        wait = request.args.get('wait', 'false').lower() == 'true'
+        timeout = request.args.get('timeout', type=float)
+        
+        if not dataset_path:
+            return jsonify({
+                'success': False,
+                'error': '缺少必需的参数: dataset_path',
+                'timestamp': datetime.now().isoformat()
+            }), 400
+        
+        if not reflection_name:
+            # 未指定反射名称时返回该数据集的全部反射及其状态
+            lookup_result = dremio_client.find_reflections_by_dataset_paths([dataset_path])
+            if not lookup_result['success']:
+                return jsonify({
+                    'success': False,
+                    'error': lookup_result['error'],
+                    'timestamp': datetime.now().isoformat()
+                }), 500
+            reflections = lookup_result['reflections'][dataset_path]
+            return jsonify({
+                'success': True,
+                'data': {
+                    'dataset_path': dataset_path,
+                    'reflections': reflections,
+                    'ready': any(r['status'] in REFLECTION_READY_STATUSES for r in reflections)
+                },
+                'timestamp': datetime.now().isoformat()
+            })
+        
+        if not wait:
+            found = dremio_client.find_reflection(dataset_path, reflection_name)
+            if not found['success']:
+                return jsonify({
+                    'success': False,
+                    'error': found['error'],
+                    'timestamp': datetime.now().isoformat()
+                }), 500
+            if not found['reflection']:
+                return jsonify({
+                    'success': False,
+                    'error': f'未找到反射: {reflection_name}',
+                    'timestamp': datetime.now().isoformat()
+                }), 404
+            status = found['reflection']['status']
+            return jsonify({
+                'success': True,
+                'data': dict(found['reflection'], dataset_path=dataset_path, ready=status in REFLECTION_READY_STATUSES),
+                'timestamp': datetime.now().isoformat()
+            })
+        
+        wait_result = dremio_client.wait_for_reflection(dataset_path, reflection_name, timeout)
+        return jsonify({
+            'success': wait_result['success'],
+            'error': wait_result.get('error'),
+            'data': wait_result,
+            'timestamp': datetime.now().isoformat()
+        }), reflection_wait_status_code(wait_result)
+    
+    except Exception as e:
+        logger.error(f"查询反射状态失败: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': f'查询反射状态失败: {str(e)}',
+            'timestamp': datetime.now().isoformat()
+        }), 500
+
 @app.route('/api/test/fields', methods=['POST'])
 @monitor_performance
 def test_fields_endpoint():
@@ -2858,12 +7193,36 @@ def index():
 
 @app.route('/health')
 def health_check():
+    """存活检查 - 进程能响应即为存活，另外附带就绪状态"""
     return jsonify({
         'status': 'healthy',
+        'live': True,
+        'ready': schema_cache.is_ready(),
+        'schema_cache_source': schema_cache.source,
         'dremio_connected': bool(dremio_client.token),
+        'arrow_flight': dremio_flight_client.stats() if dremio_flight_client else None,
+        'admission': query_admission.stats(),
         'timestamp': datetime.now().isoformat()
     })
 
+@app.route('/health/ready')
+def readiness_check():
+    """就绪检查 - Schema缓存已加载（快照或Dremio）才返回200"""
+    ready = schema_cache.is_ready()
+    return jsonify({
+        'ready': ready,
+        'schema_cache_source': schema_cache.source,
+        'schema_count': schema_cache.stats()['schema_count'],
+        'dremio_connected': bool(dremio_client.token),
+        'timestamp': datetime.now().isoformat()
+    }), 200 if ready else 503
+
+# 以WSGI服务器（如gunicorn）运行时不会执行__main__，在每个worker进程处理第一个请求时启动后台刷新
+@app.before_request
+def ensure_auto_refresh():
+    if cache_manager.auto_refresh_pid != os.getpid():
+        cache_manager.start_auto_refresh()
+
 # 添加请求日志中间件
 @app.before_request
 def log_request_info():
@@ -2883,4 +7242,6 @@ if __name__ == '__main__':
     print("启动Dremio API服务器...")
     print(f"服务端口: {api_port}")
     print(f"注册的路由: {[rule.rule for rule in app.url_map.iter_rules()]}")
+    # 后台刷新：用Dremio最新的catalog与启动时加载的快照对账，之后按周期刷新
+    cache_manager.start_auto_refresh()
     app.run(host='0.0.0.0', port=api_port, debug=False)
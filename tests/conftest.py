@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+"""测试公共配置
+
+dremio_api_server_enhanced 在导入时会连接Dremio并在 ./logs 下创建日志文件，
+这里在导入前把Dremio地址指向本机未监听的端口（认证立即失败），并把日志、快照、
+下载链接等文件放到临时目录，测试不依赖真实的Dremio/MinIO服务。
+"""
+import os
+import socket
+import sys
+import tempfile
+
+import pytest
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+
+def _unused_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _import_server():
+    work_dir = tempfile.mkdtemp(prefix='dremio-api-test-')
+    os.makedirs(os.path.join(work_dir, 'logs'), exist_ok=True)
+    
+    port = _unused_port()
+    os.environ.update({
+        'DREMIO_HOST': '127.0.0.1',
+        'DREMIO_PORT': str(port),
+        'DREMIO_FLIGHT_PORT': str(port),
+        'SCHEMA_CACHE_SNAPSHOT': os.path.join(work_dir, 'cache', 'schema_cache.json.gz'),
+        'DOWNLOAD_SPOOL_DIR': os.path.join(work_dir, 'cache', 'downloads'),
+        'DOWNLOAD_LINK_STORE': 'memory',
+        'DOWNLOAD_LINK_DB': os.path.join(work_dir, 'cache', 'download_links.db')
+    })
+    
+    # 日志文件路径是相对路径，只在导入期间切换工作目录
+    cwd = os.getcwd()
+    os.chdir(work_dir)
+    try:
+        import dremio_api_server_enhanced
+    finally:
+        os.chdir(cwd)
+    return dremio_api_server_enhanced
+
+
+@pytest.fixture(scope='session')
+def server():
+    """导入后的服务模块"""
+    return _import_server()
+
+
+@pytest.fixture
+def client(server, monkeypatch):
+    """Flask测试客户端（不启动schema缓存的后台刷新线程）"""
+    monkeypatch.setattr(server.cache_manager, 'auto_refresh_pid', os.getpid())
+    return server.app.test_client()
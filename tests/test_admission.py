@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+"""AdmissionController"""
+import threading
+import time
+
+import pytest
+
+
+def _wait_until(predicate, timeout=2.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.005)
+    return predicate()
+
+
+def _controller(server, max_concurrent=1, queue_limit=2, timeout=1):
+    priorities = server.AdmissionController.PRIORITIES
+    return server.AdmissionController(
+        max_concurrent,
+        {priority: max_concurrent for priority in priorities},
+        {priority: queue_limit for priority in priorities},
+        queue_timeout=timeout
+    )
+
+
+def test_admission_times_out_when_no_slot(server):
+    controller = _controller(server)
+    controller.acquire('interactive')
+    
+    with pytest.raises(server.AdmissionRejected) as excinfo:
+        controller.acquire('interactive', timeout=0.05)
+    assert excinfo.value.reason == 'timeout'
+    
+    controller.release('interactive')
+    with controller.admit('interactive'):
+        assert controller.stats()['running'] == 1
+    assert controller.stats()['running'] == 0
+
+
+def test_admission_rejects_when_queue_full(server):
+    controller = _controller(server, queue_limit=1)
+    controller.acquire('export')
+    waiter = threading.Thread(target=controller.acquire, args=('export',))
+    waiter.start()
+    assert _wait_until(lambda: controller.stats()['classes']['export']['queued'] == 1)
+    
+    with pytest.raises(server.AdmissionRejected) as excinfo:
+        controller.acquire('export', timeout=1)
+    assert excinfo.value.reason == 'queue_full'
+    
+    controller.release('export')
+    waiter.join(2)
+    controller.release('export')
+
+
+def test_admission_prefers_higher_priority(server):
+    controller = _controller(server, timeout=2)
+    controller.acquire('maintenance')
+    order = []
+    
+    def run(priority):
+        controller.acquire(priority)
+        order.append(priority)
+        controller.release(priority)
+    
+    export = threading.Thread(target=run, args=('export',))
+    export.start()
+    assert _wait_until(lambda: controller.stats()['classes']['export']['queued'] == 1)
+    interactive = threading.Thread(target=run, args=('interactive',))
+    interactive.start()
+    assert _wait_until(lambda: controller.stats()['classes']['interactive']['queued'] == 1)
+    
+    controller.release('maintenance')
+    export.join(2)
+    interactive.join(2)
+    assert order == ['interactive', 'export']
+
+
+def test_admission_rejects_unknown_priority(server):
+    with pytest.raises(ValueError):
+        _controller(server).acquire('batch')
@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+"""异步查询接口 submit/status/results/cancel 与超时取消（Dremio使用桩客户端）"""
+import pytest
+
+
+class FakeDremio:
+    """在内存中保存作业状态的桩Dremio客户端"""
+    
+    def __init__(self):
+        self.jobs = {}
+        self.rows = [{'id': i} for i in range(5)]
+    
+    def submit_sql_query(self, sql, timeout=None):
+        job_id = f'job-{len(self.jobs) + 1}'
+        self.jobs[job_id] = {'sql': sql, 'state': 'RUNNING'}
+        return {'success': True, 'job_id': job_id}
+    
+    def get_job_status(self, job_id, timeout=10):
+        if job_id not in self.jobs:
+            return {'success': False, 'error': f'作业不存在: {job_id}', 'not_found': True}
+        job = self.jobs[job_id]
+        return {
+            'success': True,
+            'job_id': job_id,
+            'job_state': job['state'],
+            'row_count': len(self.rows) if job['state'] == 'COMPLETED' else None,
+            'error_message': job.get('error')
+        }
+    
+    def get_job_results(self, job_id, offset=0, limit=500):
+        return {'success': True, 'job_id': job_id, 'data': self.rows[offset:offset + limit], 'row_count': len(self.rows)}
+    
+    def cancel_job(self, job_id):
+        if job_id not in self.jobs:
+            return {'success': False, 'error': f'作业不存在: {job_id}', 'not_found': True}
+        job = self.jobs[job_id]
+        if job['state'] != 'RUNNING':
+            return {'success': False, 'error': 'Job has already finished', 'status_code': 400}
+        job['state'] = 'CANCELED'
+        return {'success': True, 'job_id': job_id}
+
+
+@pytest.fixture
+def dremio(server, monkeypatch):
+    fake = FakeDremio()
+    monkeypatch.setattr(server, 'dremio_client', fake)
+    return fake
+
+
+def test_submit_returns_job_handle(client, dremio):
+    response = client.post('/api/query/submit', json={'sql': ' SELECT id FROM orders '})
+    
+    assert response.status_code == 202
+    body = response.get_json()
+    assert body['job_id'] == 'job-1'
+    assert body['status_url'] == '/api/query/job-1/status'
+    assert body['results_url'] == '/api/query/job-1/results'
+    assert dremio.jobs['job-1']['sql'] == 'SELECT id FROM orders'
+    assert client.post('/api/query/submit', json={'sql': ' '}).status_code == 400
+
+
+def test_status_and_results_follow_job_state(client, dremio):
+    job_id = client.post('/api/query/submit', json={'sql': 'SELECT id FROM orders'}).get_json()['job_id']
+    
+    running = client.get(f'/api/query/{job_id}/status').get_json()
+    assert running['job_state'] == 'RUNNING' and not running['finished']
+    assert client.get(f'/api/query/{job_id}/results').status_code == 409
+    
+    dremio.jobs[job_id]['state'] = 'COMPLETED'
+    status = client.get(f'/api/query/{job_id}/status').get_json()
+    assert status['finished'] and status['row_count'] == 5
+    results = client.get(f'/api/query/{job_id}/results?offset=1&limit=2').get_json()
+    assert results['data'] == [{'id': 1}, {'id': 2}]
+    assert client.get(f'/api/query/{job_id}/results?limit=0').status_code == 400
+
+
+def test_unknown_job_returns_404(client, dremio):
+    assert client.get('/api/query/missing/status').status_code == 404
+    assert client.get('/api/query/missing/results').status_code == 404
+
+
+def test_cancel_running_job(client, dremio):
+    job_id = client.post('/api/query/submit', json={'sql': 'SELECT id FROM orders'}).get_json()['job_id']
+    
+    assert client.post(f'/api/query/{job_id}/cancel').status_code == 200
+    assert client.get(f'/api/query/{job_id}/status').get_json()['job_state'] == 'CANCELED'
+    # 作业已结束时无法再取消
+    assert client.post(f'/api/query/{job_id}/cancel').status_code == 409
+    assert client.post('/api/query/missing/cancel').status_code == 404
+
+
+def test_wait_for_job_cancels_on_timeout(server, monkeypatch):
+    dremio_client = server.DremioClient(host='127.0.0.1', port=1)
+    fake = FakeDremio()
+    job_id = fake.submit_sql_query('SELECT id FROM orders')['job_id']
+    monkeypatch.setattr(dremio_client, 'get_job_status', fake.get_job_status)
+    monkeypatch.setattr(dremio_client, 'cancel_job', fake.cancel_job)
+    
+    result = dremio_client.wait_for_job(job_id, timeout=0.05)
+    
+    assert not result['success'] and result['canceled']
+    assert fake.jobs[job_id]['state'] == 'CANCELED'
+    
+    # 调用方自行处理超时的作业不取消
+    other = fake.submit_sql_query('SELECT id FROM orders')['job_id']
+    assert not dremio_client.wait_for_job(other, timeout=0.05, cancel_on_timeout=False)['canceled']
+    assert fake.jobs[other]['state'] == 'RUNNING'
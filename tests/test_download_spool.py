@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+"""DownloadSpool 与 /api/download_file（查询结果使用桩批次流）"""
+import threading
+import time
+
+import pyarrow as pa
+import pytest
+
+
+class _Batches:
+    def __init__(self, batches, release=None):
+        self.batches = iter(batches)
+        self.release = release
+    
+    def __iter__(self):
+        return self
+    
+    def __next__(self):
+        if self.release is not None:
+            self.release.wait(5)
+        return next(self.batches)
+    
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def spool(server, tmp_path):
+    spool = server.DownloadSpool(str(tmp_path), max_bytes=1024 * 1024, ttl_seconds=600, max_workers=1, wait_timeout=0.1)
+    yield spool
+    spool.executor.shutdown(wait=False)
+
+
+def test_get_returns_pending_when_other_worker_is_writing(spool, tmp_path):
+    (tmp_path / 'link1.csv.part').write_bytes(b'id\n')
+    
+    started = time.time()
+    entry = spool.get('link1', 'csv')
+    
+    assert entry['state'] == 'pending'
+    assert time.time() - started < 1
+    (tmp_path / 'link1.csv.part').rename(tmp_path / 'link1.csv')
+    assert spool.get('link1', 'csv')['state'] == 'ready'
+
+
+def test_get_stops_waiting_for_local_materialization(server, spool, monkeypatch):
+    release = threading.Event()
+    batch = pa.RecordBatch.from_pydict({'id': [1, 2]})
+    monkeypatch.setattr(server, 'iter_query_batches', lambda sql, parallel_endpoints=None: _Batches([batch], release))
+    spool.materialize('link2', 'SELECT id FROM t', 'csv')
+    
+    assert spool.get('link2', 'csv')['state'] == 'pending'
+    
+    release.set()
+    entry = spool.get('link2', 'csv', timeout=5)
+    assert entry['state'] == 'ready'
+    with open(entry['path'], 'rb') as f:
+        assert f.read().decode('utf-8').splitlines() == ['"id"', '1', '2']
+
+
+def test_download_route_returns_202_while_file_is_generated(server, client, spool, tmp_path, monkeypatch):
+    monkeypatch.setattr(server, 'download_spool', spool)
+    link_id = server.download_manager.generate_link('SELECT 1', 'result.csv', 'csv', {'materialize': True})
+    (tmp_path / f'{link_id}.csv.part').write_bytes(b'')
+    
+    response = client.get(f'/api/download_file/{link_id}')
+    
+    assert response.status_code == 202
+    assert response.headers['Retry-After'] == str(server.DOWNLOAD_SPOOL_RETRY_AFTER)
+    assert response.get_json()['data']['state'] == 'pending'
+    
+    (tmp_path / f'{link_id}.csv.part').rename(tmp_path / f'{link_id}.csv')
+    (tmp_path / f'{link_id}.csv').write_bytes(b'"id"\n1\n')
+    response = client.get(f'/api/download_file/{link_id}')
+    assert response.status_code == 200
+    assert response.data == b'"id"\n1\n'
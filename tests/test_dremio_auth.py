@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+"""DremioClient 并发爬取时的重新认证（使用桩session，不连接Dremio）"""
+import threading
+import time
+
+
+class _Response:
+    def __init__(self, status_code, payload=None):
+        self.status_code = status_code
+        self.payload = payload or {}
+        self.text = ''
+    
+    def json(self):
+        return self.payload
+
+
+class _Session:
+    """桩session：登录返回新token，catalog请求只接受最新token"""
+    
+    def __init__(self):
+        self.headers = {}
+        self.logins = 0
+        self.current = 'token-0'
+        self.lock = threading.Lock()
+    
+    def post(self, url, json=None, timeout=None):
+        time.sleep(0.05)  # 登录较慢，其他线程在此期间同样收到401
+        with self.lock:
+            self.logins += 1
+            self.current = f'token-{self.logins}'
+            return _Response(200, {'token': self.current})
+    
+    def get(self, url, timeout=None):
+        if self.headers.get('Authorization') != f'_dremio{self.current}':
+            return _Response(401)
+        return _Response(200, {'id': url.rsplit('/', 1)[-1]})
+
+
+def test_concurrent_401_reauthenticates_once(server):
+    client = server.DremioClient(host='127.0.0.1', port=1)
+    client.session = _Session()
+    client.token = 'expired'
+    client.session.headers['Authorization'] = '_dremioexpired'
+    results = []
+    
+    threads = [threading.Thread(target=lambda i=i: results.append(client._get_catalog_entity(f'e{i}'))) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+    
+    assert client.session.logins == 1
+    assert sorted(item['id'] for item in results) == [f'e{i}' for i in range(8)]
+    assert client.token == 'token-1'
@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+"""DremioFlightClient 的endpoint读取（使用桩FlightClient，不连接Dremio）"""
+import threading
+
+import pyarrow as pa
+import pyarrow.flight as flight
+
+
+class _Chunk:
+    def __init__(self, data):
+        self.data = data
+
+
+class _Reader:
+    """桩数据流：返回给定批次后结束，block为True时阻塞直到被取消"""
+    
+    def __init__(self, batches, block=False):
+        self.batches = list(batches)
+        self.block = block
+        self.cancelled = threading.Event()
+        self.exited = False
+    
+    def read_chunk(self):
+        if self.batches:
+            return _Chunk(self.batches.pop(0))
+        if self.block:
+            self.cancelled.wait(5)
+            self.exited = True
+            raise flight.FlightCancelledError('cancelled')
+        raise StopIteration
+    
+    def cancel(self):
+        self.cancelled.set()
+
+
+class _Client:
+    def __init__(self, readers):
+        self.readers = readers
+    
+    def do_get(self, ticket, options=None):
+        return self.readers[ticket]
+
+
+class _Endpoint:
+    def __init__(self, ticket):
+        self.ticket = ticket
+        self.locations = []
+
+
+def _batch(value):
+    return pa.RecordBatch.from_pydict({'id': [value]})
+
+
+def test_parallel_read_joins_readers_before_returning(server):
+    flight_client = server.DremioFlightClient(host='127.0.0.1', port=1)
+    stalled = _Reader([_batch(1)], block=True)
+    client = _Client({'a': stalled, 'b': _Reader([_batch(2)])})
+    
+    batches = flight_client._iter_endpoints_parallel(client, [_Endpoint('a'), _Endpoint('b')], None)
+    ids = sorted(next(batches).column(0)[0].as_py() for _ in range(2))
+    batches.close()
+    
+    # 关闭后阻塞中的读取已被取消且线程已退出，连接可以安全归还连接池
+    assert ids == [1, 2]
+    assert stalled.cancelled.is_set()
+    assert stalled.exited
+
+
+def test_parallel_read_merges_all_endpoints(server):
+    flight_client = server.DremioFlightClient(host='127.0.0.1', port=1)
+    client = _Client({'a': _Reader([_batch(1), _batch(2)]), 'b': _Reader([_batch(3)])})
+    
+    batches = flight_client._iter_endpoints_parallel(client, [_Endpoint('a'), _Endpoint('b')], None)
+    
+    assert sorted(batch.column(0)[0].as_py() for batch in batches) == [1, 2, 3]
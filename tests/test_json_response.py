@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+"""/api/query 的columnar/rows结果格式与br/gzip响应压缩"""
+import gzip
+import json
+
+import pytest
+
+PAYLOAD = {'success': True, 'data': [{'id': i, 'name': f'店铺{i}'} for i in range(200)]}
+
+
+def test_shape_query_rows_formats(server):
+    rows = [{'a': 1, 'b': 'x'}, {'b': 'y'}]  # Dremio省略值为null的字段
+    schema = [{'name': 'a'}, {'name': 'b'}]
+    
+    assert server.shape_query_rows(rows, schema, 'columnar') == (['a', 'b'], [[1, None], ['x', 'y']])
+    assert server.shape_query_rows(rows, schema, 'rows') == (['a', 'b'], [[1, 'x'], [None, 'y']])
+    assert server.shape_query_rows(rows, None, 'objects') == (['a', 'b'], rows)
+
+
+def _respond(server, payload, accept_encoding):
+    with server.app.test_request_context(headers={'Accept-Encoding': accept_encoding}):
+        return server.json_response(payload)
+
+
+def test_json_response_gzip_when_brotli_missing(server, monkeypatch):
+    monkeypatch.setattr(server, 'brotli', None)
+    
+    response = _respond(server, PAYLOAD, 'br, gzip')
+    
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in response.headers['Vary']
+    assert json.loads(gzip.decompress(response.get_data())) == PAYLOAD
+
+
+def test_json_response_prefers_brotli(server, monkeypatch):
+    brotli = pytest.importorskip('brotli')
+    monkeypatch.setattr(server, 'brotli', brotli)
+    
+    response = _respond(server, PAYLOAD, 'gzip, br')
+    
+    assert response.headers['Content-Encoding'] == 'br'
+    assert json.loads(brotli.decompress(response.get_data())) == PAYLOAD
+
+
+def test_json_response_skips_small_or_unaccepted_bodies(server):
+    small = _respond(server, {'success': True}, 'gzip')
+    assert 'Content-Encoding' not in small.headers
+    
+    identity = _respond(server, PAYLOAD, 'identity')
+    assert 'Content-Encoding' not in identity.headers
+    assert json.loads(identity.get_data()) == PAYLOAD
@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+"""/api/export/minio（查询结果与MinIO均使用桩对象）"""
+import io
+import json
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+
+class _NoSuchKey(Exception):
+    code = 'NoSuchKey'
+
+
+class _PutResult:
+    def __init__(self, etag):
+        self.etag = etag
+
+
+class _Response:
+    def __init__(self, data):
+        self.data = data
+    
+    def read(self):
+        return self.data
+    
+    def close(self):
+        pass
+    
+    def release_conn(self):
+        pass
+
+
+class FakeMinio:
+    """内存中的MinIO桩客户端，所有实例共享objects"""
+    
+    buckets = {'exports'}
+    objects = {}
+    fail_on = None  # 上传该对象名时抛出异常
+    
+    def __init__(self, *args, **kwargs):
+        pass
+    
+    def bucket_exists(self, bucket):
+        return bucket in self.buckets
+    
+    def put_object(self, bucket, object_name, data, length, part_size=None, content_type=None):
+        if self.fail_on and self.fail_on in object_name:
+            raise IOError('upload failed')
+        payload = data.read() if length < 0 else data.read(length)
+        self.objects[(bucket, object_name)] = payload
+        return _PutResult(f'etag-{len(payload)}')
+    
+    def fput_object(self, bucket, object_name, file_path, part_size=None, content_type=None):
+        with open(file_path, 'rb') as f:
+            return self.put_object(bucket, object_name, f, -1)
+    
+    def get_object(self, bucket, object_name):
+        if (bucket, object_name) not in self.objects:
+            raise _NoSuchKey(object_name)
+        return _Response(self.objects[(bucket, object_name)])
+    
+    def remove_object(self, bucket, object_name):
+        self.objects.pop((bucket, object_name), None)
+
+
+class _Batches:
+    """桩批次流，记录是否已关闭"""
+    
+    def __init__(self, batches):
+        self.batches = iter(batches)
+        self.closed = False
+    
+    def __iter__(self):
+        return self
+    
+    def __next__(self):
+        return next(self.batches)
+    
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def minio(server, monkeypatch):
+    monkeypatch.setattr(FakeMinio, 'objects', {})
+    monkeypatch.setattr(FakeMinio, 'fail_on', None)
+    monkeypatch.setattr(server, 'Minio', FakeMinio)
+    return FakeMinio
+
+
+@pytest.fixture
+def query_batches(server, monkeypatch):
+    """让导出读取指定的批次，返回已打开的批次流列表"""
+    opened = []
+    
+    def use(*batches):
+        def open_batches(sql, parallel_endpoints=None, priority='export'):
+            opened.append(_Batches(batches))
+            return opened[-1]
+        monkeypatch.setattr(server, 'iter_query_batches', open_batches)
+        return opened
+    return use
+
+
+def _orders(shops):
+    return pa.RecordBatch.from_pydict({'id': list(range(len(shops))), 'shop': shops})
+
+
+def _export(client, **body):
+    return client.post('/api/export/minio', json=dict({'sql': 'SELECT * FROM orders', 'bucket': 'exports'}, **body))
+
+
+def test_export_single_object(client, minio, query_batches):
+    opened = query_batches(_orders(['a', 'b']), _orders(['c']))
+    
+    response = _export(client, object_path='/ods/orders.parquet')
+    
+    assert response.status_code == 200
+    data = response.get_json()['data']
+    assert data['rows'] == 3
+    assert data['columns'] == ['id', 'shop']
+    table = pq.read_table(io.BytesIO(minio.objects[('exports', 'ods/orders.parquet')]))
+    assert table.column('shop').to_pylist() == ['a', 'b', 'c']
+    assert opened[0].closed
+
+
+def test_partitioned_export_commits_run_with_manifest(client, minio, query_batches):
+    query_batches(_orders(['a', 'b', 'a']))
+    first = _export(client, object_path='ods/orders', partition_by='shop').get_json()['data']
+    query_batches(_orders(['a', 'a']))
+    
+    response = _export(client, object_path='ods/orders', partition_by='shop')
+    
+    assert response.status_code == 200
+    data = response.get_json()['data']
+    assert data['manifest'] == 'ods/orders/_manifest.json'
+    assert data['run_prefix'] != first['run_prefix']
+    manifest = json.loads(minio.objects[('exports', 'ods/orders/_manifest.json')])
+    assert manifest['run_prefix'] == data['run_prefix']
+    assert manifest['rows'] == 2
+    # 上一次导出的文件（包括本次已不存在的shop=b分区）已删除
+    names = sorted(name for _, name in minio.objects)
+    assert names == sorted([item['object_path'] for item in manifest['objects']] + ['ods/orders/_manifest.json'])
+    assert [item['object_path'] for item in manifest['objects']] == [f"{data['run_prefix']}/shop=a/part-0.parquet"]
+
+
+def test_partitioned_export_failure_keeps_previous_run(client, minio, query_batches):
+    query_batches(_orders(['a', 'b']))
+    _export(client, object_path='ods/orders', partition_by=['shop'])
+    committed = dict(minio.objects)
+    query_batches(_orders(['a', 'b', 'c']))
+    minio.fail_on = 'shop=b'
+    
+    response = _export(client, object_path='ods/orders', partition_by=['shop'])
+    
+    assert response.status_code == 500
+    assert minio.objects == committed
+
+
+def test_export_rejects_invalid_requests(client, minio, query_batches):
+    opened = query_batches(_orders(['a']))
+    
+    assert _export(client, object_path='x.parquet', bucket='missing').status_code == 400
+    assert _export(client, object_path='ods/orders', partition_by='region').status_code == 400
+    assert _export(client, object_path='').status_code == 400
+    assert _export(client, object_path='x.parquet', compression='rar').status_code == 400
+    assert all(batches.closed for batches in opened)
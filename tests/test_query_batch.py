@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+"""/api/query/batch（run_sql_query使用桩函数，不连接Dremio）"""
+import pytest
+
+
+@pytest.fixture
+def queries(server, monkeypatch):
+    """按SQL返回预设结果，记录每次调用的参数"""
+    calls = []
+    
+    def run_sql_query(sql, timeout=None, use_cache=True, cache_ttl=None, priority='interactive'):
+        calls.append({'sql': sql, 'timeout': timeout, 'use_cache': use_cache, 'cache_ttl': cache_ttl})
+        if sql == 'SELECT busy':
+            raise server.AdmissionRejected('interactive', 'queue_full', '查询队列已满')
+        if sql.startswith('SELECT bad'):
+            return {'success': False, 'error': '语法错误', 'job_id': 'job-bad'}, False
+        return {
+            'success': True,
+            'data': [{'id': 1, 'name': 'a'}, {'id': 2}],
+            'columns': ['id', 'name'],
+            'schema': [{'name': 'id'}, {'name': 'name'}],
+            'row_count': 2,
+            'execution_time': 0.1
+        }, sql == 'SELECT cached'
+    
+    monkeypatch.setattr(server, 'run_sql_query', run_sql_query)
+    return calls
+
+
+def test_batch_returns_result_per_statement(client, queries):
+    response = client.post('/api/query/batch', json={
+        'statements': ['SELECT ok', {'id': 'q2', 'sql': ' SELECT cached ', 'use_cache': False}],
+        'timeout': 30,
+        'format': 'rows'
+    })
+    
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body['success'] and body['succeeded'] == 2
+    first, second = body['results']
+    assert first['id'] == 0 and first['columns'] == ['id', 'name']
+    assert first['data'] == [[1, 'a'], [2, None]]
+    assert second['id'] == 'q2' and second['cached']
+    assert {call['sql']: (call['timeout'], call['use_cache']) for call in queries} == {
+        'SELECT ok': (30, True),
+        'SELECT cached': (30, False)
+    }
+
+
+def test_batch_reports_failed_statements(client, queries):
+    response = client.post('/api/query/batch', json={'statements': ['SELECT ok', 'SELECT bad', 'SELECT busy']})
+    
+    assert response.status_code == 200
+    body = response.get_json()
+    assert not body['success'] and body['failed'] == 2
+    ok, bad, busy = body['results']
+    assert ok['success'] and ok['data'] == [{'id': 1, 'name': 'a'}, {'id': 2}]
+    assert bad['error'] == '语法错误' and bad['job_id'] == 'job-bad'
+    assert busy['admission'] == 'queue_full'
+
+
+@pytest.mark.parametrize('body', [
+    {'statements': [{'sql': 1}]},
+    {'statements': ['SELECT ok', {'sql': ['SELECT 1']}]},
+    {'statements': ['   ']},
+    {'statements': [{'id': 'no-sql'}]},
+    {'statements': []},
+    {'statements': 'SELECT 1'},
+    ['SELECT 1'],
+    {'statements': ['SELECT ok'], 'format': 'xml'}
+])
+def test_batch_rejects_invalid_requests(client, queries, body):
+    response = client.post('/api/query/batch', json=body)
+    
+    assert response.status_code == 400
+    assert response.get_json()['success'] is False
+    assert queries == []
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+"""TTLCache 与 QueryResultCache"""
+import time
+
+
+def test_ttl_cache_expires_entries(server):
+    cache = server.TTLCache(default_ttl=0.05)
+    cache.set('a', 1)
+    cache.set('b', 2, ttl=server.TTLCache.NO_EXPIRY)
+    assert not cache.set('c', 3, ttl=0)  # ttl不大于0时不写入
+    
+    assert cache.get('a') == 1
+    time.sleep(0.08)
+    assert cache.get('a') is None
+    assert cache.get('b') == 2
+    assert 'c' not in cache.keys()
+    
+    stats = cache.stats()
+    assert stats['expirations'] == 1
+    assert stats['hits'] == 2
+    assert stats['misses'] == 1
+
+
+def test_ttl_cache_evicts_least_recently_used(server):
+    cache = server.TTLCache(max_entries=2)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.get('a')
+    cache.set('c', 3)
+    
+    assert cache.keys() == ['a', 'c']
+    assert cache.stats()['evictions'] == 1
+
+
+def test_ttl_cache_byte_budget(server):
+    cache = server.TTLCache(max_bytes=100)
+    assert cache.set('a', 'x', size=60)
+    assert cache.set('b', 'y', size=60)
+    assert cache.keys() == ['b']
+    assert cache.stats()['bytes'] == 60
+    
+    # 单条超过总预算时不缓存
+    assert not cache.set('c', 'z', size=101)
+    assert cache.get('c') is None
+
+
+def test_ttl_cache_invalidate_by_meta(server):
+    cache = server.TTLCache()
+    cache.set('a', 1, meta={'tag': 'x'})
+    cache.set('b', 2, meta={'tag': 'y'})
+    
+    assert cache.invalidate(lambda key, meta: meta['tag'] == 'x') == 1
+    assert cache.keys() == ['b']
+
+
+def test_normalize_sql_keeps_quoted_whitespace(server):
+    normalize = server.QueryResultCache.normalize_sql
+    assert normalize("  SELECT  *\n FROM t  WHERE a = 'x  y' ;") == "SELECT * FROM t WHERE a = 'x  y'"
+    assert normalize('SELECT "a  b" FROM t') == 'SELECT "a  b" FROM t'
+
+
+def test_extract_datasets(server):
+    sql = 'SELECT * FROM "minio".warehouse."ods" o JOIN dim.shop s ON o.id = s.id'
+    assert server.QueryResultCache.extract_datasets(sql) == {'minio.warehouse.ods', 'dim.shop'}
+
+
+def test_query_result_cache_only_caches_reads(server):
+    cache = server.QueryResultCache(max_bytes=1024 * 1024, max_entry_bytes=1024 * 1024, default_ttl=60)
+    result = {'data': [{'a': 1}], 'columns': ['a']}
+    
+    assert cache.set('SELECT a FROM t', result)
+    assert cache.get('select   a FROM t') is None  # 只合并空白，不改变大小写
+    assert cache.get('SELECT a  FROM t;') == result
+    assert not cache.set('DELETE FROM t', result)
+
+
+def test_query_result_cache_skips_large_results(server):
+    cache = server.QueryResultCache(max_bytes=1024 * 1024, max_entry_bytes=100, default_ttl=60)
+    result = {'data': [{'value': 'x' * 50} for _ in range(10)], 'columns': ['value']}
+    
+    assert not cache.set('SELECT value FROM t', result)
+    assert cache.stats()['skipped_too_large'] == 1
+
+
+def test_query_result_cache_invalidates_by_dataset_suffix(server):
+    cache = server.QueryResultCache(max_bytes=1024 * 1024, max_entry_bytes=1024 * 1024, default_ttl=60)
+    cache.set('SELECT * FROM ods.orders', {'data': []})
+    cache.set('SELECT * FROM minio.ods.shops', {'data': []})
+    
+    assert cache.invalidate_dataset('"minio"."ods"."orders"') == 1
+    assert cache.get('SELECT * FROM ods.orders') is None
+    assert cache.get('SELECT * FROM minio.ods.shops') is not None
@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+"""/api/query/stream（Dremio使用桩客户端）"""
+import json
+
+import pytest
+
+
+class FakeDremio:
+    """按作业ID保存结果分页的桩Dremio客户端"""
+    
+    def __init__(self, pages, job_state='COMPLETED', fail_after=None):
+        self.pages = pages
+        self.job_state = job_state
+        self.fail_after = fail_after  # 读取该数量的分页后抛出异常
+        self.page_sizes = []
+    
+    def submit_sql_query(self, sql, timeout=None):
+        if not sql.upper().startswith('SELECT'):
+            return {'success': False, 'error': 'SQL语法错误'}
+        return {'success': True, 'job_id': 'job-1'}
+    
+    def wait_for_job(self, job_id, timeout=None, cancel_on_timeout=True):
+        if self.job_state != 'COMPLETED':
+            return {'success': False, 'job_id': job_id, 'error': f'查询失败: {self.job_state}'}
+        return {'success': True, 'job_info': {'jobState': 'COMPLETED', 'rowCount': sum(len(page) for page in self.pages)}}
+    
+    def iter_job_results(self, job_id, page_size=None, offset=0, max_rows=None):
+        self.page_sizes.append(page_size)
+        for index, rows in enumerate(self.pages):
+            if index == self.fail_after:
+                raise IOError('连接中断')
+            yield {'rows': rows}
+
+
+@pytest.fixture
+def dremio(server, monkeypatch):
+    def use(*pages, **kwargs):
+        fake = FakeDremio(list(pages), **kwargs)
+        monkeypatch.setattr(server, 'dremio_client', fake)
+        return fake
+    return use
+
+
+def _lines(response):
+    return [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+
+def test_stream_returns_ndjson_rows(client, dremio):
+    fake = dremio([{'id': 1, 'name': '店铺1'}, {'id': 2}], [], [{'id': 3}])
+    
+    response = client.post('/api/query/stream', json={'sql': ' SELECT * FROM shops ', 'page_size': 2})
+    
+    assert response.status_code == 200
+    assert response.mimetype == 'application/x-ndjson'
+    assert response.headers['X-Dremio-Job-Id'] == 'job-1'
+    assert response.headers['X-Row-Count'] == '3'
+    assert _lines(response) == [{'id': 1, 'name': '店铺1'}, {'id': 2}, {'id': 3}]
+    assert fake.page_sizes == [2]
+
+
+def test_stream_appends_error_line_when_reading_fails(client, dremio):
+    dremio([{'id': 1}], [{'id': 2}], fail_after=1)
+    
+    response = client.post('/api/query/stream', json={'sql': 'SELECT * FROM shops'})
+    
+    assert response.status_code == 200
+    assert _lines(response) == [{'id': 1}, {'error': '连接中断'}]
+
+
+def test_stream_reports_errors_before_streaming(client, dremio):
+    dremio(job_state='FAILED')
+    
+    assert client.post('/api/query/stream', json={'sql': ''}).status_code == 400
+    assert client.post('/api/query/stream', json={'sql': 'DROP TABLE shops'}).status_code == 500
+    failed = client.post('/api/query/stream', json={'sql': 'SELECT * FROM shops'})
+    assert failed.status_code == 500
+    assert failed.get_json()['job_id'] == 'job-1'
@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+"""DatasetRefreshQueue（使用桩Dremio客户端，不连接Dremio）"""
+import functools
+import threading
+import time
+
+import pytest
+
+
+class StubDremioClient:
+    """记录元数据刷新与反射批量刷新调用的桩客户端"""
+    
+    def __init__(self, failing_metadata=()):
+        self.failing_metadata = set(failing_metadata)
+        self.metadata_delay = 0
+        self.metadata_calls = []
+        self.reflection_batches = []
+        self.table_columns_cache = {}
+        self.lock = threading.Lock()
+    
+    def run_maintenance(self, func, *args, timeout=None):
+        return func(*args)
+    
+    def refresh_dataset_metadata(self, dataset_path, timeout=None):
+        time.sleep(self.metadata_delay)
+        with self.lock:
+            self.metadata_calls.append(dataset_path)
+        if dataset_path in self.failing_metadata:
+            return {'success': False, 'error': 'not a physical dataset'}
+        return {'success': True, 'dataset_path': dataset_path}
+    
+    def refresh_reflections_batch(self, dataset_paths, max_workers=None, admission_timeout=None):
+        with self.lock:
+            self.reflection_batches.append(list(dataset_paths))
+        return {
+            'success': True,
+            'results': [{'dataset_path': path, 'success': True} for path in dataset_paths]
+        }
+
+
+@pytest.fixture
+def stub_client(server, monkeypatch):
+    client = StubDremioClient()
+    monkeypatch.setattr(server, 'dremio_client', client)
+    monkeypatch.setattr(server, 'invalidate_dataset_caches', lambda path: 0)
+    return client
+
+
+def _queue(server, store=None):
+    return server.DatasetRefreshQueue(debounce_seconds=0.1, ticket_ttl=60, store=store, poll_interval=0.05)
+
+
+def _wait_finished(queue, ticket_ids, timeout=5):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        tickets = [queue.get_ticket(ticket_id) for ticket_id in ticket_ids]
+        if all(ticket['state'] in ('done', 'partial', 'failed') for ticket in tickets):
+            return tickets
+        time.sleep(0.02)
+    raise AssertionError(f'刷新ticket未在{timeout}秒内完成')
+
+
+def test_requests_in_window_run_as_one_batch(server, stub_client):
+    queue = _queue(server)
+    tickets = [
+        queue.enqueue('minio.ods.orders'),
+        queue.enqueue('minio.ods.orders'),
+        queue.enqueue('minio.ods.shops', metadata=False)
+    ]
+    assert len({ticket['scheduled_at'] for ticket in tickets}) == 1
+    
+    finished = _wait_finished(queue, [ticket['ticket_id'] for ticket in tickets])
+    
+    assert [ticket['state'] for ticket in finished] == ['done'] * 3
+    assert stub_client.metadata_calls == ['minio.ods.orders']
+    assert stub_client.reflection_batches == [['minio.ods.orders', 'minio.ods.shops']]
+    stats = queue.stats()
+    assert stats['batches'] == 1
+    assert stats['merged'] == 1
+    assert stats['tickets'] == {'done': 3}
+
+
+def test_metadata_failure_still_rebuilds_reflection(server, stub_client):
+    stub_client.failing_metadata.add('space.views.kpi')
+    queue = _queue(server)
+    ticket = queue.enqueue('space.views.kpi')
+    
+    finished, = _wait_finished(queue, [ticket['ticket_id']])
+    
+    assert finished['state'] == 'partial'
+    assert stub_client.reflection_batches == [['space.views.kpi']]
+    assert finished['result']['reflection']['success']
+    assert 'not a physical dataset' in finished['result']['metadata_error']
+    assert 'reflection_error' not in finished['result']
+
+
+def test_refreshes_wait_for_maintenance_slots(server, stub_client, monkeypatch):
+    # 1个maintenance名额、0.01秒的默认排队超时：批次内的刷新按元数据刷新超时排队，而不是被拒绝
+    priorities = server.AdmissionController.PRIORITIES
+    admission = server.AdmissionController(1, {p: 1 for p in priorities}, {p: 8 for p in priorities}, queue_timeout=0.01)
+    monkeypatch.setattr(server, 'query_admission', admission)
+    monkeypatch.setattr(stub_client, 'run_maintenance', functools.partial(server.DremioClient.run_maintenance, stub_client))
+    stub_client.metadata_delay = 0.05
+    assert _queue(server).max_workers == 1
+    
+    queue = server.DatasetRefreshQueue(debounce_seconds=0.1, ticket_ttl=60, max_workers=3, poll_interval=0.05)
+    tickets = [queue.enqueue(f'minio.ods.t{i}') for i in range(3)]
+    finished = _wait_finished(queue, [ticket['ticket_id'] for ticket in tickets])
+    
+    assert [ticket['state'] for ticket in finished] == ['done'] * 3
+    assert admission.stats()['classes']['maintenance']['timeouts'] == 0
+
+
+def test_unknown_ticket(server, stub_client):
+    assert _queue(server).get_ticket('missing') is None
+
+
+def test_sqlite_store_shares_queue_between_workers(server, stub_client, tmp_path):
+    db_path = str(tmp_path / 'refresh.db')
+    # 两个队列实例模拟两个worker进程，共享同一个SQLite文件
+    first = _queue(server, server.SQLiteRefreshTicketStore(db_path))
+    second = _queue(server, server.SQLiteRefreshTicketStore(db_path))
+    
+    tickets = [first.enqueue('minio.ods.orders'), second.enqueue('minio.ods.orders'), second.enqueue('minio.ods.shops')]
+    assert second.stats()['merged'] == 1
+    assert first.stats()['pending_datasets'] == ['minio.ods.orders', 'minio.ods.shops']
+    
+    finished = _wait_finished(first, [ticket['ticket_id'] for ticket in tickets])
+    
+    assert [ticket['state'] for ticket in finished] == ['done'] * 3
+    assert first.counters['batches'] + second.counters['batches'] == 1
+    assert sorted(stub_client.metadata_calls) == ['minio.ods.orders', 'minio.ods.shops']
+    assert second.get_ticket(tickets[0]['ticket_id'])['result']['success']
+
+
+def test_sqlite_store_marks_abandoned_running_tickets_failed(server, tmp_path):
+    store = server.SQLiteRefreshTicketStore(str(tmp_path / 'refresh.db'))
+    now = time.time()
+    store.add({
+        'ticket_id': 't1', 'dataset_path': 'a.b', 'metadata': True, 'reflection': True, 'state': 'queued',
+        'created_at': now, 'scheduled_at': None, 'started_at': None, 'finished_at': None, 'result': None, 'error': None
+    }, debounce_seconds=0)
+    
+    assert [ticket['ticket_id'] for ticket in store.claim(now)] == ['t1']
+    assert store.claim(now) == []
+    
+    store.prune(now + 120, ttl=60)
+    assert store.get('t1')['state'] == 'failed'
+    store.prune(now + 240, ttl=60)
+    assert store.get('t1') is None
@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+"""SchemaSearchIndex"""
+import pytest
+
+CACHE_DATA = {
+    'minio.ods': {
+        'minio': {
+            'schemas': {
+                'ods': {
+                    'tables': {
+                        'pdd_order_detail': {
+                            'type': 'PHYSICAL_DATASET',
+                            'columns': [{'name': '订单号', 'type': 'BIGINT'}, {'name': 'shop_id', 'type': 'VARCHAR'}]
+                        },
+                        'jd_shop': {
+                            'type': 'PHYSICAL_DATASET',
+                            'columns': [{'name': 'shop_id', 'type': 'VARCHAR'}, {'name': '店铺名称', 'type': 'VARCHAR'}]
+                        }
+                    }
+                }
+            }
+        }
+    }
+}
+
+
+@pytest.fixture
+def index(server):
+    search_index = server.SchemaSearchIndex()
+    search_index.build(CACHE_DATA)
+    return search_index
+
+
+def test_tokenize_splits_mixed_names(server):
+    assert server.SchemaSearchIndex.tokenize('pdd_订单id-Detail') == ['pdd', '订单', 'id', 'detail']
+
+
+def test_exact_table_name_ranks_first(index):
+    results = index.search('jd_shop')
+    assert results[0]['kind'] == 'table'
+    assert results[0]['path'] == 'minio.ods.jd_shop'
+
+
+def test_prefix_and_kind_filter(index):
+    results = index.search('ord', kind='table')
+    assert [item['path'] for item in results] == ['minio.ods.pdd_order_detail']
+
+
+def test_chinese_fragment_matches_column(index):
+    results = index.search('店铺')
+    assert results[0]['kind'] == 'column'
+    assert results[0]['path'] == 'minio.ods.jd_shop.店铺名称'
+    assert results[0]['table_path'] == 'minio.ods.jd_shop'
+
+
+def test_table_context_narrows_columns(index):
+    results = index.search('pdd order shop_id', kind='column')
+    assert results[0]['table_path'] == 'minio.ods.pdd_order_detail'
+
+
+def test_empty_query_and_stats(index):
+    assert index.search('   ') == []
+    stats = index.stats()
+    assert stats['documents'] == 8  # 1个catalog、1个schema、2张表、4列
+    assert stats['built_at'] is not None
@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+"""多worker进程共用Schema缓存快照：flock选出刷新进程，其余进程加载快照"""
+import os
+
+import pytest
+
+
+@pytest.fixture
+def snapshot_path(server, tmp_path):
+    if server.fcntl is None:
+        pytest.skip('系统不支持fcntl')
+    return str(tmp_path / 'schema_cache.json.gz')
+
+
+def test_only_one_cache_becomes_refresh_leader(server, snapshot_path):
+    leader = server.SchemaCache(snapshot_path=snapshot_path)
+    follower = server.SchemaCache(snapshot_path=snapshot_path)
+    
+    assert leader.acquire_refresh_leadership()
+    assert not follower.acquire_refresh_leadership()
+    assert leader.stats()['refresh_role'] == 'leader'
+    assert follower.stats()['refresh_role'] == 'follower'
+    
+    # 刷新进程退出（锁文件关闭）后由其他进程接替
+    leader.leader_lock_file.close()
+    assert follower.acquire_refresh_leadership()
+    assert follower.leader_pid == os.getpid()
+
+
+def test_follower_reloads_snapshot_saved_by_leader(server, snapshot_path):
+    leader = server.SchemaCache(snapshot_path=snapshot_path)
+    follower = server.SchemaCache(snapshot_path=snapshot_path)
+    leader.acquire_refresh_leadership()
+    follower.acquire_refresh_leadership()
+    
+    follower.set_table_details('a.orders', {'columns': ['stale']})
+    assert not follower.save_snapshot()
+    assert not os.path.exists(snapshot_path)
+    assert not follower.reload_snapshot_if_changed()
+    
+    leader.set_table_details('a.orders', {'columns': ['id']})
+    leader.last_refresh = server.datetime.now()
+    assert leader.save_snapshot()
+    
+    assert follower.reload_snapshot_if_changed()
+    assert follower.get_table_details('a.orders') == {'columns': ['id']}
+    assert follower.last_refresh is not None
+    assert not follower.reload_snapshot_if_changed()
+    leader.leader_lock_file.close()
@@ -0,0 +1,254 @@
+# -*- coding: utf-8 -*-
+"""流式CSV导出：按批次编码CSV，以及相同导出共享同一批次流（SharedBatchStreams）"""
+import gc
+import threading
+import time
+
+import pyarrow as pa
+import pytest
+
+
+def _batch(start, count):
+    ids = list(range(start, start + count))
+    return pa.RecordBatch.from_arrays(
+        [pa.array(ids, pa.int64()), pa.array([f'名{i}' for i in ids]), pa.array([i / 2 for i in ids])],
+        names=['id', 'name', 'value']
+    )
+
+
+def _csv_lines(chunks):
+    return b''.join(chunks).decode('utf-8').splitlines()
+
+
+def test_csv_chunks_write_header_once(server):
+    chunks = list(server.iter_csv_chunks(iter([_batch(0, 2), _batch(2, 0), _batch(2, 1)])))
+    
+    assert _csv_lines(chunks) == ['"id","name","value"', '0,"名0",0', '1,"名1",0.5', '2,"名2",1']
+    assert len(chunks) == 2  # 空批次不输出
+
+
+def test_csv_chunks_empty_result_keeps_header(server):
+    assert _csv_lines(server.iter_csv_chunks(iter([_batch(0, 0)]))) == ['"id","name","value"']
+
+
+def test_csv_chunks_format_columns_consistently(server):
+    # 含null的整数列不因某个批次而写成浮点数
+    batches = [
+        pa.RecordBatch.from_pydict({'id': pa.array([1, None], pa.int64()), 'tags': pa.array([['a'], None])}),
+        pa.RecordBatch.from_pydict({'id': pa.array([2, 3], pa.int64()), 'tags': pa.array([['b', 'c'], []])})
+    ]
+    
+    assert _csv_lines(server.iter_csv_chunks(iter(batches))) == [
+        '"id","tags"', '1,"[""a""]"', ',', '2,"[""b"", ""c""]"', '3,"[]"'
+    ]
+
+
+class _Source:
+    """可关闭的批次源，记录读取与关闭情况"""
+    
+    def __init__(self, batches, delay=0.0):
+        self.batches = iter(batches)
+        self.delay = delay
+        self.read = 0
+        self.closed = False
+    
+    def __iter__(self):
+        return self
+    
+    def __next__(self):
+        if self.delay:
+            time.sleep(self.delay)
+        batch = next(self.batches)
+        self.read += 1
+        return batch
+    
+    def close(self):
+        self.closed = True
+
+
+def _batches(count, rows=100):
+    return [pa.RecordBatch.from_pydict({'id': list(range(i * rows, (i + 1) * rows))}) for i in range(count)]
+
+
+def _ids(subscriber):
+    return [value for batch in subscriber for value in batch.column(0).to_pylist()]
+
+
+def test_shared_stream_replays_for_late_joiner(server):
+    streams = server.SharedBatchStreams(replay_bytes=1024 * 1024)
+    source = _Source(_batches(5))
+    opened = []
+    
+    def factory():
+        opened.append(source)
+        return source
+    
+    first = streams.open('k', factory)
+    next(first)
+    next(first)
+    second = streams.open('k', factory)
+    
+    assert len(opened) == 1
+    assert _ids(second) == list(range(500))
+    assert len(_ids(first)) == 300
+    assert source.read == 5
+    assert streams.stats() == {'in_flight': 0, 'executed': 1, 'coalesced': 1}
+
+
+def test_shared_stream_stops_accepting_past_replay_budget(server):
+    streams = server.SharedBatchStreams(replay_bytes=1)
+    sources = []
+    
+    def factory():
+        sources.append(_Source(_batches(3)))
+        return sources[-1]
+    
+    first = streams.open('k', factory)
+    next(first)
+    second = streams.open('k', factory)
+    
+    assert len(sources) == 2
+    assert len(_ids(first)) == 200
+    assert len(_ids(second)) == 300
+
+
+def test_shared_stream_concurrent_readers_read_source_once(server):
+    streams = server.SharedBatchStreams(replay_bytes=1024 * 1024)
+    source = _Source(_batches(20), delay=0.002)
+    subscribers = [streams.open('k', lambda: source) for _ in range(4)]
+    results = [None] * len(subscribers)
+    
+    def read(index):
+        results[index] = _ids(subscribers[index])
+    
+    threads = [threading.Thread(target=read, args=(index,)) for index in range(len(subscribers))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+    
+    assert source.read == 20
+    assert all(result == list(range(2000)) for result in results)
+
+
+def test_shared_stream_closes_source_when_last_subscriber_leaves(server):
+    streams = server.SharedBatchStreams(replay_bytes=1024 * 1024)
+    source = _Source(_batches(5))
+    first = streams.open('k', lambda: source)
+    second = streams.open('k', lambda: source)
+    next(first)
+    
+    first.close()
+    assert not source.closed
+    assert len(_ids(second)) == 500
+    
+    third = streams.open('k', lambda: _Source(_batches(1)))
+    next(third)
+    third.close()
+    assert streams.stats()['in_flight'] == 0
+
+
+def test_shared_stream_abandoned_subscriber_releases_source(server):
+    streams = server.SharedBatchStreams(replay_bytes=1024 * 1024)
+    source = _Source(_batches(5))
+    subscriber = streams.open('k', lambda: source)
+    next(subscriber)
+    del subscriber
+    gc.collect()
+    
+    assert source.closed
+    assert streams.stats()['in_flight'] == 0
+
+
+def test_shared_stream_propagates_errors(server):
+    streams = server.SharedBatchStreams(replay_bytes=1024 * 1024)
+    
+    def failing():
+        yield _batches(1)[0]
+        raise RuntimeError('flight failed')
+    
+    class _Failing(_Source):
+        def __init__(self):
+            super().__init__([])
+            self.batches = failing()
+    
+    source = _Failing()
+    first = streams.open('k', lambda: source)
+    second = streams.open('k', lambda: source)
+    
+    with pytest.raises(RuntimeError):
+        _ids(first)
+    with pytest.raises(RuntimeError):
+        _ids(second)
+    assert streams.stats()['in_flight'] == 0
+
+
+def test_shared_stream_open_failure_reaches_every_caller(server):
+    streams = server.SharedBatchStreams(replay_bytes=1024 * 1024)
+    
+    def factory():
+        raise RuntimeError('admission rejected')
+    
+    with pytest.raises(RuntimeError):
+        streams.open('k', factory)
+    assert streams.stats()['in_flight'] == 0
+
+
+class _Recording(_Source):
+    """拉取每个批次前记录共享批次流的缓冲字节数"""
+    
+    def __init__(self, batches):
+        super().__init__(batches)
+        self.stream = None
+        self.buffered = []
+    
+    def __next__(self):
+        self.buffered.append(self.stream.buffered_bytes)
+        return super().__next__()
+
+
+def test_shared_stream_lag_cap_detaches_stalled_subscriber(server):
+    batches = _batches(10)
+    cap = batches[0].nbytes * 3
+    streams = server.SharedBatchStreams(replay_bytes=1024 * 1024, max_lag_bytes=cap, lag_timeout=0.2)
+    source = _Recording(batches)
+    fast = streams.open('k', lambda: source)
+    stalled = streams.open('k', lambda: source)
+    source.stream = fast.stream
+    next(stalled)
+    
+    started = time.time()
+    assert _ids(fast) == list(range(1000))
+    
+    assert time.time() - started >= 0.2  # 先等待落后的订阅者，超时后才继续拉取
+    assert max(source.buffered) <= cap
+    with pytest.raises(server.SharedStreamDetached):
+        next(stalled)
+    assert streams.stats()['in_flight'] == 0
+
+
+def test_shared_stream_lag_cap_waits_for_slow_subscriber(server):
+    batches = _batches(10)
+    cap = batches[0].nbytes * 2
+    streams = server.SharedBatchStreams(replay_bytes=1024 * 1024, max_lag_bytes=cap, lag_timeout=5)
+    source = _Recording(batches)
+    fast = streams.open('k', lambda: source)
+    slow = streams.open('k', lambda: source)
+    source.stream = fast.stream
+    results = {}
+    
+    def read_slowly():
+        ids = []
+        for batch in slow:
+            time.sleep(0.01)
+            ids.extend(batch.column(0).to_pylist())
+        results['slow'] = ids
+    
+    thread = threading.Thread(target=read_slowly)
+    thread.start()
+    results['fast'] = _ids(fast)
+    thread.join(5)
+    
+    assert results == {'fast': list(range(1000)), 'slow': list(range(1000))}
+    assert max(source.buffered) <= cap
+    assert source.read == 10
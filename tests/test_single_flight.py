@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+"""SingleFlight"""
+import threading
+import time
+
+import pytest
+
+
+def _wait_until(predicate, timeout=2.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.005)
+    return predicate()
+
+
+def test_single_flight_coalesces_concurrent_calls(server):
+    single_flight = server.SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+    
+    def work():
+        calls.append(1)
+        started.set()
+        release.wait(2)
+        return 'result'
+    
+    results = []
+    leader = threading.Thread(target=lambda: results.append(single_flight.do('k', work)))
+    leader.start()
+    started.wait(2)
+    followers = [threading.Thread(target=lambda: results.append(single_flight.do('k', work))) for _ in range(3)]
+    for thread in followers:
+        thread.start()
+    assert _wait_until(lambda: single_flight.stats()['coalesced'] == 3)
+    release.set()
+    for thread in [leader] + followers:
+        thread.join(2)
+    
+    assert len(calls) == 1
+    assert sorted(results) == [('result', False)] + [('result', True)] * 3
+    assert single_flight.stats() == {'in_flight': 0, 'executed': 1, 'coalesced': 3}
+
+
+def test_single_flight_shares_exceptions_and_forgets_key(server):
+    single_flight = server.SingleFlight()
+    
+    def fail():
+        raise RuntimeError('boom')
+    
+    with pytest.raises(RuntimeError):
+        single_flight.do('k', fail)
+    assert single_flight.do('k', lambda: 42) == (42, False)
+
+
+def test_concurrent_downloads_share_one_stream_without_single_flight(server, client, monkeypatch):
+    pa = pytest.importorskip('pyarrow')
+    opened = []
+    
+    def iter_record_batches(sql, parallel=False):
+        opened.append(sql)
+        yield pa.RecordBatch.from_pydict({'id': [1, 2]})
+        yield pa.RecordBatch.from_pydict({'id': [3]})
+    
+    monkeypatch.setattr(server.dremio_flight_client, 'iter_record_batches', iter_record_batches)
+    executed = server.query_single_flight.stats()['executed']
+    body = {'sql': 'SELECT id FROM orders', 'parallel_endpoints': False}
+    
+    # 第一个响应未读完时第二个相同的下载加入同一个批次流，不经过SingleFlight保存完整结果
+    first = client.post('/api/download/csv', json=body, buffered=False)
+    second = client.post('/api/download/csv', json=body, buffered=False)
+    contents = [b''.join(response.response) for response in (first, second)]
+    
+    assert opened == ['SELECT id FROM orders']
+    assert contents[0] == contents[1] == b'"id"\n1\n2\n3\n'
+    assert server.query_single_flight.stats()['executed'] == executed
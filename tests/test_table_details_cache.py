@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+"""表详细信息缓存（TTLCache）及其快照保存与恢复"""
+import time
+
+
+def test_ttl_cache_items_with_expiry_skips_expired(server):
+    cache = server.TTLCache()
+    cache.set('live', 1, ttl=60)
+    cache.set('dead', 2, ttl=0.01)
+    cache.set('forever', 3)
+    time.sleep(0.02)
+    
+    items = {key: (value, expires_at) for key, value, expires_at in cache.items_with_expiry()}
+    assert set(items) == {'live', 'forever'}
+    assert items['live'][1] > time.time()
+    assert items['forever'][1] is None
+
+
+def test_invalidate_table_details_matches_path_variants(server):
+    schema_cache = server.SchemaCache()
+    schema_cache.set_table_details('minio.ods.orders', {'columns': []})
+    schema_cache.set_table_details('minio.ods.shops', {'columns': []})
+    
+    assert schema_cache.invalidate_table_details('"minio"."ods"."orders"') == 1
+    assert schema_cache.get_table_details('minio.ods.orders') is None
+    assert schema_cache.get_table_details('minio.ods.shops') is not None
+
+
+def test_snapshot_restores_table_details_with_remaining_ttl(server, tmp_path):
+    snapshot_path = str(tmp_path / 'schema_cache.json.gz')
+    saved = server.SchemaCache(snapshot_path=snapshot_path)
+    saved.table_details_cache.set('a.live', {'columns': ['x']}, ttl=60)
+    saved.table_details_cache.set('a.short', {'columns': ['y']}, ttl=0.05)
+    saved.table_details_cache.set('a.forever', {'columns': ['z']}, ttl=server.TTLCache.NO_EXPIRY)
+    assert saved.save_snapshot()
+    time.sleep(0.08)
+    
+    loaded = server.SchemaCache(snapshot_path=snapshot_path)
+    assert loaded.load_snapshot()
+    
+    assert loaded.get_table_details('a.live') == {'columns': ['x']}
+    assert loaded.get_table_details('a.short') is None  # 保存后已过期的条目不再恢复
+    expiry = {key: expires_at for key, _, expires_at in loaded.table_details_cache.items_with_expiry()}
+    assert time.time() < expiry['a.live'] <= time.time() + 60
+    assert expiry['a.forever'] is None
+    assert loaded.get_table_details('a.forever') == {'columns': ['z']}
@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+"""XLSX导出（openpyxl write-only模式按批次写入）"""
+import datetime
+import io
+
+import pyarrow as pa
+from openpyxl import load_workbook
+
+
+def test_xlsx_splits_sheets_and_converts_values(server):
+    timestamps = pa.array([datetime.datetime(2024, 1, 1, 8, tzinfo=datetime.timezone.utc)] * 3, pa.timestamp('us', tz='UTC'))
+    batch = pa.RecordBatch.from_arrays(
+        [pa.array([1, 2, 3]), pa.array([1.5, float('nan'), None]), timestamps],
+        names=['id', 'value', 'ts']
+    )
+    output = io.BytesIO()
+    
+    stats = server.write_xlsx_from_batches(iter([batch, batch]), output, max_rows_per_sheet=4)
+    
+    assert stats == {'rows': 6, 'columns': ['id', 'value', 'ts'], 'sheets': 2}
+    workbook = load_workbook(io.BytesIO(output.getvalue()))
+    assert workbook.sheetnames == ['Data', 'Data_2']
+    rows = list(workbook['Data'].iter_rows(values_only=True))
+    assert rows[0] == ('id', 'value', 'ts')
+    assert len(rows) == 5
+    assert rows[2][1] is None  # NaN写成空单元格
+    assert rows[1][2] == datetime.datetime(2024, 1, 1, 8)
+    assert len(list(workbook['Data_2'].iter_rows(values_only=True))) == 3
+
+
+def test_xlsx_empty_result_writes_one_sheet(server):
+    output = io.BytesIO()
+    stats = server.write_xlsx_from_batches(iter([]), output)
+    assert stats == {'rows': 0, 'columns': [], 'sheets': 1}